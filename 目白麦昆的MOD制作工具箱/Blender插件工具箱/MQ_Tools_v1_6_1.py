@@ -7,15 +7,26 @@ import re
 import math
 import random
 import uuid
+import struct
 import logging
 import datetime
+import json
+import hashlib
+import threading
+import concurrent.futures
+import heapq
+import difflib
+import atexit
+import numpy as np
 from typing import Dict, Set, List, Optional
 from dataclasses import dataclass
+from contextlib import contextmanager
 from collections import defaultdict, Counter
 from bpy.props import (StringProperty, BoolProperty, FloatProperty, EnumProperty,
                        IntProperty, PointerProperty, CollectionProperty)
 from bpy.types import (Panel, Operator, PropertyGroup, UIList, Menu)
-from mathutils import Vector
+from bpy.app.handlers import persistent
+from mathutils import Vector, Matrix
 import bmesh
 
 bl_info = {
@@ -109,47 +120,65 @@ def check_material_duplicate(self, context):
             current_item.material = None
             break
 
+def invalidate_settings_draw_cache(self, context):
+    """排除列表/blank控制列表内容变化时让面板缓存失效（可选项判断也依赖列表内容）"""
+    draw_cache.invalidate('settings', 'materials', 'objects')
+
+def selected_names_in(items, attr: str, list_name: str) -> Set[str]:
+    """列表中已选择的对象/材质名称（缓存），用于搜索下拉框的 poll"""
+    scene = bpy.context.scene
+    def compute():
+        names = set()
+        for item in items:
+            target = getattr(item, attr)
+            if target:
+                names.add(target.name)
+        return names
+    return draw_cache.get('settings', (list_name, scene.name, len(items)), compute)
+
 # ------------------------- 属性定义 -------------------------
 class ExcludedItem(bpy.types.PropertyGroup):
     def poll_target(self, obj):
         # 只允许选择网格对象，且不能是已经被选择的对象
         settings = bpy.context.scene.qseparator_settings
-        excluded_objects = {item.target for item in settings.excluded_items if item.target and item != self}
-        return obj.type == 'MESH' and obj not in excluded_objects
+        if obj.type != 'MESH':
+            return False
+        return obj == self.target or obj.name not in selected_names_in(settings.excluded_items, "target", "excluded_items")
     
     target: bpy.props.PointerProperty(
         type=bpy.types.Object,
         name="排除对象",
         description="选择要排除的网格对象",
-        poll=poll_target
+        poll=poll_target,
+        update=invalidate_settings_draw_cache
     )
 
 class ExcludedMaterial(bpy.types.PropertyGroup):
     def poll_material(self, material):
         # 只允许选择未被选择的材质
         settings = bpy.context.scene.qseparator_settings
-        excluded_materials = {item.material for item in settings.excluded_materials if item.material and item != self}
-        return material not in excluded_materials
+        return material == self.material or material.name not in selected_names_in(settings.excluded_materials, "material", "excluded_materials")
     
     material: bpy.props.PointerProperty(
         type=bpy.types.Material,
         name="排除材质",
         description="选择要排除的材质",
-        poll=poll_material
+        poll=poll_material,
+        update=invalidate_settings_draw_cache
     )
 
 class MaterialBlankControl(bpy.types.PropertyGroup):
     def poll_material(self, material):
         # 只允许选择未被选择的材质
         settings = bpy.context.scene.qseparator_settings
-        selected_materials = {item.material for item in settings.material_blank_controls if item.material and item != self}
-        return material not in selected_materials
+        return material == self.material or material.name not in selected_names_in(settings.material_blank_controls, "material", "material_blank_controls")
     
     material: bpy.props.PointerProperty(
         type=bpy.types.Material,
         name="材质",
         description="选择要控制blank行的材质",
-        poll=poll_material
+        poll=poll_material,
+        update=invalidate_settings_draw_cache
     )
     
     blank_mode: bpy.props.EnumProperty(
@@ -215,6 +244,82 @@ class QSeparatorSettings(bpy.types.PropertyGroup):
         default='ANIME',
         description="选择翻译风格，影响特定术语的翻译方式"
     )
+    api_endpoint: bpy.props.StringProperty(
+        name="API地址",
+        default="https://api.deepseek.com/v1/chat/completions",
+        description="OpenAI 兼容的 chat/completions 接口地址，可填写本地测试服务器"
+    )
+    api_model: bpy.props.StringProperty(
+        name="模型",
+        default="deepseek-chat",
+        description="请求使用的模型名称"
+    )
+    api_timeout: bpy.props.FloatProperty(
+        name="超时(秒)",
+        default=20.0,
+        min=1.0,
+        max=300.0,
+        description="单次翻译请求的超时时间"
+    )
+    api_max_retries: bpy.props.IntProperty(
+        name="重试次数",
+        default=2,
+        min=0,
+        max=10,
+        description="连接失败、超时、429 或 5xx 时按指数退避重试的次数"
+    )
+    api_concurrency: bpy.props.IntProperty(
+        name="并发数",
+        default=4,
+        min=1,
+        max=16,
+        description="同时进行的翻译请求数量上限"
+    )
+    qc_output_path: bpy.props.StringProperty(
+        name="QC文件",
+        default="//bodygroups.qci",
+        subtype='FILE_PATH',
+        description="$bodygroup 配置写入的 .qc/.qci 文件，只替换工具标记区域内的内容"
+    )
+    qc_copy_to_clipboard: bpy.props.BoolProperty(
+        name="同时复制到剪贴板",
+        default=True,
+        description="写入文件时同时把配置复制到剪贴板"
+    )
+    export_flex: bpy.props.BoolProperty(
+        name="导出形态键",
+        default=True,
+        description="导出SMD时为含形态键的集合同时写出VTA顶点动画文件，导出DMX时把形态键写入模型"
+    )
+    flex_tolerance: bpy.props.FloatProperty(
+        name="VTA位移容差",
+        default=0.0001,
+        min=0.0,
+        precision=5,
+        description="形态键中相对基型的位移不超过该值的顶点不写入VTA/DMX（越大文件越小、编译越快）"
+    )
+    model_export_dir: bpy.props.StringProperty(
+        name="模型导出目录",
+        default="",
+        subtype='DIR_PATH',
+        description="SMD/DMX 模型文件的导出目录，留空则使用QC文件所在目录"
+    )
+    use_glossary: bpy.props.BoolProperty(
+        name="术语表优先",
+        default=True,
+        description="名称能被术语表（提示词对照表+用户术语）完全覆盖时直接本地翻译，不请求API"
+    )
+    use_translation_cache: bpy.props.BoolProperty(
+        name="使用翻译缓存",
+        default=True,
+        description="翻译结果保存到本地缓存，所有工程共享，命中时不再请求API"
+    )
+    translation_cache_ttl_days: bpy.props.IntProperty(
+        name="缓存有效期(天)",
+        default=90,
+        min=0,
+        description="超过有效期的缓存结果会重新翻译，0 表示永不过期（手动覆盖不受影响）"
+    )
     enable_auto_preprocess: bpy.props.BoolProperty(
         name="启用自动前置预处理",
         default=False,
@@ -249,8 +354,88 @@ class QSeparatorSettings(bpy.types.PropertyGroup):
         description="启用后，.001后缀的重复材质不会被分离",
         default=False
     )
+    limit_split_mode: bpy.props.EnumProperty(
+        name="超限拆分方式",
+        items=[
+            ('NONE', "不拆分", "只检查，不修改模型"),
+            ('MATERIAL', "按材质", "按材质边界把超限子模型拆成多个 bodygroup"),
+            ('LOOSE', "按连通块", "按不相连的网格块把超限子模型拆成多个 bodygroup"),
+        ],
+        default='MATERIAL',
+        description="导出前检查发现顶点超限时的自动拆分方式"
+    )
 
 # ------------------------- 核心逻辑 -------------------------
+class DrawCache:
+    """面板绘制缓存
+
+    面板 draw/poll 每次鼠标移动都会调用，派生列表和文件检查在这里按标签缓存：
+    'materials'、'objects' 由依赖图更新失效，'settings' 由列表属性的 update 回调失效，
+    键中同时带上数量等廉价签名，新增/删除数据块即使没有依赖图通知也不会读到旧值。
+    文件检查没有事件可用，按短时间过期。
+    """
+    FILE_TTL = 2.0
+
+    def __init__(self):
+        self._values: Dict[str, dict] = {}
+        self._files: Dict[str, tuple] = {}
+
+    def invalidate(self, *tags) -> None:
+        if not tags:
+            self._values.clear()
+            self._files.clear()
+            return
+        for tag in tags:
+            self._values.pop(tag, None)
+
+    def get(self, tag: str, key: tuple, compute):
+        """key[0] 为缓存项名称，其余为签名；同一名称只保留当前签名的值"""
+        bucket = self._values.setdefault(tag, {})
+        entry = bucket.get(key[0])
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        value = compute()
+        bucket[key[0]] = (key, value)
+        return value
+
+    def file_exists(self, path: str) -> bool:
+        now = time.monotonic()
+        cached = self._files.get(path)
+        if cached is not None and now - cached[1] < self.FILE_TTL:
+            return cached[0]
+        exists = os.path.exists(path)
+        self._files[path] = (exists, now)
+        return exists
+
+draw_cache = DrawCache()
+
+@persistent
+def draw_cache_depsgraph_handler(scene, depsgraph=None):
+    """依赖图更新时按数据类型让面板缓存失效"""
+    if depsgraph is None:
+        draw_cache.invalidate()
+        return
+    for update in depsgraph.updates:
+        id_data = update.id
+        if isinstance(id_data, bpy.types.Material):
+            draw_cache.invalidate('materials')
+        elif isinstance(id_data, bpy.types.Object):
+            draw_cache.invalidate('objects')
+
+def has_available_materials(items, list_name: str) -> bool:
+    """是否还有未加入列表的材质（面板中“添加”按钮的启用状态）"""
+    def compute():
+        return len(bpy.data.materials) > len(selected_names_in(items, "material", list_name))
+    return draw_cache.get('materials', (list_name, len(bpy.data.materials), len(items)), compute)
+
+def has_available_mesh_objects(context, items) -> bool:
+    """场景中是否还有未加入排除列表的网格对象"""
+    scene = context.scene
+    def compute():
+        excluded = selected_names_in(items, "target", "excluded_items")
+        return any(obj.type == 'MESH' and obj.name not in excluded for obj in scene.objects)
+    return draw_cache.get('objects', ("mesh_objects", scene.name, len(scene.objects), len(items)), compute)
+
 @dataclass
 class CollectionInfo:
     """集合信息缓存类"""
@@ -259,55 +444,507 @@ class CollectionInfo:
     objects: List[str]
 
 class CollectionCache:
-    """集合缓存管理器"""
+    """集合缓存管理器
+
+    由依赖图更新和重命名通知精确失效：集合变化时只重建该集合的子树，
+    结构签名（场景、集合数、对象数）不一致时整体重建，因此查询结果不会过期。
+    """
     def __init__(self):
         self.cache: Dict[str, CollectionInfo] = {}
-        self.last_update = 0
+        self.children: Dict[str, List[str]] = {}
+        self.root_name: Optional[str] = None
+        self.dirty = True
+        self.dirty_collections: Set[str] = set()
+        self._signature = None
+        self._order: Optional[List[str]] = None
+    
+    def invalidate(self, collection_names=None) -> None:
+        """标记缓存失效；传入集合名称时只重建这些集合的子树"""
+        if collection_names is None:
+            self.dirty = True
+        else:
+            self.dirty_collections.update(collection_names)
+    
+    @staticmethod
+    def _structure_signature(context) -> tuple:
+        return (context.scene.name, len(bpy.data.collections), len(bpy.data.objects))
     
     def update_cache(self, context) -> None:
-        """更新集合缓存"""
-        current_time = time.time()
-        # 每秒最多更新一次缓存
-        if current_time - self.last_update < 1.0:
-            return
-            
+        """按需更新集合缓存"""
+        signature = self._structure_signature(context)
+        if self.dirty or signature != self._signature:
+            self._rebuild(context, signature)
+        elif self.dirty_collections:
+            self._update_subtrees()
+    
+    def ensure(self, context) -> 'CollectionCache':
+        self.update_cache(context)
+        return self
+    
+    def _process_collection(self, coll, parent_name: Optional[str], level: int):
+        self.cache[coll.name] = CollectionInfo(
+            level=level,
+            parent=parent_name,
+            objects=[obj.name for obj in coll.objects]
+        )
+        self.children[coll.name] = [child.name for child in coll.children]
+        for child in coll.children:
+            self._process_collection(child, coll.name, level + 1)
+    
+    def _rebuild(self, context, signature) -> None:
         self.cache.clear()
+        self.children.clear()
         scene_coll = context.scene.collection
-        
-        def process_collection(coll, parent_name: Optional[str], level: int):
-            self.cache[coll.name] = CollectionInfo(
-                level=level,
-                parent=parent_name,
-                objects=[obj.name for obj in coll.objects]
-            )
-            for child in coll.children:
-                process_collection(child, coll.name, level + 1)
-                
-        process_collection(scene_coll, None, 0)
-        self.last_update = current_time
+        self.root_name = scene_coll.name
+        self._process_collection(scene_coll, None, 0)
+        self._signature = signature
+        self.dirty = False
+        self.dirty_collections.clear()
+        self._order = None
+    
+    def _remove_subtree(self, name: str) -> None:
+        for child in self.children.pop(name, []):
+            self._remove_subtree(child)
+        self.cache.pop(name, None)
+    
+    def _update_subtrees(self) -> None:
+        names, self.dirty_collections = self.dirty_collections, set()
+        # 先处理层级浅的集合，子集合若已不在树中则自然跳过
+        for name in sorted((n for n in names if n in self.cache), key=lambda n: self.cache[n].level):
+            info = self.cache.get(name)
+            if info is None:
+                continue
+            coll = self._lookup(name)
+            if coll is None:
+                self.dirty = True
+                return
+            self._remove_subtree(name)
+            self._process_collection(coll, info.parent, info.level)
+        self._order = None
+    
+    def _lookup(self, name: str):
+        if name == self.root_name:
+            return bpy.context.scene.collection
+        return bpy.data.collections.get(name)
+    
+    def ordered_names(self) -> List[str]:
+        """按层级深度优先的顺序返回所有集合名称（与场景大纲顺序一致）"""
+        if self._order is None:
+            order, seen = [], set()
+            stack = [self.root_name] if self.root_name else []
+            while stack:
+                name = stack.pop()
+                if name in seen or name not in self.cache:
+                    continue
+                seen.add(name)
+                order.append(name)
+                stack.extend(reversed(self.children.get(name, [])))
+            self._order = order
+        return self._order
+    
+    # ----- 索引查询（调用前先 ensure/update_cache） -----
+    def get_level(self, name: str) -> Optional[int]:
+        info = self.cache.get(name)
+        return info.level if info else None
+    
+    def get_parent(self, name: str) -> Optional[str]:
+        info = self.cache.get(name)
+        return info.parent if info else None
+    
+    def get_children(self, name: str) -> List[str]:
+        return self.children.get(name, [])
+    
+    def get_objects(self, name: str) -> List[str]:
+        info = self.cache.get(name)
+        return info.objects if info else []
+    
+    def collections_at_level(self, level: int) -> List[str]:
+        return [name for name in self.ordered_names() if self.cache[name].level == level]
+    
+    def second_level(self) -> List[str]:
+        return [name for name in self.collections_at_level(2)
+                if self.cache[name].parent != "Collection"]
 
 # 创建全局缓存实例
 collection_cache = CollectionCache()
 
+@persistent
+def collection_cache_depsgraph_handler(scene, depsgraph=None):
+    """依赖图更新时标记受影响的集合"""
+    if depsgraph is None:
+        collection_cache.invalidate()
+        material_membership_index.invalidate()
+        return
+    for update in depsgraph.updates:
+        id_data = update.id
+        if isinstance(id_data, bpy.types.Collection):
+            collection_cache.invalidate({id_data.original.name})
+            material_membership_index.invalidate({id_data.original.name})
+        elif isinstance(id_data, bpy.types.Object):
+            # 材质槽变化会产生对象更新
+            material_membership_index.invalidate({coll.name for coll in id_data.original.users_collection})
+        elif isinstance(id_data, bpy.types.Mesh):
+            # 网格可能被多个集合中的对象共用，无法直接定位集合
+            material_membership_index.invalidate()
+        elif isinstance(id_data, bpy.types.Scene):
+            # 场景更新很频繁（选择、帧变化等），只有根集合的直接内容变化时才失效
+            root = id_data.original.collection
+            info = collection_cache.cache.get(root.name)
+            if (info is None or
+                    collection_cache.children.get(root.name) != [c.name for c in root.children] or
+                    len(info.objects) != len(root.objects)):
+                collection_cache.invalidate({root.name})
+
+@persistent
+def collection_cache_reset_handler(*args):
+    """打开文件、撤销/重做后整体失效，并重新订阅重命名通知"""
+    collection_cache.invalidate()
+    material_membership_index.invalidate()
+    draw_cache.invalidate()
+    subscribe_collection_cache_msgbus()
+
+_collection_cache_msgbus_owner = object()
+
+def subscribe_collection_cache_msgbus():
+    """集合、对象或材质重命名不一定产生依赖图更新，通过 msgbus 监听名称变化"""
+    bpy.msgbus.clear_by_owner(_collection_cache_msgbus_owner)
+    for id_type in (bpy.types.Collection, bpy.types.Object):
+        bpy.msgbus.subscribe_rna(
+            key=(id_type, "name"),
+            owner=_collection_cache_msgbus_owner,
+            args=(),
+            notify=collection_cache.invalidate,
+        )
+    # 面板缓存中的眼睛材质判断依赖材质名称
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.Material, "name"),
+        owner=_collection_cache_msgbus_owner,
+        args=('materials',),
+        notify=draw_cache.invalidate,
+    )
+
+class CollectionHierarchyIndex:
+    """集合层级索引（子集合→父集合、名称→集合、各场景根集合）
+
+    每次操作开始时构建一次，之后的链接/解除链接/删除都通过索引完成并同步更新，
+    避免每次查找父级时遍历全部集合。场景根集合用 SCENE_PREFIX + 场景名 作为键。
+    移动集合时只解除当前场景内的父级，其他场景根集合下的链接保持不变。
+    """
+    SCENE_PREFIX = "\x00scene:"
+
+    def __init__(self):
+        self.by_name: Dict[str, bpy.types.Collection] = {}
+        self.parents: Dict[str, Set[str]] = {}
+        self.children: Dict[str, Set[str]] = {}
+        self.roots: Dict[str, Set[str]] = {}
+        self._scene_roots: Dict[str, bpy.types.Collection] = {}
+        self.current_root: str = ""
+
+    @classmethod
+    def build(cls, scene=None) -> 'CollectionHierarchyIndex':
+        index = cls()
+        scene = scene or bpy.context.scene
+        if scene is not None:
+            index.current_root = cls.SCENE_PREFIX + scene.name
+        for coll in bpy.data.collections:
+            index.by_name[coll.name] = coll
+            index.parents.setdefault(coll.name, set())
+            index.children[coll.name] = {child.name for child in coll.children}
+        for name, child_names in index.children.items():
+            for child_name in child_names:
+                index.parents.setdefault(child_name, set()).add(name)
+        for scene in bpy.data.scenes:
+            key = cls.SCENE_PREFIX + scene.name
+            index._scene_roots[key] = scene.collection
+            top_level = {child.name for child in scene.collection.children}
+            index.roots[scene.name] = top_level
+            index.children[key] = top_level
+            for child_name in top_level:
+                index.parents.setdefault(child_name, set()).add(key)
+        return index
+
+    def _key(self, coll) -> str:
+        """集合对应的索引键；场景根集合名称都相同，需要按对象区分"""
+        if coll.name in self.by_name and self.by_name[coll.name] == coll:
+            return coll.name
+        for key, root in self._scene_roots.items():
+            if root == coll:
+                return key
+        return coll.name
+
+    def _resolve(self, key: str):
+        if key in self._scene_roots:
+            return self._scene_roots[key]
+        return self.by_name.get(key)
+
+    def get(self, name: str):
+        return self.by_name.get(name)
+
+    def add(self, coll, parent=None) -> None:
+        """登记新建的集合，可同时链接到父集合"""
+        self.by_name[coll.name] = coll
+        self.parents.setdefault(coll.name, set())
+        self.children.setdefault(coll.name, set())
+        if parent is not None:
+            self.link(parent, coll)
+
+    def new(self, name: str, parent) -> bpy.types.Collection:
+        coll = bpy.data.collections.new(name)
+        self.add(coll, parent)
+        return coll
+
+    def parents_of(self, coll) -> List:
+        return [parent for parent in map(self._resolve, self.parents.get(coll.name, ())) if parent is not None]
+
+    def is_child_of(self, coll, parent) -> bool:
+        return self._key(parent) in self.parents.get(coll.name, ())
+
+    def link(self, parent, coll) -> bool:
+        parent_key = self._key(parent)
+        linked = self.parents.setdefault(coll.name, set())
+        if parent_key in linked:
+            return False
+        parent.children.link(coll)
+        linked.add(parent_key)
+        self.children.setdefault(parent_key, set()).add(coll.name)
+        return True
+
+    def unlink(self, coll, parent=None) -> int:
+        """从指定父集合（默认全部父集合）解除链接，返回解除的数量"""
+        linked = self.parents.get(coll.name, set())
+        keys = [self._key(parent)] if parent is not None else list(linked)
+        count = 0
+        for key in keys:
+            if key not in linked:
+                continue
+            parent_coll = self._resolve(key)
+            if parent_coll is not None:
+                try:
+                    parent_coll.children.unlink(coll)
+                    count += 1
+                except Exception as e:
+                    print(f"解除集合 {coll.name} 的链接时出错: {str(e)}")
+                    continue
+            linked.discard(key)
+            self.children.get(key, set()).discard(coll.name)
+        return count
+
+    def move(self, coll, new_parent) -> bool:
+        """将集合移动到新父集合下（解除其他父级，但保留其他场景根集合下的链接），已在正确位置时返回False"""
+        new_key = self._key(new_parent)
+        linked = self.parents.get(coll.name, set())
+        other_roots = {key for key in linked if key in self._scene_roots and key != self.current_root}
+        if linked - other_roots == {new_key}:
+            return False
+        for key in list(linked):
+            if key != new_key and key not in other_roots:
+                self.unlink(coll, self._resolve(key))
+        self.link(new_parent, coll)
+        return True
+
+    def remove(self, coll) -> None:
+        """删除集合并同步索引"""
+        name = coll.name
+        self.unlink(coll)
+        for child_name in self.children.pop(name, set()):
+            self.parents.get(child_name, set()).discard(name)
+        self.parents.pop(name, None)
+        self.by_name.pop(name, None)
+        bpy.data.collections.remove(coll)
+
+    def cleanup_empty(self, exclude=()) -> int:
+        """自底向上删除空集合（无对象且无子集合），父集合因此变空时一并删除"""
+        excluded = {coll.name if hasattr(coll, "name") else coll for coll in exclude}
+        pending = [name for name in self.by_name if not self.children.get(name)]
+        removed = 0
+        while pending:
+            name = pending.pop()
+            coll = self.by_name.get(name)
+            if coll is None or name in excluded or self.children.get(name) or len(coll.objects):
+                continue
+            parent_keys = [key for key in self.parents.get(name, ()) if key in self.by_name]
+            try:
+                self.remove(coll)
+                removed += 1
+            except Exception as e:
+                print(f"清理集合时出错: {str(e)}")
+                continue
+            pending.extend(parent_keys)
+        if removed:
+            collection_cache.invalidate()
+        return removed
+
+class DatablockTracker:
+    """记录工具自己创建或变为孤立的数据块，只释放这些数据块
+
+    取代全局的 orphans_purge：用户文件里其它零用户数据（例如未启用假用户的备用材质）不会被误删。
+    释放时只删除用户数为0的数据块，并循环直到没有新的可释放项，
+    因此删除网格后变为孤立的材质、贴图会在同一次释放中一并删除。
+    """
+    ID_TYPE_COLLECTIONS = {
+        'OBJECT': "objects",
+        'COLLECTION': "collections",
+        'MESH': "meshes",
+        'MATERIAL': "materials",
+        'NODETREE': "node_groups",
+        'IMAGE': "images",
+    }
+
+    def __init__(self):
+        self.blocks = {}
+
+    def track(self, block) -> None:
+        """记录单个数据块（不支持的类型和库数据会被忽略）"""
+        if block is None or getattr(block, "library", None) is not None:
+            return
+        if getattr(block, "id_type", None) not in self.ID_TYPE_COLLECTIONS:
+            return
+        self.blocks.setdefault(block.as_pointer(), block)
+
+    def track_node_tree(self, node_tree) -> None:
+        """记录节点树引用的贴图和节点组"""
+        if node_tree is None:
+            return
+        for node in node_tree.nodes:
+            if node.type == 'TEX_IMAGE':
+                self.track(node.image)
+            elif node.type == 'GROUP' and node.node_tree is not None:
+                self.track(node.node_tree)
+
+    def track_material(self, mat) -> None:
+        """记录材质及其节点树引用的数据"""
+        if mat is None:
+            return
+        self.track(mat)
+        if mat.use_nodes:
+            self.track_node_tree(mat.node_tree)
+
+    def track_object_data(self, obj) -> None:
+        """记录对象的网格和材质（不含对象本身）"""
+        if obj.type == 'MESH' and obj.data is not None:
+            self.track(obj.data)
+            for mat in obj.data.materials:
+                self.track_material(mat)
+        for slot in obj.material_slots:
+            self.track_material(slot.material)
+
+    def free(self) -> int:
+        """释放已记录且用户数为0的数据块，返回释放数量"""
+        freed = 0
+        progress = True
+        while progress and self.blocks:
+            progress = False
+            for key, block in list(self.blocks.items()):
+                try:
+                    users = block.users
+                    id_type = block.id_type
+                except ReferenceError:
+                    # 已经被其它代码删除
+                    del self.blocks[key]
+                    continue
+                if users > 0:
+                    continue
+                try:
+                    getattr(bpy.data, self.ID_TYPE_COLLECTIONS[id_type]).remove(block)
+                except Exception as e:
+                    print(f"释放数据块时出错: {str(e)}")
+                    del self.blocks[key]
+                    continue
+                del self.blocks[key]
+                freed += 1
+                progress = True
+        if freed:
+            collection_cache.invalidate()
+            draw_cache.invalidate("materials", "objects")
+        return freed
+
+    def clear(self) -> None:
+        self.blocks.clear()
+
+def purge_all_orphans() -> None:
+    """全局清理所有孤立数据（仅在用户明确开启时使用）"""
+    bpy.ops.outliner.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+
 def get_second_level_collections(context) -> List[str]:
     """获取所有第二层级的集合"""
-    collection_cache.update_cache(context)
-    return [name for name, info in collection_cache.cache.items() 
-            if info.level == 2 and info.parent != "Collection"]
+    return collection_cache.ensure(context).second_level()
+
+@dataclass
+class QCGenerationSets:
+    """一次QC生成中使用的排除集合与blank控制，每次生成只构建一次"""
+    excluded_object_names: Set[str]
+    excluded_material_names: Set[str]
+    # 未启用“应用材质排除”时仍按名称保留原名（与之前行为一致）
+    listed_material_names: Set[str]
+    material_blank_controls: Dict[str, bool]
+
+    @classmethod
+    def from_settings(cls, settings) -> 'QCGenerationSets':
+        listed_materials = {item.material.name for item in settings.excluded_materials if item.material}
+        material_blank_controls = {}
+        if settings.enable_material_blank_control:
+            for item in settings.material_blank_controls:
+                if item.material:
+                    material_blank_controls[item.material.name] = item.blank_mode == 'INCLUDE'
+        return cls(
+            excluded_object_names={item.target.name for item in settings.excluded_items if item.target} if settings.affect_output else set(),
+            excluded_material_names=listed_materials if settings.affect_materials else set(),
+            listed_material_names=listed_materials,
+            material_blank_controls=material_blank_controls,
+        )
+
+class MaterialMembershipIndex:
+    """集合→材质名称集合 的缓存索引
+
+    依赖图中对象、网格或集合更新时按集合失效，生成QC时不再逐个遍历材质槽。
+    """
+    def __init__(self):
+        self.by_collection: Dict[str, frozenset] = {}
+        self.objects_by_collection: Dict[str, frozenset] = {}
+        self.dirty_collections: Set[str] = set()
+
+    def invalidate(self, collection_names=None) -> None:
+        if collection_names is None:
+            self.by_collection.clear()
+            self.objects_by_collection.clear()
+            self.dirty_collections.clear()
+        else:
+            self.dirty_collections.update(collection_names)
+
+    def _ensure(self, coll) -> None:
+        name = coll.name
+        if name in self.by_collection and name not in self.dirty_collections:
+            return
+        self.dirty_collections.discard(name)
+        materials = set()
+        meshes_seen = set()
+        for obj in coll.objects:
+            data = obj.data
+            if data is None or data.name in meshes_seen or not hasattr(data, "materials"):
+                continue
+            meshes_seen.add(data.name)
+            materials.update(mat.name for mat in data.materials if mat)
+        self.by_collection[name] = frozenset(materials)
+        self.objects_by_collection[name] = frozenset(obj.name for obj in coll.objects)
+
+    def materials_of(self, coll) -> frozenset:
+        self._ensure(coll)
+        return self.by_collection[coll.name]
 
-def generate_bodygroups(context):
+    def object_names_of(self, coll) -> frozenset:
+        self._ensure(coll)
+        return self.objects_by_collection[coll.name]
+
+material_membership_index = MaterialMembershipIndex()
+
+def collect_bodygroup_entries(context, sets: QCGenerationSets = None):
+    """收集需要生成配置的集合，返回 (条目参数列表, 需要翻译的名称列表, 生成用集合)"""
     settings = context.scene.qseparator_settings
-    excluded_objects = {item.target for item in settings.excluded_items if item.target} if settings.affect_output else set()
-    excluded_materials = {item.material for item in settings.excluded_materials if item.material} if settings.affect_materials else set()
-    
-    # 构建材质级别blank控制字典
-    material_blank_controls = {}
-    if settings.enable_material_blank_control:
-        for item in settings.material_blank_controls:
-            if item.material:
-                material_blank_controls[item.material.name] = item.blank_mode == 'INCLUDE'
+    if sets is None:
+        sets = QCGenerationSets.from_settings(settings)
+    material_blank_controls = sets.material_blank_controls
     
-    config_entries = []
+    entry_args = []
     second_level_colls = get_second_level_collections(context)
     
     for coll_name in second_level_colls:
@@ -315,29 +952,18 @@ def generate_bodygroups(context):
         if not coll or not coll.objects:
             continue
             
-        # 检查集合是否包含排除对象或材质
-        contains_excluded_obj = any(obj in excluded_objects for obj in coll.objects)
-        contains_excluded_mat = any(mat in excluded_materials 
-                                  for obj in coll.objects 
-                                  for mat in obj.data.materials if mat)
+        # 检查集合是否包含排除对象或材质（来自缓存的集合材质索引）
+        contains_excluded_obj = not sets.excluded_object_names.isdisjoint(material_membership_index.object_names_of(coll))
+        contains_excluded_mat = not sets.excluded_material_names.isdisjoint(material_membership_index.materials_of(coll))
 
         # 根据blank控制模式决定是否包含blank行
         include_blank = True
         
-        if settings.enable_material_blank_control:
+        if settings.enable_material_blank_control and coll_name in material_blank_controls:
             # 材质级别控制模式：检查集合名称是否在材质blank控制列表中
-            if coll_name in material_blank_controls:
-                include_blank = material_blank_controls[coll_name]
-            else:
-                # 如果没有特别设置，使用全局模式
-                if settings.blank_control_mode == 'ALWAYS':
-                    include_blank = True
-                elif settings.blank_control_mode == 'NEVER':
-                    include_blank = False
-                else:  # AUTO模式
-                    include_blank = not (contains_excluded_obj or contains_excluded_mat)
+            include_blank = material_blank_controls[coll_name]
         else:
-            # 全局控制模式
+            # 全局控制模式（材质级别未特别设置时同样使用全局模式）
             if settings.blank_control_mode == 'ALWAYS':
                 include_blank = True
             elif settings.blank_control_mode == 'NEVER':
@@ -345,20 +971,130 @@ def generate_bodygroups(context):
             else:  # AUTO模式
                 include_blank = not (contains_excluded_obj or contains_excluded_mat)
         
-        # 生成配置条目
-        config_entry = generate_config_entry(
-            coll, 
-            settings.export_mode, 
-            settings.translate_mode, 
-            include_blank=include_blank,
-            material_blank_controls=material_blank_controls,
-            contains_excluded_mat=contains_excluded_mat
-        )
-        if config_entry:
-            config_entries.append(config_entry)
+        entry_args.append((coll, include_blank, contains_excluded_mat))
+    
+    names_to_translate = []
+    if settings.translate_mode != 'NONE':
+        names_to_translate = [coll.name for coll, _, contains_excluded_mat in entry_args
+                              if not contains_excluded_mat and coll.name not in sets.listed_material_names]
+    return entry_args, names_to_translate, sets
+
+def iter_bodygroup_blocks(context, translations: dict = None):
+    """逐个生成 (集合名称, $bodygroup 文本块)；translations 为空时同步批量翻译（命中缓存时不联网）"""
+    settings = context.scene.qseparator_settings
+    entry_args, names_to_translate, sets = collect_bodygroup_entries(context)
+    
+    # 一次性批量翻译所有需要翻译的集合名称
+    if translations is None:
+        translations = translate_batch(names_to_translate, settings.translate_mode) if names_to_translate else {}
     
+    try:
+        for coll, include_blank, contains_excluded_mat in entry_args:
+            # 生成配置条目
+            config_entry = generate_config_entry(
+                coll, 
+                settings.export_mode, 
+                settings.translate_mode, 
+                include_blank=include_blank,
+                material_blank_controls=sets.material_blank_controls,
+                contains_excluded_mat=contains_excluded_mat,
+                translations=translations,
+                excluded_material_names=sets.listed_material_names
+            )
+            if config_entry:
+                yield coll.name, config_entry
+    finally:
+        translation_cache.save()
+
+def generate_bodygroups(context, translations: dict = None):
+    """生成所有 $bodygroup 配置"""
+    config_entries = [block for _, block in iter_bodygroup_blocks(context, translations)]
     return '\n'.join(config_entries) if config_entries else "// 没有可生成的配置内容"
 
+QC_REGION_BEGIN = "// ==== MQ_Tools bodygroups begin ===="
+QC_REGION_END = "// ==== MQ_Tools bodygroups end ===="
+_QC_BODYGROUP_RE = re.compile(r'^\$bodygroup\s+"([^"]*)"', re.MULTILINE)
+
+def split_qc_bodygroup_region(text: str):
+    """拆分已有QC文件：返回 (区域前文本, {显示名: 文本块}, 块顺序, 区域后文本)
+
+    文件中有工具写入的标记区域时只替换区域内容；没有标记时整个文件视为区域前文本，
+    新内容追加在末尾（.qci 新文件则只包含区域）。
+    """
+    begin = text.find(QC_REGION_BEGIN)
+    end = text.find(QC_REGION_END, begin + 1) if begin != -1 else -1
+    if begin == -1 or end == -1:
+        return text, {}, [], ""
+    prefix = text[:begin]
+    suffix = text[end + len(QC_REGION_END):]
+    body = text[begin + len(QC_REGION_BEGIN):end]
+    blocks, order = {}, []
+    matches = list(_QC_BODYGROUP_RE.finditer(body))
+    for i, match in enumerate(matches):
+        block_end = matches[i + 1].start() if i + 1 < len(matches) else len(body)
+        block = body[match.start():block_end].rstrip('\n') + '\n'
+        blocks[match.group(1)] = block
+        order.append(match.group(1))
+    return prefix, blocks, order, suffix
+
+def write_qc_bodygroups(path: str, blocks, copy_to_clipboard: bool = False, window_manager=None) -> dict:
+    """把 $bodygroup 文本块流式写入 .qc/.qci 文件
+
+    与文件中已有的标记区域逐块比较，全部未变化时不改写文件（保留修改时间，
+    避免触发重新编译）；有变化时写入临时文件后原子替换。返回各类块数量统计。
+    """
+    path = bpy.path.abspath(path)
+    old_text = ""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            old_text = f.read()
+    prefix, old_blocks, old_order, suffix = split_qc_bodygroup_region(old_text)
+    if prefix and not prefix.endswith('\n'):
+        prefix += '\n'
+
+    stats = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    new_order = []
+    clipboard_parts = [] if copy_to_clipboard else None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(prefix)
+            f.write(QC_REGION_BEGIN + '\n')
+            for _, block in blocks:
+                match = _QC_BODYGROUP_RE.match(block)
+                display_name = match.group(1) if match else block
+                normalized = block.rstrip('\n') + '\n'
+                previous = old_blocks.get(display_name)
+                if previous is None:
+                    stats["added"] += 1
+                elif previous != normalized:
+                    stats["changed"] += 1
+                else:
+                    stats["unchanged"] += 1
+                new_order.append(display_name)
+                f.write(normalized)
+                if clipboard_parts is not None:
+                    clipboard_parts.append(block)
+            f.write(QC_REGION_END)
+            f.write(suffix if suffix else '\n')
+        stats["removed"] = len(set(old_order) - set(new_order))
+        if old_text and not stats["added"] and not stats["changed"] and not stats["removed"] and new_order == old_order:
+            os.remove(tmp_path)
+            stats["written"] = False
+        else:
+            os.replace(tmp_path, path)
+            stats["written"] = True
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if clipboard_parts is not None and window_manager is not None:
+        window_manager.clipboard = '\n'.join(clipboard_parts) if clipboard_parts else "// 没有可生成的配置内容"
+    stats["count"] = len(new_order)
+    return stats
+
 def generate_define_variable(context):
     """生成DefineVariable QC代码"""
     settings = context.scene.qseparator_settings
@@ -371,26 +1107,10 @@ def generate_define_variable(context):
     
     return define_variable
 
-def translate_text(text: str, mode: str) -> str:
-    """统一的翻译处理函数"""
-    settings = bpy.context.scene.qseparator_settings
-    
-    if mode == 'NONE' or not settings.api_key:
-        return text
-
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {settings.api_key}"
-    }
-    
-    if mode.startswith('AI_'):
-        # 获取翻译风格设置
-        translation_style = settings.translation_style
-        
-        if mode == 'AI_CH2EN':
-            if translation_style == 'ANIME':
-                system_prompt = """你是专业的二次元角色模型翻译专家。你的任务是将中文3D模型组件名称翻译为标准英文术语。
+# AI翻译的系统提示词 {(翻译模式, 翻译风格): 提示词}
+TRANSLATION_SYSTEM_PROMPTS = {
+    # 中译英 - 二次元风格
+    ('AI_CH2EN', 'ANIME'): """你是专业的二次元角色模型翻译专家。你的任务是将中文3D模型组件名称翻译为标准英文术语。
 
 【核心翻译原则】
 - 必须严格遵循二次元角色建模的专业术语标准
@@ -415,9 +1135,9 @@ def translate_text(text: str, mode: str) -> str:
 2. 必须使用下划线连接复合词 - 这是不可违背的格式要求
 3. 发挥你的专业判断，确保翻译质量
 4. 如果遇到不确定的术语，优先参考对照表，其次使用领域通用术语
-5. 每次输出前进行自我检查：是否符合格式要求？是否遵循术语标准？"""
-            else:  # REALISTIC
-                system_prompt = """你是专业的写实风格模型翻译专家。你的任务是将中文3D模型组件名称翻译为标准英文术语。
+5. 每次输出前进行自我检查：是否符合格式要求？是否遵循术语标准？""",
+    # 中译英 - 写实风格
+    ('AI_CH2EN', 'REALISTIC'): """你是专业的写实风格模型翻译专家。你的任务是将中文3D模型组件名称翻译为标准英文术语。
 
 【核心翻译原则】
 - 必须严格遵循写实风格建模的专业术语标准
@@ -442,10 +1162,9 @@ def translate_text(text: str, mode: str) -> str:
 2. 必须使用下划线连接复合词 - 这是不可违背的格式要求
 3. 发挥你的专业判断，确保翻译质量
 4. 如果遇到不确定的术语，优先参考对照表，其次使用领域通用术语
-5. 每次输出前进行自我检查：是否符合格式要求？是否遵循术语标准？"""
-        else:  # AI_EN2CH
-            if translation_style == 'ANIME':
-                system_prompt = """你是专业的二次元角色模型翻译专家。你的任务是将英文3D模型组件名称翻译为标准中文术语。
+5. 每次输出前进行自我检查：是否符合格式要求？是否遵循术语标准？""",
+    # 英译中 - 二次元风格
+    ('AI_EN2CH', 'ANIME'): """你是专业的二次元角色模型翻译专家。你的任务是将英文3D模型组件名称翻译为标准中文术语。
 
 【核心翻译原则】
 - 必须严格遵循二次元角色建模的专业术语标准
@@ -470,9 +1189,9 @@ Cloth→衣服 | Effect→特效 | Base→基础 | Head→头部 | Main→主体
 2. 必须使用简洁准确的中文术语 - 这是不可违背的格式要求
 3. 发挥你的专业判断，确保翻译质量
 4. 如果遇到不确定的术语，优先参考对照表，其次使用领域通用术语
-5. 每次输出前进行自我检查：是否符合格式要求？是否遵循术语标准？"""
-            else:  # REALISTIC
-                system_prompt = """你是专业的写实风格模型翻译专家。你的任务是将英文3D模型组件名称翻译为标准中文术语。
+5. 每次输出前进行自我检查：是否符合格式要求？是否遵循术语标准？""",
+    # 英译中 - 写实风格
+    ('AI_EN2CH', 'REALISTIC'): """你是专业的写实风格模型翻译专家。你的任务是将英文3D模型组件名称翻译为标准中文术语。
 
 【核心翻译原则】
 - 必须严格遵循写实风格建模的专业术语标准
@@ -506,34 +1225,472 @@ Cloth→织物 | Effect→特效 | Base→基础 | Head→头部 | Main→主体
 - Weapon_Effect -> 武器特效
 - Ribbon_Decoration -> 条带装饰物
 - Hair_Mesh_Component -> 毛发网格组件
-- Clothing_Main -> 衣物主体"""
+- Clothing_Main -> 衣物主体""",
+}
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"请翻译以下游戏模组组件名称：{text}"}
-        ]
+# 普通翻译（非AI模式）的提示模板
+PLAIN_TRANSLATION_TEMPLATE = "请将以下{direction}，只需要返回翻译结果：\n{text}"
+
+
+def translation_style_key(mode: str, style: str) -> str:
+    """普通翻译不区分风格"""
+    return style if mode.startswith('AI_') else ""
+
+
+def translation_prompt_version(mode: str, style: str) -> str:
+    """提示词的版本号（内容哈希），修改提示词后旧的缓存结果自动失效"""
+    if mode.startswith('AI_'):
+        prompt = TRANSLATION_SYSTEM_PROMPTS.get((mode, style), "")
     else:
-        direction = "中文翻译为英文" if mode == 'CH2EN' else "英文翻译为中文"
-        messages = [
-            {"role": "user", "content": f"请将以下{direction}，只需要返回翻译结果：\n{text}"}
+        prompt = PLAIN_TRANSLATION_TEMPLATE + mode
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]
+
+
+def build_translation_messages(text: str, mode: str, style: str) -> list:
+    if mode.startswith('AI_'):
+        return [
+            {"role": "system", "content": TRANSLATION_SYSTEM_PROMPTS[(mode, style)]},
+            {"role": "user", "content": f"请翻译以下游戏模组组件名称：{text}"}
         ]
-    
-    data = {
-        "model": "deepseek-chat",
-        "messages": messages,
-        "temperature": 0.1
-    }
-    
+    direction = "中文翻译为英文" if mode == 'CH2EN' else "英文翻译为中文"
+    return [
+        {"role": "user", "content": PLAIN_TRANSLATION_TEMPLATE.format(direction=direction, text=text)}
+    ]
+
+
+class TranslationCache:
+    """持久化翻译缓存，按 (翻译模式, 翻译风格, 原文) 存储，所有 .blend 文件共享
+
+    文件结构：{"version": 1, "entries": {键: {"value", "time", "prompt"}}, "overrides": {键: 译文}}
+    手动覆盖优先且永不过期；普通条目在超过有效期或提示词版本变化后失效。
+    """
+    FILE_VERSION = 1
+
+    def __init__(self):
+        self.entries: Dict[str, dict] = {}
+        self.overrides: Dict[str, str] = {}
+        self.loaded_path = None
+        self.loaded_mtime = None
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_path() -> str:
+        directory = bpy.utils.user_resource('CONFIG', path="mq_tools", create=True)
+        return os.path.join(directory, "translation_cache.json")
+
+    @staticmethod
+    def make_key(mode: str, style: str, text: str) -> str:
+        return f"{mode}|{translation_style_key(mode, style)}|{text}"
+
+    def load(self):
+        """首次使用或文件被外部修改（如手动编辑覆盖表）时重新读取"""
+        path = self.get_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if path == self.loaded_path and mtime == self.loaded_mtime:
+            return
+        entries, overrides = {}, {}
+        if mtime is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == self.FILE_VERSION:
+                    entries = data.get("entries", {})
+                    overrides = data.get("overrides", {})
+            except (OSError, ValueError) as e:
+                print(f"读取翻译缓存失败: {e}")
+        with self._lock:
+            self.entries, self.overrides = entries, overrides
+            self.loaded_path, self.loaded_mtime = path, mtime
+            self.dirty = False
+
+    def save(self):
+        if not self.dirty:
+            return
+        path = self.get_path()
+        with self._lock:
+            data = {"version": self.FILE_VERSION, "entries": dict(self.entries), "overrides": dict(self.overrides)}
+            self.dirty = False
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, path)
+            self.loaded_path, self.loaded_mtime = path, os.path.getmtime(path)
+        except OSError as e:
+            print(f"保存翻译缓存失败: {e}")
+
+    def get_override(self, mode: str, style: str, text: str) -> Optional[str]:
+        with self._lock:
+            return self.overrides.get(self.make_key(mode, style, text))
+
+    def get(self, mode: str, style: str, text: str, ttl_days: int = 0) -> Optional[str]:
+        key = self.make_key(mode, style, text)
+        with self._lock:
+            if key in self.overrides:
+                return self.overrides[key]
+            entry = self.entries.get(key)
+        if not entry or entry.get("prompt") != translation_prompt_version(mode, style):
+            return None
+        if ttl_days > 0 and time.time() - entry.get("time", 0) > ttl_days * 86400:
+            return None
+        return entry.get("value")
+
+    def put(self, mode: str, style: str, text: str, value: str):
+        key = self.make_key(mode, style, text)
+        with self._lock:
+            self.entries[key] = {"value": value, "time": int(time.time()),
+                                 "prompt": translation_prompt_version(mode, style)}
+            self.dirty = True
+
+    def set_override(self, mode: str, style: str, text: str, value: str):
+        key = self.make_key(mode, style, text)
+        with self._lock:
+            if value:
+                self.overrides[key] = value
+            else:
+                self.overrides.pop(key, None)
+            self.dirty = True
+
+    def clear(self, keep_overrides: bool = True):
+        with self._lock:
+            self.entries = {}
+            if not keep_overrides:
+                self.overrides = {}
+            self.dirty = True
+
+
+# 全局翻译缓存实例
+translation_cache = TranslationCache()
+
+
+# ----- 术语表本地翻译 -----
+
+def translation_direction(mode: str) -> str:
+    return 'CH2EN' if mode in {'CH2EN', 'AI_CH2EN'} else 'EN2CH'
+
+
+def _split_english_words(text: str) -> Optional[List[str]]:
+    """把英文名称拆分为单词（下划线/空格/连字符/驼峰），含非英文字符时返回 None"""
+    words = []
+    for segment in re.split(r'[_\-\s.]+', text):
+        if not segment:
+            continue
+        parts = re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+', segment)
+        if "".join(parts) != segment:
+            return None
+        words.extend(parts)
+    return words
+
+
+def parse_prompt_glossary(prompt: str) -> Dict[str, str]:
+    """从提示词的【关键术语对照表】中提取 原文→译文"""
+    match = re.search(r'【关键术语对照表】\n(.*?)(?:\n\n|\n【)', prompt, re.S)
+    if not match:
+        return {}
+    return {src.strip(): dst.strip()
+            for src, dst in re.findall(r'([^|\n→]+?)\s*→\s*([^|\n]+)', match.group(1))}
+
+
+class GlossaryTrie:
+    """按单元（中文为单字，英文为小写单词）存储术语的前缀树，支持最长匹配"""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, units, value: str):
+        node = self.root
+        for unit in units:
+            node = node.setdefault(unit, {})
+        node[""] = value
+
+    def longest_match(self, units, start: int):
+        """返回 (匹配长度, 译文)，没有匹配时返回 (0, None)"""
+        node, best = self.root, (0, None)
+        for i in range(start, len(units)):
+            node = node.get(units[i])
+            if node is None:
+                break
+            if "" in node:
+                best = (i - start + 1, node[""])
+        return best
+
+
+class GlossaryTranslator:
+    """术语表优先的本地翻译：名称能被术语完全覆盖时直接得出译文，无需联网
+
+    术语来自各风格提示词中的对照表，加上用户术语文件
+    (配置目录 mq_tools/glossary.json，格式 {"CH2EN": {原文: 译文}, "EN2CH": {...}})。
+    """
+
+    def __init__(self):
+        self._tries: Dict[tuple, GlossaryTrie] = {}
+        self._user_terms: Dict[str, Dict[str, str]] = {}
+        self._user_mtime = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_user_path() -> str:
+        directory = bpy.utils.user_resource('CONFIG', path="mq_tools", create=True)
+        return os.path.join(directory, "glossary.json")
+
+    def refresh(self):
+        """用户术语文件变化时重建前缀树（主线程调用）"""
+        path = self.get_user_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if self._loaded and mtime == self._user_mtime:
+            return
+        user_terms = {}
+        if mtime is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    user_terms = {k: dict(v) for k, v in json.load(f).items() if isinstance(v, dict)}
+            except (OSError, ValueError) as e:
+                print(f"读取用户术语表失败: {e}")
+        with self._lock:
+            self._user_terms, self._user_mtime = user_terms, mtime
+            self._tries = {}
+            self._loaded = True
+
+    def add_user_term(self, mode: str, source: str, translated: str):
+        self.refresh()
+        terms = {k: dict(v) for k, v in self._user_terms.items()}
+        terms.setdefault(translation_direction(mode), {})[source] = translated
+        path = self.get_user_path()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False, indent=1)
+        self._loaded = False
+        self.refresh()
+
+    def _units(self, direction: str, text: str):
+        if direction == 'CH2EN':
+            return list(text)
+        words = _split_english_words(text)
+        return [w.lower() for w in words] if words else None
+
+    def _get_trie(self, direction: str, style: str) -> GlossaryTrie:
+        key = (direction, style)
+        with self._lock:
+            trie = self._tries.get(key)
+            if trie is not None:
+                return trie
+            terms = parse_prompt_glossary(TRANSLATION_SYSTEM_PROMPTS.get((f"AI_{direction}", style), ""))
+            terms.update(self._user_terms.get(direction, {}))
+            trie = GlossaryTrie()
+            for source, translated in terms.items():
+                units = self._units(direction, source)
+                if units:
+                    trie.insert(units, translated)
+            self._tries[key] = trie
+            return trie
+
+    def translate(self, text: str, mode: str, style: str) -> Optional[str]:
+        """名称完全被术语覆盖时返回译文，否则返回 None（交给远程模型）"""
+        direction = translation_direction(mode)
+        trie = self._get_trie(direction, style)
+        pieces = []
+        if direction == 'CH2EN':
+            for segment in re.split(r'[_\-\s.]+', text):
+                i = 0
+                while i < len(segment):
+                    ascii_run = re.match(r'[A-Za-z0-9]+', segment[i:])
+                    if ascii_run:
+                        pieces.append(ascii_run.group(0))
+                        i += len(ascii_run.group(0))
+                        continue
+                    length, translated = trie.longest_match(segment, i)
+                    if not length:
+                        return None
+                    pieces.append(translated)
+                    i += length
+            return "_".join(pieces) or None
+
+        units = self._units(direction, text)
+        if not units:
+            return None
+        i = 0
+        while i < len(units):
+            if units[i].isdigit():
+                pieces.append(units[i])
+                i += 1
+                continue
+            length, translated = trie.longest_match(units, i)
+            if not length:
+                return None
+            pieces.append(translated)
+            i += length
+        return "".join(pieces)
+
+
+# 全局术语表翻译器
+glossary_translator = GlossaryTranslator()
+
+
+def resolve_local_translation(text: str, mode: str, options) -> Optional[str]:
+    """不联网的翻译来源，依次为：手动覆盖 → 术语表 → 缓存"""
+    if options.use_cache:
+        override = translation_cache.get_override(mode, options.style, text)
+        if override:
+            return override
+    if options.use_glossary:
+        translated = glossary_translator.translate(text, mode, options.style)
+        if translated:
+            return translated
+    if options.use_cache:
+        return translation_cache.get(mode, options.style, text, options.ttl_days)
+    return None
+
+
+@dataclass
+class TranslationOptions:
+    """翻译参数快照：在主线程读取设置，后台线程中不再访问 bpy"""
+    api_key: str
+    endpoint: str
+    model: str
+    style: str
+    timeout: float
+    max_retries: int
+    concurrency: int
+    use_cache: bool
+    ttl_days: int
+    use_glossary: bool
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            api_key=settings.api_key,
+            endpoint=settings.api_endpoint,
+            model=settings.api_model,
+            style=settings.translation_style,
+            timeout=settings.api_timeout,
+            max_retries=settings.api_max_retries,
+            concurrency=settings.api_concurrency,
+            use_cache=settings.use_translation_cache,
+            ttl_days=settings.translation_cache_ttl_days,
+            use_glossary=settings.use_glossary,
+        )
+
+
+class TranslationUnavailable(Exception):
+    """翻译服务熔断中，调用方应直接使用原始名称"""
+
+
+class TranslationClient:
+    """翻译接口客户端：连接池复用、超时、指数退避重试和熔断
+
+    连续失败 FAILURE_THRESHOLD 次后熔断 COOLDOWN 秒，期间所有请求立即失败并回退为原名。
+    """
+    FAILURE_THRESHOLD = 3
+    COOLDOWN = 30.0
+    BACKOFF_BASE = 0.5
+
+    def __init__(self):
+        self._session = None
+        self._pool_size = 0
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _get_session(self, pool_size: int):
+        with self._lock:
+            if self._session is None or self._pool_size < pool_size:
+                if self._session is not None:
+                    self._session.close()
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=max(pool_size, 1))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session, self._pool_size = session, pool_size
+            return self._session
+
+    def is_open(self) -> bool:
+        return time.time() < self._open_until
+
+    def _record(self, success: bool):
+        with self._lock:
+            if success:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._failures >= self.FAILURE_THRESHOLD:
+                self._open_until = time.time() + self.COOLDOWN
+                self._failures = 0
+                print(f"翻译接口连续失败，暂停请求 {self.COOLDOWN:.0f} 秒")
+
+    @staticmethod
+    def _is_retryable(error) -> bool:
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else 0
+            return status == 429 or status >= 500
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    def post_chat(self, options: TranslationOptions, messages: list, json_output: bool = False) -> str:
+        """发送一次 chat/completions 请求，返回回复文本"""
+        if self.is_open():
+            raise TranslationUnavailable("翻译服务暂不可用")
+        session = self._get_session(options.concurrency)
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {options.api_key}"
+        }
+        data = {
+            "model": options.model,
+            "messages": messages,
+            "temperature": 0.1
+        }
+        if json_output:
+            data["response_format"] = {"type": "json_object"}
+
+        delay = self.BACKOFF_BASE
+        for attempt in range(options.max_retries + 1):
+            try:
+                response = session.post(options.endpoint, headers=headers, json=data, timeout=options.timeout)
+                response.raise_for_status()
+                result = response.json()
+                self._record(True)
+                return result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+            except requests.RequestException as e:
+                if attempt >= options.max_retries or not self._is_retryable(e):
+                    self._record(False)
+                    raise
+                print(f"翻译请求失败，{delay:.1f} 秒后重试: {e}")
+                time.sleep(delay * (1.0 + random.random() * 0.25))
+                delay *= 2
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session, self._pool_size = None, 0
+
+
+# 全局翻译客户端
+translation_client = TranslationClient()
+
+
+def _translate_single(text: str, mode: str, options: TranslationOptions) -> str:
+    """单个名称翻译（线程安全），失败时返回原文"""
+    local = resolve_local_translation(text, mode, options)
+    if local:
+        return local
+    if not options.api_key:
+        return text
     try:
         print(f"正在翻译: {text}")
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        result = response.json()
-        translated_text = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+        translated_text = translation_client.post_chat(
+            options, build_translation_messages(text, mode, options.style))
         
         if translated_text:
             print(f"翻译结果: {translated_text}")
+            if options.use_cache:
+                translation_cache.put(mode, options.style, text, translated_text)
             return translated_text
         else:
             print("翻译返回为空")
@@ -543,27 +1700,267 @@ Cloth→织物 | Effect→特效 | Base→基础 | Head→头部 | Main→主体
         print(f"翻译时出错: {str(e)}")
         return text
 
-def generate_config_entry(collection, export_mode: str, translate_mode: str, include_blank: bool = True, material_blank_controls: dict = None, contains_excluded_mat: bool = False) -> str:
-    """生成单个集合的配置条目"""
-    original_name = collection.name
-    translated_name = None
+
+def translate_text(text: str, mode: str) -> str:
+    """统一的翻译处理函数（先查持久化缓存，未命中时再请求网络）"""
+    if mode == 'NONE':
+        return text
     settings = bpy.context.scene.qseparator_settings
-    
-    # 检查是否为排除的材质或集合包含排除材质
-    excluded_materials = {item.material.name for item in settings.excluded_materials if item.material}
-    if original_name in excluded_materials or contains_excluded_mat:
-        # 如果是排除的材质或集合包含排除材质，使用原始名称，不进行任何翻译
-        display_name = original_name
-        node_name = original_name
+    options = TranslationOptions.from_settings(settings)
+    prepare_translation_sources(options)
+    return _translate_single(text, mode, options)
+
+
+# 批量翻译时每个请求包含的最大名称数量
+TRANSLATION_BATCH_SIZE = 40
+
+BATCH_TRANSLATION_INSTRUCTION = """
+
+【批量翻译格式】
+用户会发送一个 JSON 数组，每个元素是一个需要翻译的名称。
+你必须返回一个 JSON 对象：键为原文（与输入完全一致），值为对应的翻译结果。
+每个输入都必须出现在输出中，不要输出 JSON 以外的任何内容。"""
+
+
+def build_batch_translation_messages(texts: List[str], mode: str, style: str) -> list:
+    if mode.startswith('AI_'):
+        system_prompt = TRANSLATION_SYSTEM_PROMPTS[(mode, style)]
     else:
-        # 正常的翻译逻辑
-        if translate_mode in {'CH2EN', 'AI_CH2EN'}:
-            translated_name = translate_text(original_name, translate_mode)
-            display_name = original_name
-            node_name = translated_name
+        direction = "中文翻译为英文" if mode == 'CH2EN' else "英文翻译为中文"
+        system_prompt = f"请将以下{direction}。"
+    return [
+        {"role": "system", "content": system_prompt + BATCH_TRANSLATION_INSTRUCTION},
+        {"role": "user", "content": json.dumps(texts, ensure_ascii=False)}
+    ]
+
+
+def parse_batch_translation(content: str, texts: List[str]) -> Dict[str, str]:
+    """解析批量翻译的回复，只返回通过校验的条目（原文在请求中、译文为非空单行字符串）"""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        if content.lower().startswith("json"):
+            content = content[4:]
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    requested = set(texts)
+    result = {}
+    for source, translated in data.items():
+        if source not in requested or not isinstance(translated, str):
+            continue
+        translated = translated.strip()
+        if translated and "\n" not in translated:
+            result[source] = translated
+    return result
+
+
+def prepare_translation_sources(options: TranslationOptions):
+    """在主线程中加载缓存文件和用户术语表（后台线程只读取内存）"""
+    if options.use_cache:
+        translation_cache.load()
+    if options.use_glossary:
+        glossary_translator.refresh()
+
+
+def pending_translations(texts: List[str], mode: str, options: TranslationOptions) -> List[str]:
+    """返回本地（覆盖/术语表/缓存）无法解决、需要请求网络的名称"""
+    if mode == 'NONE':
+        return []
+    prepare_translation_sources(options)
+    return [text for text in dict.fromkeys(texts)
+            if not resolve_local_translation(text, mode, options)]
+
+
+def translate_batch(texts: List[str], mode: str, options: TranslationOptions = None, progress=None) -> Dict[str, str]:
+    """批量翻译：先用覆盖/术语表/缓存在本地解决，剩余名称按批次合并为少量请求并发发送，解析失败的条目再逐个翻译
+
+    请求本身失败（超时、重试后仍为 5xx 等）时该批名称保持原名，不再逐个重试已经失败的接口。
+
+    可在后台线程中运行（需传入 options），progress(完成数, 总数) 用于报告进度。
+    """
+    if options is None:
+        options = TranslationOptions.from_settings(bpy.context.scene.qseparator_settings)
+        prepare_translation_sources(options)
+    unique = list(dict.fromkeys(texts))
+    result: Dict[str, str] = {}
+    if mode == 'NONE':
+        return {text: text for text in unique}
+
+    pending = []
+    for text in unique:
+        local = resolve_local_translation(text, mode, options)
+        if local:
+            result[text] = local
         else:
-            display_name = translate_text(original_name, translate_mode) if translate_mode != 'NONE' else original_name
-            node_name = original_name
+            pending.append(text)
+
+    def report():
+        if progress:
+            progress(len(result), len(unique))
+
+    report()
+    if not pending or not options.api_key or translation_client.is_open():
+        for text in pending:
+            result[text] = text
+        report()
+        return result
+
+    def run_chunk(chunk):
+        """返回解析出的译文；请求失败或熔断中返回 None"""
+        print(f"正在批量翻译 {len(chunk)} 个名称...")
+        try:
+            content = translation_client.post_chat(
+                options, build_batch_translation_messages(chunk, mode, options.style), json_output=True)
+        except TranslationUnavailable:
+            return None
+        except Exception as e:
+            print(f"批量翻译请求失败，保留原名: {str(e)}")
+            return None
+        return parse_batch_translation(content, chunk)
+
+    failed = []
+    chunks = [pending[i:i + TRANSLATION_BATCH_SIZE] for i in range(0, len(pending), TRANSLATION_BATCH_SIZE)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, options.concurrency)) as pool:
+        futures = {pool.submit(run_chunk, chunk): chunk for chunk in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            chunk, translated = futures[future], future.result()
+            for text in chunk:
+                if translated and text in translated:
+                    result[text] = translated[text]
+                    if options.use_cache:
+                        translation_cache.put(mode, options.style, text, translated[text])
+                elif translated is None:
+                    # 请求失败或熔断中：直接使用原名
+                    result[text] = text
+                else:
+                    failed.append(text)
+            report()
+
+        # 解析失败或缺失的条目逐个回退（同样受并发数限制）
+        if failed:
+            print(f"{len(failed)} 个名称批量翻译失败，逐个重试")
+            futures = {pool.submit(_translate_single, text, mode, options): text for text in failed}
+            for future in concurrent.futures.as_completed(futures):
+                result[futures[future]] = future.result()
+                report()
+    return result
+
+
+class TranslationJob:
+    """在后台线程中执行批量翻译，完成后在主线程回调；面板读取进度显示"""
+
+    def __init__(self):
+        self.thread = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = ""
+        self.on_finish = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, texts: List[str], mode: str, options: TranslationOptions, on_finish):
+        if self.running:
+            return False
+        self.done, self.total = 0, len(set(texts))
+        self.result, self.error, self.on_finish = None, "", on_finish
+
+        def worker():
+            try:
+                self.result = translate_batch(texts, mode, options, progress=self._progress)
+            except Exception as e:
+                self.error = str(e)
+                self.result = {}
+
+        self.thread = threading.Thread(target=worker, name="MQToolsTranslation", daemon=True)
+        self.thread.start()
+        if not bpy.app.timers.is_registered(_poll_translation_job):
+            bpy.app.timers.register(_poll_translation_job, first_interval=0.2)
+        return True
+
+    def _progress(self, done, total):
+        self.done, self.total = done, total
+
+
+# 全局后台翻译任务
+translation_job = TranslationJob()
+
+
+def _tag_view3d_redraw():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+
+def _poll_translation_job():
+    """主线程定时检查后台翻译，结束后保存缓存并执行回调"""
+    _tag_view3d_redraw()
+    if translation_job.running:
+        return 0.2
+    translation_job.thread = None
+    translation_cache.save()
+    callback, translation_job.on_finish = translation_job.on_finish, None
+    if callback:
+        try:
+            callback(translation_job.result or {})
+        except Exception as e:
+            print(f"翻译完成回调出错: {e}")
+    return None
+
+
+def bodygroup_names(original_name: str, translate_mode: str, translations: dict = None, contains_excluded_mat: bool = False, excluded_material_names: Set[str] = frozenset(), translate_missing: bool = True):
+    """返回 bodygroup 的 (显示名称, 节点/文件名称)；translate_missing 为 False 时缺少的翻译直接用原名"""
+    if original_name in excluded_material_names or contains_excluded_mat:
+        # 如果是排除的材质或集合包含排除材质，使用原始名称，不进行任何翻译
+        return original_name, original_name
+    # 正常的翻译逻辑
+    if translations and original_name in translations:
+        translated_name = translations[original_name]
+    elif translate_mode != 'NONE' and translate_missing:
+        translated_name = translate_text(original_name, translate_mode)
+    else:
+        translated_name = original_name
+    if translate_mode in {'CH2EN', 'AI_CH2EN'}:
+        return original_name, translated_name
+    return translated_name, original_name
+
+def bodygroup_file_names(context) -> Dict[str, str]:
+    """bodygroup 集合名称 → QC 中 studio 引用的文件名（不含扩展名）
+
+    只使用本地翻译来源（覆盖/术语表/缓存），不联网；写入 QC 时翻译过的名称都已进入缓存。
+    """
+    settings = context.scene.qseparator_settings
+    entry_args, names_to_translate, sets = collect_bodygroup_entries(context)
+    translations = {}
+    if names_to_translate:
+        options = TranslationOptions.from_settings(settings)
+        prepare_translation_sources(options)
+        for name in names_to_translate:
+            translated = resolve_local_translation(name, settings.translate_mode, options)
+            if translated:
+                translations[name] = translated
+    result = {}
+    for coll, _, contains_excluded_mat in entry_args:
+        _, node_name = bodygroup_names(coll.name, settings.translate_mode, translations, contains_excluded_mat,
+                                       sets.listed_material_names, translate_missing=False)
+        result[coll.name] = node_name
+    return result
+
+def generate_config_entry(collection, export_mode: str, translate_mode: str, include_blank: bool = True, material_blank_controls: dict = None, contains_excluded_mat: bool = False, translations: dict = None, excluded_material_names: Set[str] = None) -> str:
+    """生成单个集合的配置条目；excluded_material_names 由调用方每次生成预先计算一次"""
+    original_name = collection.name
+    
+    # 检查是否为排除的材质或集合包含排除材质
+    if excluded_material_names is None:
+        excluded_material_names = QCGenerationSets.from_settings(bpy.context.scene.qseparator_settings).listed_material_names
+    display_name, node_name = bodygroup_names(original_name, translate_mode, translations, contains_excluded_mat, excluded_material_names)
     
     # 材质级别blank控制逻辑
     final_include_blank = include_blank
@@ -594,17 +1991,1080 @@ def generate_config_entry(collection, export_mode: str, translate_mode: str, inc
                 f'{blank_line}'
                 '}\n')
 
+# Source 引擎编译限制（studiomdl）
+SOURCE_LIMITS = {
+    "verts_per_model": 65536,   # MAXSTUDIOVERTS，每个 bodygroup 子模型
+    "bones_per_model": 128,     # MAXSTUDIOBONES
+    "bones_per_strip": 53,      # 硬件蒙皮单个 strip 的骨骼上限，超出会被拆成多个 strip
+    "influences_per_vert": 3,   # MAX_NUM_BONES_PER_VERT，多余的权重会被丢弃
+    "materials_per_model": 32,  # MAXSTUDIOSKINS
+}
+
+@dataclass
+class ExportMeshStats:
+    """单个对象按编译器视角统计的数据"""
+    name: str
+    verts: int
+    material_verts: Dict[str, int]
+    bones: Set[str]
+    material_bones: Dict[str, Set[str]]
+    max_influences: int
+    over_influence_verts: int
+
+@dataclass
+class SourceLimitIssue:
+    severity: str
+    scope: str
+    message: str
+
+@dataclass
+class SourceLimitReport:
+    models: List[tuple]
+    issues: List[SourceLimitIssue]
+    elapsed: float
+    split_count: int = 0
+
+source_limit_report: Optional[SourceLimitReport] = None
+
+def _export_loop_keys(mesh) -> tuple:
+    """返回每个角的 (顶点索引, 材质索引, 所属面) 以及用于判断拆分的量化 UV/法线键
+
+    编译器按 (顶点, UV, 法线) 组合拆分顶点，UV 缝和硬边处的角会成为不同的顶点。
+    """
+    loop_count = len(mesh.loops)
+    poly_count = len(mesh.polygons)
+    loop_verts = np.empty(loop_count, dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    loop_totals = np.empty(poly_count, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    material_index = np.empty(poly_count, dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", material_index)
+    loop_polys = np.repeat(np.arange(poly_count, dtype=np.int32), loop_totals)
+    loop_mats = material_index[loop_polys]
+
+    columns = []
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is not None and loop_count:
+        uvs = np.empty(loop_count * 2, dtype=np.float32)
+        uv_layer.uv.foreach_get("vector", uvs)
+        columns.append(np.round(uvs.reshape(-1, 2) * 4096.0).astype(np.int64))
+    if loop_count:
+        normals = np.empty(loop_count * 3, dtype=np.float32)
+        mesh.corner_normals.foreach_get("vector", normals)
+        columns.append(np.round(normals.reshape(-1, 3) * 1024.0).astype(np.int64))
+    return loop_verts, loop_mats, loop_polys, columns
+
+def count_export_vertices(loop_verts, loop_mats, columns, loop_units=None) -> np.ndarray:
+    """统计编译后的顶点数；传入 loop_units 时按单元分别统计（返回按单元编号的数组）"""
+    if not len(loop_verts):
+        return np.zeros(1, dtype=np.int64)
+    units = loop_units if loop_units is not None else loop_mats
+    keys = np.column_stack([units.astype(np.int64), loop_mats.astype(np.int64), loop_verts.astype(np.int64)] + columns)
+    unique_keys = np.unique(keys, axis=0)
+    return np.bincount(unique_keys[:, 0], minlength=int(units.max()) + 1)
+
+def _vertex_influences(obj, mesh, bone_names: Optional[Set[str]]) -> tuple:
+    """一次遍历顶点权重，返回 (影响的顶点数组, 影响的顶点组数组, 每个顶点的影响数, 顶点组索引→名称)"""
+    group_names = {vg.index: vg.name for vg in obj.vertex_groups}
+    valid_groups = {index for index, name in group_names.items() if bone_names is None or name in bone_names}
+    infl_verts, infl_groups = [], []
+    if valid_groups:
+        for v in mesh.vertices:
+            for g in v.groups:
+                if g.weight > 0.0 and g.group in valid_groups:
+                    infl_verts.append(v.index)
+                    infl_groups.append(g.group)
+    infl_verts = np.asarray(infl_verts, dtype=np.int32)
+    infl_groups = np.asarray(infl_groups, dtype=np.int32)
+    per_vertex = np.bincount(infl_verts, minlength=len(mesh.vertices)) if len(infl_verts) else np.zeros(len(mesh.vertices), dtype=np.int64)
+    return infl_verts, infl_groups, per_vertex, group_names
+
+def _object_armature(obj):
+    """对象使用的骨架（骨架修改器优先，其次骨架父级），没有时返回 None"""
+    for mod in obj.modifiers:
+        if mod.type == 'ARMATURE' and mod.object:
+            return mod.object
+    if obj.parent and obj.parent.type == 'ARMATURE':
+        return obj.parent
+    return None
+
+def _deform_bone_names(obj) -> Optional[Set[str]]:
+    """对象使用的骨架的骨骼名称；没有骨架时返回 None（所有顶点组都视为骨骼）"""
+    armature = _object_armature(obj)
+    if armature is None:
+        return None
+    return {bone.name for bone in armature.data.bones}
+
+def analyze_export_mesh(obj, depsgraph) -> Optional[ExportMeshStats]:
+    """按编译器视角统计对象（评估后网格）：拆分后顶点数、骨骼引用、材质与权重影响数"""
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.data if obj.mode != 'EDIT' else None
+    temp = False
+    if mesh is None or not isinstance(mesh, bpy.types.Mesh):
+        mesh = obj_eval.to_mesh()
+        temp = True
+        if mesh is None:
+            return None
+    try:
+        loop_verts, loop_mats, _, columns = _export_loop_keys(mesh)
+        per_material = count_export_vertices(loop_verts, loop_mats, columns)
+        slot_names = [mat.name if mat else f"<空槽{i}>" for i, mat in enumerate(mesh.materials)] or ["<无材质>"]
+        material_verts = {}
+        for index, count in enumerate(per_material):
+            if count:
+                name = slot_names[min(index, len(slot_names) - 1)]
+                material_verts[name] = material_verts.get(name, 0) + int(count)
+
+        infl_verts, infl_groups, per_vertex, group_names = _vertex_influences(obj, mesh, _deform_bone_names(obj))
+        bones = {group_names[g] for g in np.unique(infl_groups)} if len(infl_groups) else set()
+        material_bones = {}
+        if len(infl_groups):
+            vertex_group_pairs = np.unique(np.column_stack([infl_verts, infl_groups]), axis=0)
+            for index in np.unique(loop_mats):
+                used_verts = np.unique(loop_verts[loop_mats == index])
+                mask = np.isin(vertex_group_pairs[:, 0], used_verts)
+                name = slot_names[min(int(index), len(slot_names) - 1)]
+                material_bones.setdefault(name, set()).update(group_names[g] for g in np.unique(vertex_group_pairs[mask, 1]))
+        limit = SOURCE_LIMITS["influences_per_vert"]
+        return ExportMeshStats(
+            name=obj.name,
+            verts=int(per_material.sum()),
+            material_verts=material_verts,
+            bones=bones,
+            material_bones=material_bones,
+            max_influences=int(per_vertex.max()) if len(per_vertex) else 0,
+            over_influence_verts=int((per_vertex > limit).sum()),
+        )
+    finally:
+        if temp:
+            obj_eval.to_mesh_clear()
+
+def _export_models(context) -> Dict[str, list]:
+    """bodygroup 子模型 → 网格对象；没有 bodygroup 集合时每个可见网格对象各为一个模型"""
+    models = {}
+    for coll_name in get_second_level_collections(context):
+        coll = bpy.data.collections.get(coll_name)
+        if coll is None:
+            continue
+        objs = [obj for obj in coll.all_objects if obj.type == 'MESH']
+        if objs:
+            models[coll_name] = objs
+    if not models:
+        for obj in context.view_layer.objects:
+            if obj.type == 'MESH' and obj.visible_get():
+                models[obj.name] = [obj]
+    return models
+
+def analyze_source_limits(context) -> SourceLimitReport:
+    """导出前检查所有 bodygroup 子模型是否超出 studiomdl 限制"""
+    start = time.perf_counter()
+    depsgraph = context.evaluated_depsgraph_get()
+    models = _export_models(context)
+    object_stats: Dict[str, ExportMeshStats] = {}
+    issues = []
+    model_rows = []
+    all_bones = set()
+    for model_name, objs in models.items():
+        verts = 0
+        bones, materials = set(), set()
+        strip_bones: Dict[str, Set[str]] = {}
+        for obj in objs:
+            stats = object_stats.get(obj.name)
+            if stats is None:
+                stats = analyze_export_mesh(obj, depsgraph)
+                if stats is None:
+                    continue
+                object_stats[obj.name] = stats
+                if stats.over_influence_verts:
+                    issues.append(SourceLimitIssue('WARNING', obj.name,
+                        f"{stats.over_influence_verts} 个顶点的权重影响超过 {SOURCE_LIMITS['influences_per_vert']} 个（最多 {stats.max_influences}），多余权重会被丢弃"))
+            verts += stats.verts
+            bones |= stats.bones
+            materials |= set(stats.material_verts)
+            for mat_name, mat_bones in stats.material_bones.items():
+                strip_bones.setdefault(mat_name, set()).update(mat_bones)
+        all_bones |= bones
+        model_rows.append((model_name, verts, len(bones), len(materials)))
+        if verts > SOURCE_LIMITS["verts_per_model"]:
+            issues.append(SourceLimitIssue('ERROR', model_name,
+                f"编译后顶点数 {verts} 超过上限 {SOURCE_LIMITS['verts_per_model']}"))
+        if len(materials) > SOURCE_LIMITS["materials_per_model"]:
+            issues.append(SourceLimitIssue('ERROR', model_name,
+                f"材质数 {len(materials)} 超过上限 {SOURCE_LIMITS['materials_per_model']}"))
+        for mat_name, mat_bones in strip_bones.items():
+            if len(mat_bones) > SOURCE_LIMITS["bones_per_strip"]:
+                issues.append(SourceLimitIssue('WARNING', model_name,
+                    f"材质 {mat_name} 引用 {len(mat_bones)} 根骨骼，超过单个 strip 的 {SOURCE_LIMITS['bones_per_strip']} 根，会被拆分为多个 strip"))
+    if len(all_bones) > SOURCE_LIMITS["bones_per_model"]:
+        issues.append(SourceLimitIssue('ERROR', "整个模型",
+            f"引用骨骼 {len(all_bones)} 根，超过上限 {SOURCE_LIMITS['bones_per_model']}"))
+    model_rows.sort(key=lambda row: row[1], reverse=True)
+    return SourceLimitReport(models=model_rows, issues=issues, elapsed=time.perf_counter() - start)
+
+def mesh_vertex_components(mesh) -> np.ndarray:
+    """按边连通性给顶点编号（向量化标签传播 + 指针跳跃），返回每个顶点所属连通块的最小顶点索引"""
+    labels = np.arange(len(mesh.vertices), dtype=np.int64)
+    if not len(mesh.edges):
+        return labels
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype=np.int64)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    a, b = edge_verts[0::2], edge_verts[1::2]
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def export_units(mesh, mode: str) -> tuple:
+    """把网格的面按材质或连通块分组，返回 (每个面的单元编号, 每个单元的编译后顶点数)"""
+    loop_verts, loop_mats, loop_polys, columns = _export_loop_keys(mesh)
+    if mode == 'MATERIAL':
+        poly_units = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("material_index", poly_units)
+    else:
+        vertex_labels = mesh_vertex_components(mesh)
+        loop_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        _, poly_units = np.unique(vertex_labels[loop_verts[loop_starts]], return_inverse=True)
+    if not len(poly_units):
+        return poly_units, np.zeros(0, dtype=np.int64)
+    return poly_units, count_export_vertices(loop_verts, loop_mats, columns, poly_units[loop_polys])
+
+def pack_export_units(unit_counts, limit: int) -> tuple:
+    """贪心装箱（first-fit decreasing）：返回 (每个单元的块编号, 块数量, 单独就超出上限的单元数)
+
+    顶点数为 0 的单元块编号为 -1。
+    """
+    chunk_of_unit = np.full(len(unit_counts), -1, dtype=np.int32)
+    chunk_sizes = []
+    oversized = 0
+    for unit in np.argsort(-np.asarray(unit_counts), kind='stable'):
+        count = int(unit_counts[unit])
+        if count == 0:
+            continue
+        if count > limit:
+            oversized += 1
+        for index, size in enumerate(chunk_sizes):
+            if size + count <= limit:
+                chunk_sizes[index] += count
+                chunk_of_unit[unit] = index
+                break
+        else:
+            chunk_of_unit[unit] = len(chunk_sizes)
+            chunk_sizes.append(count)
+    return chunk_of_unit, len(chunk_sizes), oversized
+
+def _object_export_units(obj, depsgraph, mode: str) -> tuple:
+    """对象原始网格每个面的单元编号，以及按评估后网格（与 analyze_export_mesh 相同）统计的单元顶点数
+
+    按材质分组时单元与拓扑无关，直接用评估后网格统计；按连通块分组且修改器改变了面数时，
+    单元取自原始网格，顶点数按评估后总数等比例估算。
+    """
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.data if isinstance(obj_eval.data, bpy.types.Mesh) else None
+    temp = False
+    if mesh is None:
+        mesh = obj_eval.to_mesh()
+        temp = True
+    try:
+        if mesh is None:
+            return export_units(obj.data, mode)
+        eval_units, eval_counts = export_units(mesh, mode)
+        if mode == 'MATERIAL':
+            poly_units = np.empty(len(obj.data.polygons), dtype=np.int32)
+            obj.data.polygons.foreach_get("material_index", poly_units)
+            unit_count = max(len(eval_counts), int(poly_units.max()) + 1 if len(poly_units) else 0)
+            unit_counts = np.zeros(unit_count, dtype=np.int64)
+            unit_counts[:len(eval_counts)] = eval_counts
+            return poly_units, unit_counts
+        if len(mesh.polygons) == len(obj.data.polygons):
+            return eval_units, eval_counts
+        poly_units, unit_counts = export_units(obj.data, mode)
+        total = int(unit_counts.sum())
+        if total:
+            unit_counts = np.ceil(unit_counts * (int(eval_counts.sum()) / total)).astype(np.int64)
+        return poly_units, unit_counts
+    finally:
+        if temp:
+            obj_eval.to_mesh_clear()
+
+def _keep_faces(obj, keep_mask) -> None:
+    """用 bmesh 删除 keep_mask 之外的面（同时删除孤立的边和顶点）"""
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(obj.data)
+        bm.faces.ensure_lookup_table()
+        doomed = [face for face, keep in zip(bm.faces, keep_mask) if not keep]
+        if doomed:
+            bmesh.ops.delete(bm, geom=doomed, context='FACES')
+        bm.to_mesh(obj.data)
+        obj.data.update()
+    finally:
+        bm.free()
+
+def split_model_for_limits(context, model_name: str, objs, mode: str, limit: int, hierarchy: CollectionHierarchyIndex) -> tuple:
+    """把超出顶点上限的子模型拆分到同级的新 bodygroup 集合中，返回 (新增对象数, 无法拆分的单元数)
+
+    整个子模型所有对象的 (对象, 单元) 一起装箱，顶点数与 analyze_source_limits 一样取自评估后网格，
+    因此每个块（包括留在原集合的块 0）合计都不超过上限。其余块按编号放入 “<集合名>_part<N>” 集合
+    （与原集合同一父级）。对象跨多个块时先复制再删除不属于该块的面，保留自定义法线、UV 和顶点组；
+    对象只属于一个非 0 块时整体移动过去。
+    """
+    depsgraph = context.evaluated_depsgraph_get()
+    object_units = [_object_export_units(obj, depsgraph, mode) for obj in objs]
+    offsets = np.cumsum([0] + [len(unit_counts) for _, unit_counts in object_units])
+    all_counts = np.concatenate([unit_counts for _, unit_counts in object_units]) if object_units else np.zeros(0, dtype=np.int64)
+    chunk_of_unit, chunk_count, oversized = pack_export_units(all_counts, limit)
+    if chunk_count <= 1:
+        return 0, oversized
+
+    source_coll = hierarchy.get(model_name)
+    parents = hierarchy.parents_of(source_coll) if source_coll else []
+    parent = parents[0] if parents else context.scene.collection
+    chunk_collections = {0: source_coll}
+    source_tree = {source_coll.name} | {child.name for child in source_coll.children_recursive} if source_coll else set()
+
+    def chunk_collection(chunk):
+        if source_coll is None:
+            return context.scene.collection
+        target = chunk_collections.get(chunk)
+        if target is None:
+            name = f"{model_name}_part{chunk + 1}"
+            target = hierarchy.get(name) or hierarchy.new(name, parent)
+            chunk_collections[chunk] = target
+        return target
+
+    created = 0
+    for index, (obj, (poly_units, _)) in enumerate(zip(objs, object_units)):
+        poly_chunks = chunk_of_unit[offsets[index] + poly_units] if len(poly_units) else poly_units
+        used = np.unique(poly_chunks[poly_chunks >= 0])
+        if not len(used):
+            continue
+        home = int(used[0])
+        # 评估后网格中不存在的单元（顶点数为 0）跟随对象的第一个块
+        poly_chunks = np.where(poly_chunks >= 0, poly_chunks, home)
+        for chunk in used[1:]:
+            chunk = int(chunk)
+            new_obj = obj.copy()
+            new_obj.data = obj.data.copy()
+            new_obj.name = f"{obj.name}_part{chunk + 1}"
+            chunk_collection(chunk).objects.link(new_obj)
+            _keep_faces(new_obj, poly_chunks == chunk)
+            created += 1
+        if len(used) > 1:
+            _keep_faces(obj, poly_chunks == home)
+        if home != 0 and source_coll is not None:
+            chunk_collection(home).objects.link(obj)
+            for coll in list(obj.users_collection):
+                if coll.name in source_tree:
+                    coll.objects.unlink(obj)
+    collection_cache.invalidate()
+    return created, oversized
+
+# SMD 导出：按批量数组读取网格，按块格式化并流式写出
+SMD_CHUNK_ROWS = 65536          # 每次格式化/写出的行数
+SMD_WRITE_BUFFER = 1 << 22      # 写文件缓冲区大小
+SMD_DEFAULT_MATERIAL = "default"
+
+@dataclass
+class SMDSkeleton:
+    """导出用骨架：父级在前的骨骼顺序、父索引和父空间静止矩阵（不含缩放）"""
+    names: List[str]
+    parents: List[int]
+    matrices: list
+    index: Dict[str, int]
+
+    @classmethod
+    def from_armature(cls, armature) -> 'SMDSkeleton':
+        """没有骨架时生成单根骨骼 root，所有顶点绑定到它"""
+        if armature is None:
+            return cls(["root"], [-1], [Matrix.Identity(4)], {"root": 0})
+        ordered = []
+        stack = [bone for bone in reversed(armature.data.bones) if bone.parent is None]
+        while stack:
+            bone = stack.pop()
+            ordered.append(bone)
+            stack.extend(reversed(bone.children))
+        index = {bone.name: i for i, bone in enumerate(ordered)}
+        # 世界空间静止矩阵去掉缩放，骨架对象带缩放（例如 0.08 倍的 MMD 模型）时骨骼位置与世界空间顶点一致
+        world = {}
+        for bone in ordered:
+            matrix = armature.matrix_world @ bone.matrix_local
+            world[bone.name] = Matrix.Translation(matrix.to_translation()) @ matrix.to_quaternion().to_matrix().to_4x4()
+        matrices = [world[bone.parent.name].inverted_safe() @ world[bone.name] if bone.parent else world[bone.name]
+                    for bone in ordered]
+        parents = [index[bone.parent.name] if bone.parent else -1 for bone in ordered]
+        return cls([bone.name for bone in ordered], parents, matrices, index)
+
+    def write(self, f) -> None:
+        f.write("nodes\n")
+        for i, (name, parent) in enumerate(zip(self.names, self.parents)):
+            f.write(f'{i} "{name}" {parent}\n')
+        f.write("end\nskeleton\ntime 0\n")
+        for i, matrix in enumerate(self.matrices):
+            loc = matrix.to_translation()
+            rot = matrix.to_euler()
+            f.write(f"{i} {loc.x:.6f} {loc.y:.6f} {loc.z:.6f} {rot.x:.6f} {rot.y:.6f} {rot.z:.6f}\n")
+        f.write("end\n")
+
+@dataclass
+class ExportMeshArrays:
+    """对象导出用的批量数组（世界空间）；corners 是按写出顺序排列的三角形角索引，VTA 按同一顺序编号顶点"""
+    corners: np.ndarray         # (三角形数 * 3,)
+    tri_materials: np.ndarray   # 每个三角形的材质名称索引
+    material_names: List[str]
+    loop_verts: np.ndarray      # 角 → 顶点
+    positions: np.ndarray       # (顶点数, 3)
+    normals: np.ndarray         # (角数, 3)
+    uvs: np.ndarray             # (角数, 2)
+
+def _export_part_mask(obj, tri_mats: np.ndarray, part: str) -> Optional[np.ndarray]:
+    """按导出部分过滤三角形：ALL 全部，BASE 只要原模型面，SHELL 只要非破坏描边的外壳面"""
+    if part == 'ALL':
+        return None
+    mod = outline_modifier(obj)
+    if mod is None or not mod.show_viewport:
+        return None if part == 'BASE' else np.zeros(len(tri_mats), dtype=bool)
+    if part == 'SHELL':
+        return tri_mats >= mod.material_offset
+    return tri_mats < mod.material_offset
+
+def world_normal_matrix(obj) -> np.ndarray:
+    return np.array(obj.matrix_world.to_3x3().inverted_safe().transposed(), dtype=np.float64)
+
+def transform_normals(normals: np.ndarray, normal_matrix: np.ndarray) -> np.ndarray:
+    normals = normals @ normal_matrix.T
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0.0] = 1.0
+    return normals / lengths[:, None]
+
+def read_export_mesh(obj, mesh, part: str = 'ALL') -> ExportMeshArrays:
+    """用 foreach_get 一次读取三角形（网格缓存的 loop_triangles）、位置、角法线和 UV"""
+    tri_count = len(mesh.loop_triangles)
+    corners = np.empty(tri_count * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", corners)
+    tri_mats = np.empty(tri_count, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("material_index", tri_mats)
+    mask = _export_part_mask(obj, tri_mats, part)
+    if mask is not None:
+        corners = corners.reshape(-1, 3)[mask].ravel()
+        tri_mats = tri_mats[mask]
+
+    loop_count = len(mesh.loops)
+    loop_verts = np.empty(loop_count, dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    positions = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", positions)
+    matrix = np.array(obj.matrix_world, dtype=np.float64)
+    positions = positions.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    normals = np.empty(loop_count * 3, dtype=np.float32)
+    mesh.corner_normals.foreach_get("vector", normals)
+    normals = transform_normals(normals.reshape(-1, 3), world_normal_matrix(obj))
+    uvs = np.zeros(loop_count * 2, dtype=np.float32)
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is not None and loop_count:
+        uv_layer.uv.foreach_get("vector", uvs)
+
+    material_names = [mat.name if mat else SMD_DEFAULT_MATERIAL for mat in mesh.materials] or [SMD_DEFAULT_MATERIAL]
+    return ExportMeshArrays(
+        corners=corners,
+        tri_materials=np.minimum(tri_mats, len(material_names) - 1),
+        material_names=material_names,
+        loop_verts=loop_verts,
+        positions=positions,
+        normals=normals,
+        uvs=uvs.reshape(-1, 2),
+    )
+
+def vertex_bone_links(obj, mesh, skeleton: SMDSkeleton, limit: int) -> tuple:
+    """每个顶点最多 limit 个骨骼权重（按权重降序保留并归一化），返回 (链接数, 骨骼索引, 权重)
+
+    顶点组只能逐顶点读取，这里只遍历一次收集 (顶点, 骨骼, 权重)，排序和截断都用数组完成。
+    """
+    count = len(mesh.vertices)
+    links = np.zeros(count, dtype=np.int32)
+    link_bones = np.zeros((count, limit), dtype=np.int32)
+    link_weights = np.zeros((count, limit), dtype=np.float64)
+    group_bones = {vg.index: skeleton.index[vg.name] for vg in obj.vertex_groups if vg.name in skeleton.index}
+    verts, bones, weights = [], [], []
+    if group_bones:
+        for v in mesh.vertices:
+            for g in v.groups:
+                bone = group_bones.get(g.group)
+                if bone is not None and g.weight > 0.0:
+                    verts.append(v.index)
+                    bones.append(bone)
+                    weights.append(g.weight)
+    if verts:
+        verts = np.asarray(verts, dtype=np.int64)
+        bones = np.asarray(bones, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float64)
+        order = np.lexsort((-weights, verts))
+        verts, bones, weights = verts[order], bones[order], weights[order]
+        rank = np.arange(len(verts)) - np.searchsorted(verts, verts, side='left')
+        keep = rank < limit
+        verts, bones, weights, rank = verts[keep], bones[keep], weights[keep], rank[keep]
+        link_bones[verts, rank] = bones
+        link_weights[verts, rank] = weights
+        links = np.bincount(verts, minlength=count).astype(np.int32)
+        totals = link_weights.sum(axis=1)
+        weighted = totals > 0.0
+        link_weights[weighted] /= totals[weighted, None]
+    elif obj.parent_type == 'BONE' and obj.parent_bone in skeleton.index:
+        # 骨骼子级对象整体跟随父骨骼
+        links[:] = 1
+        link_bones[:, 0] = skeleton.index[obj.parent_bone]
+        link_weights[:, 0] = 1.0
+    return links, link_bones, link_weights
+
+def format_rows(fmt: str, rows: np.ndarray) -> List[str]:
+    """把二维数组按同一行格式批量格式化（每块只做一次 % 运算，不逐顶点调用格式化）"""
+    lines = []
+    for start in range(0, len(rows), SMD_CHUNK_ROWS):
+        chunk = rows[start:start + SMD_CHUNK_ROWS]
+        text = ((fmt + "\n") * len(chunk)) % tuple(chunk.ravel().tolist())
+        lines.extend(text[:-1].split("\n"))
+    return lines
+
+def smd_corner_lines(arrays: ExportMeshArrays, links, link_bones, link_weights) -> np.ndarray:
+    """格式化三角形用到的每个角的 SMD 顶点行，返回按角索引的字符串数组（同一角只格式化一次）"""
+    lines = np.empty(len(arrays.loop_verts), dtype=object)
+    used = np.unique(arrays.corners)
+    used_links = links[arrays.loop_verts[used]]
+    for k in np.unique(used_links):
+        k = int(k)
+        sel = used[used_links == k]
+        verts = arrays.loop_verts[sel]
+        columns = [link_bones[verts, 0] if k else np.zeros(len(sel)),
+                   arrays.positions[verts], arrays.normals[sel], arrays.uvs[sel], np.full(len(sel), k)]
+        for j in range(k):
+            columns += [link_bones[verts, j], link_weights[verts, j]]
+        rows = np.column_stack(columns).astype(np.float64)
+        formatted = np.empty(len(sel), dtype=object)
+        formatted[:] = format_rows("%d" + " %.6f" * 8 + " %d" + " %d %.6f" * k, rows)
+        lines[sel] = formatted
+    return lines
+
+def write_smd_triangles(f, arrays: ExportMeshArrays, lines: np.ndarray) -> int:
+    """按块拼接 材质行 + 3 个顶点行 并写出，返回三角形数量"""
+    names = np.empty(len(arrays.material_names), dtype=object)
+    names[:] = arrays.material_names
+    corners = arrays.corners.reshape(-1, 3)
+    tri_count = len(corners)
+    for start in range(0, tri_count, SMD_CHUNK_ROWS):
+        end = min(start + SMD_CHUNK_ROWS, tri_count)
+        block = np.empty((end - start, 4), dtype=object)
+        block[:, 0] = names[arrays.tri_materials[start:end]]
+        block[:, 1:] = lines[corners[start:end]]
+        f.write("\n".join(block.ravel().tolist()))
+        f.write("\n")
+    return tri_count
+
+def _model_armature(items) -> Optional[bpy.types.Object]:
+    for obj, _ in items:
+        armature = _object_armature(obj)
+        if armature is not None:
+            return armature
+    return None
+
+def write_smd(path: str, items, depsgraph) -> int:
+    """把多个 (对象, 导出部分) 写成一个参考 SMD，先写临时文件再原子替换，返回三角形数量"""
+    skeleton = SMDSkeleton.from_armature(_model_armature(items))
+    limit = SOURCE_LIMITS["influences_per_vert"]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    tris = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n', buffering=SMD_WRITE_BUFFER) as f:
+            f.write("version 1\n")
+            skeleton.write(f)
+            f.write("triangles\n")
+            for obj, part in items:
+                obj_eval = obj.evaluated_get(depsgraph)
+                # 保留所有数据层，顶点组经过修改器后仍可读取
+                mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph)
+                if mesh is None:
+                    continue
+                try:
+                    arrays = read_export_mesh(obj, mesh, part)
+                    if not len(arrays.corners):
+                        continue
+                    links = vertex_bone_links(obj, mesh, skeleton, limit)
+                    tris += write_smd_triangles(f, arrays, smd_corner_lines(arrays, *links))
+                finally:
+                    obj_eval.to_mesh_clear()
+            f.write("end\n")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tris
+
+def shape_key_names(obj) -> List[str]:
+    """对象的形态键名称（不含基型）"""
+    if obj.type != 'MESH' or not obj.data.shape_keys:
+        return []
+    return [kb.name for kb in obj.data.shape_keys.key_blocks[1:]]
+
+def _vta_frame_lines(ids: np.ndarray, positions: np.ndarray, normals: np.ndarray) -> List[str]:
+    rows = np.column_stack([ids, positions, normals]).astype(np.float64)
+    return format_rows("%d" + " %.6f" * 6, rows)
+
+def write_vta(path: str, items, depsgraph, tolerance: float) -> List[str]:
+    """把形态键写成 VTA 顶点动画，返回按帧顺序的 flex 名称（没有形态键时不写文件）
+
+    顶点编号沿用 write_smd 的角顺序（多个对象依次累加），第 0 帧写出全部参考顶点，
+    之后每个形态键一帧，只写出相对基型位移超过 tolerance 的顶点。
+    形态键帧 = 第 0 帧（评估后网格）+ 形态键相对基型的偏移，保持拓扑的变形修改器（平滑、置换等）
+    不会让变形的顶点偏离参考网格。
+    """
+    flex_names = list(dict.fromkeys(name for obj, _ in items for name in shape_key_names(obj)))
+    if not flex_names:
+        return []
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n', buffering=SMD_WRITE_BUFFER) as f:
+            f.write('version 1\nnodes\n0 "root" -1\nend\nskeleton\n')
+            for frame in range(len(flex_names) + 1):
+                f.write(f"time {frame}\n0 0 0 0 0 0 0\n")
+            f.write("end\nvertexanimation\ntime 0\n")
+
+            # 第 0 帧：与参考 SMD 相同的评估网格和角顺序
+            sources = []
+            offset = 0
+            for obj, part in items:
+                obj_eval = obj.evaluated_get(depsgraph)
+                mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph)
+                if mesh is None:
+                    continue
+                try:
+                    arrays = read_export_mesh(obj, mesh, part)
+                    count = len(arrays.corners)
+                    if not count:
+                        continue
+                    corner_verts = arrays.loop_verts[arrays.corners]
+                    ref_positions = arrays.positions[corner_verts]
+                    ref_normals = arrays.normals[arrays.corners]
+                    f.write("\n".join(_vta_frame_lines(np.arange(offset, offset + count), ref_positions, ref_normals)))
+                    f.write("\n")
+                    # 形态键数据来自原网格，修改器改变了拓扑时无法对应到导出的角（描边外壳除外）
+                    vertex_map = shape_key_vertex_map(obj, mesh) if shape_key_names(obj) else None
+                    if vertex_map is not None:
+                        basis_block = obj.data.shape_keys.key_blocks[0]
+                        basis = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+                        basis_block.data.foreach_get("co", basis)
+                        normal_offsets = None
+                        # 角也一一对应时才能使用形态键的角法线，否则沿用参考法线
+                        if len(mesh.loops) == len(obj.data.loops):
+                            basis_normals = np.asarray(basis_block.normals_split_get(), dtype=np.float64)
+                            basis_normals = transform_normals(basis_normals.reshape(-1, 3)[arrays.corners], world_normal_matrix(obj))
+                            normal_offsets = ref_normals - basis_normals
+                        sources.append((obj, arrays.corners, vertex_map[corner_verts], offset, ref_positions,
+                                        ref_normals, normal_offsets, basis, np.empty_like(basis)))
+                    elif shape_key_names(obj):
+                        print(f"{obj.name} 的修改器改变了网格拓扑，跳过其形态键")
+                    offset += count
+                finally:
+                    obj_eval.to_mesh_clear()
+
+            for frame, flex_name in enumerate(flex_names, start=1):
+                f.write(f"time {frame}\n")
+                for obj, corners, corner_verts, start, ref_positions, ref_normals, normal_offsets, basis, coords in sources:
+                    kb = obj.data.shape_keys.key_blocks.get(flex_name)
+                    if kb is None:
+                        continue
+                    # 基型每个对象只读取一次，coords 缓冲区在各帧之间复用
+                    kb.data.foreach_get("co", coords)
+                    offsets = (coords - basis).reshape(-1, 3)
+                    moved = np.linalg.norm(offsets, axis=1) > tolerance
+                    changed = np.nonzero(moved[corner_verts])[0]
+                    if not len(changed):
+                        continue
+                    matrix = np.array(obj.matrix_world, dtype=np.float64)
+                    positions = ref_positions[changed] + offsets[corner_verts[changed]] @ matrix[:3, :3].T
+                    if normal_offsets is None:
+                        normals = ref_normals[changed]
+                    else:
+                        # 法线同样取 参考法线 + (形态键法线 - 基型法线)
+                        key_normals = np.asarray(kb.normals_split_get(), dtype=np.float64).reshape(-1, 3)[corners[changed]]
+                        normals = transform_normals(key_normals, world_normal_matrix(obj)) + normal_offsets[changed]
+                        normals = transform_normals(normals, np.identity(3))
+                    f.write("\n".join(_vta_frame_lines(start + changed, positions, normals)))
+                    f.write("\n")
+            f.write("end\n")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return flex_names
+
+def vta_flexfile_block(name: str, flex_names: List[str]) -> str:
+    """QC $model 中引用 VTA 的 flexfile 块"""
+    lines = [f'flexfile "{name}.vta"', '{', '    defaultflex frame 0']
+    lines += [f'    flex "{flex_name}" frame {frame}' for frame, flex_name in enumerate(flex_names, start=1)]
+    lines.append('}')
+    return "\n".join(lines)
+
+@contextmanager
+def export_reference_pose(context, objects):
+    """导出期间把骨架切换到静止位置、形态键只显示基型，退出时恢复"""
+    armature_data = {}
+    for obj in objects:
+        armature = _object_armature(obj)
+        if armature is not None:
+            armature_data.setdefault(armature.data, armature.data.pose_position)
+    key_state = [(obj, obj.show_only_shape_key, obj.active_shape_key_index)
+                 for obj in objects if obj.type == 'MESH' and obj.data.shape_keys]
+    try:
+        for data in armature_data:
+            data.pose_position = 'REST'
+        for obj, _, _ in key_state:
+            obj.show_only_shape_key = True
+            obj.active_shape_key_index = 0
+        context.view_layer.update()
+        yield
+    finally:
+        for data, pose_position in armature_data.items():
+            data.pose_position = pose_position
+        for obj, show_only, active_index in key_state:
+            obj.show_only_shape_key = show_only
+            obj.active_shape_key_index = active_index
+        context.view_layer.update()
+
+# DMX 导出：binary 2 编码、model 15 格式（L4D2 分支的 studiomdl 可读取）
+DMX_HEADER = "<!-- dmx encoding binary 2 format model 15 -->\n"
+DMX_ELEMENT, DMX_INT, DMX_FLOAT, DMX_BOOL, DMX_STRING = 1, 2, 3, 4, 5
+DMX_VECTOR2, DMX_VECTOR3, DMX_QUATERNION = 9, 10, 13
+DMX_ARRAY = 14   # 数组类型 = 标量类型 + 14
+_DMX_ARRAY_DTYPES = {
+    DMX_INT: ('<i4', 1), DMX_FLOAT: ('<f4', 1), DMX_BOOL: ('u1', 1),
+    DMX_VECTOR2: ('<f4', 2), DMX_VECTOR3: ('<f4', 3), DMX_QUATERNION: ('<f4', 4),
+}
+
+class DMXElement:
+    """DMX 元素：类型名、名称和按写入顺序保存的 {属性名: (类型, 值)}"""
+    __slots__ = ("type", "name", "id", "attributes")
+
+    def __init__(self, type_name: str, name: str):
+        self.type = type_name
+        self.name = name
+        self.id = uuid.uuid4().bytes_le
+        self.attributes = {}
+
+    def set(self, name: str, attr_type: int, value) -> 'DMXElement':
+        self.attributes[name] = (attr_type, value)
+        return self
+
+def _dmx_elements(root: DMXElement) -> List[DMXElement]:
+    """从根元素广度优先收集所有被引用的元素（每个元素只出现一次）"""
+    elements, seen = [root], {id(root)}
+    for elem in elements:
+        for attr_type, value in elem.attributes.values():
+            children = [value] if attr_type == DMX_ELEMENT else value if attr_type == DMX_ELEMENT + DMX_ARRAY else ()
+            for child in children:
+                if child is not None and id(child) not in seen:
+                    seen.add(id(child))
+                    elements.append(child)
+    return elements
+
+def _dmx_string(value: str) -> bytes:
+    return value.encode('utf-8') + b'\0'
+
+def _dmx_value_bytes(attr_type: int, value, element_index: dict) -> bytes:
+    """属性值编码；数值数组整体转换为一段连续的二进制块"""
+    if attr_type == DMX_ELEMENT:
+        return struct.pack('<i', element_index[id(value)] if value is not None else -1)
+    if attr_type == DMX_ELEMENT + DMX_ARRAY:
+        return struct.pack('<i', len(value)) + np.array([element_index[id(elem)] for elem in value], dtype='<i4').tobytes()
+    if attr_type == DMX_STRING:
+        return _dmx_string(value)
+    if attr_type == DMX_STRING + DMX_ARRAY:
+        return struct.pack('<i', len(value)) + b''.join(_dmx_string(item) for item in value)
+    if attr_type > DMX_ARRAY:
+        dtype, width = _DMX_ARRAY_DTYPES[attr_type - DMX_ARRAY]
+        data = np.ascontiguousarray(value, dtype=dtype).reshape(-1)
+        return struct.pack('<i', len(data) // width) + data.tobytes()
+    if attr_type == DMX_INT:
+        return struct.pack('<i', value)
+    if attr_type == DMX_FLOAT:
+        return struct.pack('<f', value)
+    if attr_type == DMX_BOOL:
+        return struct.pack('<B', bool(value))
+    dtype, width = _DMX_ARRAY_DTYPES[attr_type]
+    return np.asarray(value, dtype=dtype).reshape(width).tobytes()
+
+def write_binary_dmx(path: str, root: DMXElement) -> int:
+    """写出 binary 2 编码的 DMX：元素类型名和属性名进入去重字符串表（uint16 索引），返回元素数量"""
+    elements = _dmx_elements(root)
+    element_index = {id(elem): i for i, elem in enumerate(elements)}
+    strings = {}
+    for elem in elements:
+        strings.setdefault(elem.type, len(strings))
+        for name in elem.attributes:
+            strings.setdefault(name, len(strings))
+    if len(strings) > 0xFFFF:
+        raise ValueError("DMX 字符串表超出 binary 2 编码的上限")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb', buffering=SMD_WRITE_BUFFER) as f:
+            f.write(_dmx_string(DMX_HEADER))
+            f.write(struct.pack('<i', len(strings)))
+            f.write(b''.join(_dmx_string(value) for value in strings))
+            f.write(struct.pack('<i', len(elements)))
+            for elem in elements:
+                f.write(struct.pack('<H', strings[elem.type]))
+                f.write(_dmx_string(elem.name))
+                f.write(elem.id)
+            for elem in elements:
+                f.write(struct.pack('<i', len(elem.attributes)))
+                for name, (attr_type, value) in elem.attributes.items():
+                    f.write(struct.pack('<HB', strings[name], attr_type))
+                    f.write(_dmx_value_bytes(attr_type, value, element_index))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(elements)
+
+def _dmx_transform(name: str, matrix) -> DMXElement:
+    quat = matrix.to_quaternion()
+    return (DMXElement("DmeTransform", name)
+            .set("position", DMX_VECTOR3, tuple(matrix.to_translation()))
+            .set("orientation", DMX_QUATERNION, (quat.x, quat.y, quat.z, quat.w)))
+
+def _dmx_dag(type_name: str, name: str, matrix, shape=None, children=None) -> DMXElement:
+    return (DMXElement(type_name, name)
+            .set("transform", DMX_ELEMENT, _dmx_transform(name, matrix))
+            .set("shape", DMX_ELEMENT, shape)
+            .set("visible", DMX_BOOL, True)
+            .set("children", DMX_ELEMENT + DMX_ARRAY, children if children is not None else []))
+
+def _dmx_mesh(obj, mesh, part: str, skeleton: SMDSkeleton, flex_tolerance: Optional[float]) -> tuple:
+    """评估网格 → DmeMesh（三角形顺序与 SMD/VTA 相同），返回 (DmeMesh, 三角形数, flex 名称)"""
+    arrays = read_export_mesh(obj, mesh, part)
+    limit = SOURCE_LIMITS["influences_per_vert"]
+    links, link_bones, link_weights = vertex_bone_links(obj, mesh, skeleton, limit)
+    # 没有权重的顶点绑定到第一根骨骼；jointList 第 0 项是模型本身，骨骼索引整体 +1
+    unweighted = links == 0
+    link_weights[unweighted, 0] = 1.0
+    corner_loops = arrays.corners
+    corner_verts = arrays.loop_verts[corner_loops]
+
+    bind = (DMXElement("DmeVertexData", "bind")
+            .set("vertexFormat", DMX_STRING + DMX_ARRAY, ["position$0", "normal$0", "texcoord$0", "jointWeights", "jointIndices"])
+            .set("jointCount", DMX_INT, limit)
+            .set("flipVCoordinates", DMX_BOOL, True)
+            .set("position$0", DMX_VECTOR3 + DMX_ARRAY, arrays.positions)
+            .set("position$0Indices", DMX_INT + DMX_ARRAY, corner_verts)
+            .set("normal$0", DMX_VECTOR3 + DMX_ARRAY, arrays.normals)
+            .set("normal$0Indices", DMX_INT + DMX_ARRAY, corner_loops)
+            .set("texcoord$0", DMX_VECTOR2 + DMX_ARRAY, arrays.uvs)
+            .set("texcoord$0Indices", DMX_INT + DMX_ARRAY, corner_loops)
+            .set("jointWeights", DMX_FLOAT + DMX_ARRAY, link_weights)
+            .set("jointIndices", DMX_INT + DMX_ARRAY, link_bones + 1))
+
+    face_sets = []
+    tri_ids = np.arange(len(corner_loops), dtype=np.int32).reshape(-1, 3)
+    for index in np.unique(arrays.tri_materials):
+        tris = tri_ids[arrays.tri_materials == index]
+        # 每个面以 -1 结尾
+        faces = np.column_stack([tris, np.full(len(tris), -1, dtype=np.int32)])
+        name = arrays.material_names[int(index)]
+        material = DMXElement("DmeMaterial", name).set("mtlName", DMX_STRING, name)
+        face_sets.append(DMXElement("DmeFaceSet", name)
+                         .set("material", DMX_ELEMENT, material)
+                         .set("faces", DMX_INT + DMX_ARRAY, faces))
+
+    deltas = []
+    flex_names = []
+    if flex_tolerance is not None and shape_key_names(obj):
+        vertex_map = shape_key_vertex_map(obj, mesh)
+        same_loops = len(mesh.loops) == len(obj.data.loops)
+        if vertex_map is None:
+            print(f"{obj.name} 的修改器改变了网格拓扑，跳过其形态键")
+        else:
+            key_blocks = obj.data.shape_keys.key_blocks
+            matrix = np.array(obj.matrix_world, dtype=np.float64)
+            normal_matrix = world_normal_matrix(obj)
+            vert_count = len(obj.data.vertices)
+            basis = np.empty(vert_count * 3, dtype=np.float32)
+            key_blocks[0].data.foreach_get("co", basis)
+            basis = basis.reshape(-1, 3)
+            if same_loops:
+                basis_normals = np.asarray(key_blocks[0].normals_split_get(), dtype=np.float64).reshape(-1, 3)
+                basis_normals = transform_normals(basis_normals, normal_matrix)
+            coords = np.empty(vert_count * 3, dtype=np.float32)
+            # DmeVertexDeltaData 存的是相对绑定状态的偏移，叠加在评估后的位置/法线上，
+            # 因此保持拓扑的变形修改器（平滑、置换等）不会让形态键顶点偏离参考网格
+            for kb in key_blocks[1:]:
+                kb.data.foreach_get("co", coords)
+                # 按评估后网格的顶点展开（描边外壳的两份顶点共用同一个形态键偏移）
+                offsets = (coords.reshape(-1, 3) - basis)[vertex_map]
+                moved = np.nonzero(np.linalg.norm(offsets, axis=1) > flex_tolerance)[0]
+                moved_loops = np.nonzero(np.isin(arrays.loop_verts, moved))[0]
+                if same_loops:
+                    normals = np.asarray(kb.normals_split_get(), dtype=np.float64).reshape(-1, 3)[moved_loops]
+                    normal_deltas = transform_normals(normals, normal_matrix) - basis_normals[moved_loops]
+                else:
+                    normal_deltas = np.zeros((len(moved_loops), 3))
+                deltas.append(DMXElement("DmeVertexDeltaData", kb.name)
+                              .set("vertexFormat", DMX_STRING + DMX_ARRAY, ["position$0", "normal$0"])
+                              .set("flipVCoordinates", DMX_BOOL, True)
+                              .set("corrected", DMX_BOOL, True)
+                              .set("position$0", DMX_VECTOR3 + DMX_ARRAY, offsets[moved] @ matrix[:3, :3].T)
+                              .set("position$0Indices", DMX_INT + DMX_ARRAY, moved)
+                              .set("normal$0", DMX_VECTOR3 + DMX_ARRAY, normal_deltas)
+                              .set("normal$0Indices", DMX_INT + DMX_ARRAY, moved_loops))
+                flex_names.append(kb.name)
+
+    dme_mesh = (DMXElement("DmeMesh", obj.name)
+                .set("visible", DMX_BOOL, True)
+                .set("bindState", DMX_ELEMENT, bind)
+                .set("currentState", DMX_ELEMENT, bind)
+                .set("baseStates", DMX_ELEMENT + DMX_ARRAY, [bind])
+                .set("deltaStates", DMX_ELEMENT + DMX_ARRAY, deltas)
+                .set("deltaStateWeights", DMX_VECTOR2 + DMX_ARRAY, np.zeros((len(deltas), 2)))
+                .set("deltaStateWeightsLagged", DMX_VECTOR2 + DMX_ARRAY, np.zeros((len(deltas), 2)))
+                .set("faceSets", DMX_ELEMENT + DMX_ARRAY, face_sets))
+    return dme_mesh, len(tri_ids), flex_names
+
+def build_dmx_model(name: str, items, depsgraph, flex_tolerance: Optional[float] = None) -> tuple:
+    """把多个 (对象, 导出部分) 组装成一个 DMX 模型（骨架 + 网格 + 形态键），返回 (根元素, 三角形数, flex 名称)"""
+    skeleton = SMDSkeleton.from_armature(_model_armature(items))
+    model_children = []
+    model = _dmx_dag("DmeModel", name, Matrix.Identity(4), children=model_children)
+    joints, joint_children = [], []
+    for bone_name, parent, matrix in zip(skeleton.names, skeleton.parents, skeleton.matrices):
+        children = []
+        joint = _dmx_dag("DmeJoint", bone_name, matrix, children=children)
+        (joint_children[parent] if parent >= 0 else model_children).append(joint)
+        joints.append(joint)
+        joint_children.append(children)
+    joint_list = [model] + joints
+    bind_transforms = [_dmx_transform(elem.name, Matrix.Identity(4) if elem is model else matrix)
+                       for elem, matrix in zip(joint_list, [None] + skeleton.matrices)]
+    model.set("jointList", DMX_ELEMENT + DMX_ARRAY, joint_list)
+    model.set("jointTransforms", DMX_ELEMENT + DMX_ARRAY, [elem.attributes["transform"][1] for elem in joint_list])
+    model.set("baseStates", DMX_ELEMENT + DMX_ARRAY,
+              [DMXElement("DmeTransformsList", "bind").set("transforms", DMX_ELEMENT + DMX_ARRAY, bind_transforms)])
+
+    tris = 0
+    flex_meshes, flex_names = [], []
+    for obj, part in items:
+        obj_eval = obj.evaluated_get(depsgraph)
+        mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph)
+        if mesh is None:
+            continue
+        try:
+            dme_mesh, mesh_tris, mesh_flexes = _dmx_mesh(obj, mesh, part, skeleton, flex_tolerance)
+        finally:
+            obj_eval.to_mesh_clear()
+        if not mesh_tris:
+            continue
+        tris += mesh_tris
+        model_children.append(_dmx_dag("DmeDag", obj.name, Matrix.Identity(4), dme_mesh))
+        if mesh_flexes:
+            flex_meshes.append(dme_mesh)
+            flex_names.extend(flex for flex in mesh_flexes if flex not in flex_names)
+
+    root = (DMXElement("DmElement", "root")
+            .set("skeleton", DMX_ELEMENT, model)
+            .set("model", DMX_ELEMENT, model))
+    if flex_names:
+        controls = [DMXElement("DmeCombinationInputControl", flex)
+                    .set("rawControlNames", DMX_STRING + DMX_ARRAY, [flex])
+                    .set("stereo", DMX_BOOL, False)
+                    .set("eyelid", DMX_BOOL, False)
+                    .set("wrinkleScales", DMX_FLOAT + DMX_ARRAY, [0.0])
+                    for flex in flex_names]
+        control_values = np.tile([0.0, 0.0, 0.5], (len(flex_names), 1))
+        root.set("combinationOperator", DMX_ELEMENT, DMXElement("DmeCombinationOperator", "combinationOperator")
+                 .set("controls", DMX_ELEMENT + DMX_ARRAY, controls)
+                 .set("controlValues", DMX_VECTOR3 + DMX_ARRAY, control_values)
+                 .set("controlValuesLagged", DMX_VECTOR3 + DMX_ARRAY, control_values)
+                 .set("usesLaggedValues", DMX_BOOL, False)
+                 .set("dominators", DMX_ELEMENT + DMX_ARRAY, [])
+                 .set("targets", DMX_ELEMENT + DMX_ARRAY, flex_meshes))
+    return root, tris, flex_names
+
+def export_dmx_models(context, targets: Dict[str, list], directory: str, flex_tolerance: Optional[float] = None) -> list:
+    """一次求值依赖图，把 {文件名: [(对象, 导出部分)]} 全部写成二进制 DMX（模型 + 形态键），返回每个文件的结果"""
+    os.makedirs(directory, exist_ok=True)
+    if context.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    objects = {obj for items in targets.values() for obj, _ in items}
+    results = []
+    with export_reference_pose(context, objects):
+        depsgraph = context.evaluated_depsgraph_get()
+        for name, items in targets.items():
+            start = time.perf_counter()
+            path = os.path.join(directory, f"{name}.dmx")
+            root, tris, flexes = build_dmx_model(name, items, depsgraph, flex_tolerance)
+            write_binary_dmx(path, root)
+            results.append({"name": name, "path": path, "tris": tris, "flexes": flexes, "seconds": time.perf_counter() - start})
+            print(f"已导出 {path}: {tris} 个三角形，{len(flexes)} 个形态键，用时 {results[-1]['seconds']:.2f} 秒")
+    return results
+
+def model_export_directory(context) -> str:
+    """模型文件导出目录：未单独设置时使用 QC 文件所在目录（QC 中的 studio 路径相对于它）"""
+    settings = context.scene.qseparator_settings
+    directory = settings.model_export_dir.strip()
+    if not directory and settings.qc_output_path.strip():
+        directory = os.path.dirname(bpy.path.abspath(settings.qc_output_path))
+    return bpy.path.abspath(directory) if directory else ""
+
+def bodygroup_export_targets(context) -> Dict[str, list]:
+    """QC 引用的文件名 → [(对象, 导出部分)]；非破坏描边不在原集合模式时只导出原模型部分"""
+    part = 'ALL' if context.scene.outline_mode == 'ORIGINAL' else 'BASE'
+    targets = {}
+    for coll_name, file_name in bodygroup_file_names(context).items():
+        coll = bpy.data.collections.get(coll_name)
+        items = [(obj, part) for obj in coll.all_objects if obj.type == 'MESH'] if coll else []
+        if items:
+            targets[file_name] = items
+    return targets
+
+def export_smd_models(context, targets: Dict[str, list], directory: str, flex_tolerance: Optional[float] = None) -> list:
+    """一次求值依赖图，把 {文件名: [(对象, 导出部分)]} 全部写成参考 SMD，返回每个文件的结果
+
+    传入 flex_tolerance 时，含形态键的文件同时写出同名 VTA（结果中的 "flexes" 为 flex 名称）。
+    """
+    os.makedirs(directory, exist_ok=True)
+    if context.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    objects = {obj for items in targets.values() for obj, _ in items}
+    results = []
+    with export_reference_pose(context, objects):
+        depsgraph = context.evaluated_depsgraph_get()
+        for name, items in targets.items():
+            start = time.perf_counter()
+            path = os.path.join(directory, f"{name}.smd")
+            tris = write_smd(path, items, depsgraph)
+            flexes = []
+            if flex_tolerance is not None:
+                flexes = write_vta(os.path.join(directory, f"{name}.vta"), items, depsgraph, flex_tolerance)
+            results.append({"name": name, "path": path, "tris": tris, "flexes": flexes, "seconds": time.perf_counter() - start})
+            print(f"已导出 {path}: {tris} 个三角形，用时 {results[-1]['seconds']:.2f} 秒")
+    return results
+
 def auto_preprocess(context):
     """自动前置预处理：整理对象和集合结构"""
     settings = context.scene.qseparator_settings
     total_collection_name = settings.total_collection_name.strip() or "总合集"
     
     try:
+        hierarchy = CollectionHierarchyIndex.build()
+        
         # 获取或创建总合集
-        total_collection = bpy.data.collections.get(total_collection_name)
+        total_collection = hierarchy.get(total_collection_name)
         if not total_collection:
-            total_collection = bpy.data.collections.new(total_collection_name)
-            context.scene.collection.children.link(total_collection)
+            total_collection = hierarchy.new(total_collection_name, context.scene.collection)
         
         # 处理场景中的网格对象
         for obj in context.scene.objects:
@@ -617,10 +3077,9 @@ def auto_preprocess(context):
             # 如果对象没有集合或只在主集合中
             if not current_collections or (len(current_collections) == 1 and current_collections[0] == context.scene.collection):
                 # 创建或获取同名集合
-                obj_collection = bpy.data.collections.get(obj.name)
+                obj_collection = hierarchy.get(obj.name)
                 if not obj_collection:
-                    obj_collection = bpy.data.collections.new(obj.name)
-                    total_collection.children.link(obj_collection)
+                    obj_collection = hierarchy.new(obj.name, total_collection)
                 
                 # 从其他集合中移除对象
                 for coll in current_collections:
@@ -633,22 +3092,13 @@ def auto_preprocess(context):
             else:
                 for coll in current_collections:
                     if coll != context.scene.collection and coll != total_collection:
-                        # 如果集合不在总合集中，移动到总合集下
-                        if coll.name not in total_collection.children:
-                            # 先从其他父集合中解除链接
-                            for parent_coll in bpy.data.collections:
-                                if coll.name in parent_coll.children:
-                                    parent_coll.children.unlink(coll)
-                            # 链接到总合集
-                            total_collection.children.link(coll)
+                        # 如果集合不在总合集中，移动到总合集下（先从其他父集合中解除链接）
+                        if not hierarchy.is_child_of(coll, total_collection):
+                            hierarchy.move(coll, total_collection)
         
         # 清理空集合
-        for coll in bpy.data.collections:
-            if (coll != context.scene.collection and 
-                coll != total_collection and 
-                not coll.objects and 
-                not coll.children):
-                bpy.data.collections.remove(coll)
+        hierarchy.cleanup_empty(exclude=(total_collection,))
+        collection_cache.invalidate()
         
         return {'FINISHED'}
         
@@ -662,6 +3112,23 @@ class QSEPARATOR_OT_CopyText(bpy.types.Operator):
     
     def execute(self, context):
         settings = context.scene.qseparator_settings
+        if translation_job.running:
+            self.report({'WARNING'}, "后台翻译进行中，请稍候")
+            return {'CANCELLED'}
+        
+        # 有需要联网翻译的名称时在后台翻译，完成后自动复制，避免阻塞界面
+        _, names_to_translate, _ = collect_bodygroup_entries(context)
+        options = TranslationOptions.from_settings(settings)
+        pending = pending_translations(names_to_translate, settings.translate_mode, options)
+        if pending and options.api_key and not translation_client.is_open():
+            def on_finish(translations):
+                text = generate_bodygroups(bpy.context, translations)
+                bpy.context.window_manager.clipboard = text
+                print(f"后台翻译完成，已复制{text.count('$bodygroup')}个配置项")
+            translation_job.start(names_to_translate, settings.translate_mode, options, on_finish)
+            self.report({'INFO'}, f"正在后台翻译 {len(pending)} 个名称，完成后自动复制")
+            return {'FINISHED'}
+        
         text = generate_bodygroups(context)
         context.window_manager.clipboard = text
         count = text.count('$bodygroup')
@@ -670,6 +3137,111 @@ class QSEPARATOR_OT_CopyText(bpy.types.Operator):
         self.report({'INFO'}, f"已复制{count}个配置项" if count else "没有可生成的内容")
         return {'FINISHED'}
 
+def _format_qc_write_stats(path: str, stats: dict) -> str:
+    if not stats["written"]:
+        return f"{stats['count']}个配置项均未变化，未改写 {os.path.basename(path)}"
+    return (f"已写入 {os.path.basename(path)}：新增{stats['added']} 修改{stats['changed']} "
+            f"未变{stats['unchanged']} 移除{stats['removed']}")
+
+class QSEPARATOR_OT_WriteQCFile(bpy.types.Operator):
+    bl_idname = "qseparator.write_qc_file"
+    bl_label = "写入QC文件"
+    bl_description = "将 $bodygroup 配置流式写入 .qc/.qci 文件，未变化的配置块不会改写"
+    
+    def execute(self, context):
+        settings = context.scene.qseparator_settings
+        path = settings.qc_output_path
+        if not path.strip():
+            self.report({'WARNING'}, "请先设置QC文件路径")
+            return {'CANCELLED'}
+        if translation_job.running:
+            self.report({'WARNING'}, "后台翻译进行中，请稍候")
+            return {'CANCELLED'}
+        copy_to_clipboard = settings.qc_copy_to_clipboard
+        
+        _, names_to_translate, _ = collect_bodygroup_entries(context)
+        options = TranslationOptions.from_settings(settings)
+        pending = pending_translations(names_to_translate, settings.translate_mode, options)
+        if pending and options.api_key and not translation_client.is_open():
+            def on_finish(translations):
+                try:
+                    stats = write_qc_bodygroups(path, iter_bodygroup_blocks(bpy.context, translations),
+                                                copy_to_clipboard, bpy.context.window_manager)
+                    print(f"后台翻译完成，{_format_qc_write_stats(path, stats)}")
+                except OSError as e:
+                    print(f"写入QC文件失败: {str(e)}")
+            translation_job.start(names_to_translate, settings.translate_mode, options, on_finish)
+            self.report({'INFO'}, f"正在后台翻译 {len(pending)} 个名称，完成后自动写入")
+            return {'FINISHED'}
+        
+        try:
+            stats = write_qc_bodygroups(path, iter_bodygroup_blocks(context),
+                                        copy_to_clipboard, context.window_manager)
+        except OSError as e:
+            self.report({'ERROR'}, f"写入QC文件失败: {str(e)}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, _format_qc_write_stats(path, stats))
+        return {'FINISHED'}
+
+class QSEPARATOR_OT_ExportSMD(bpy.types.Operator):
+    bl_idname = "qseparator.export_smd"
+    bl_label = "导出SMD文件"
+    bl_description = "把所有 bodygroup 集合导出为QC引用的参考SMD文件（含骨架，静止姿态）"
+    
+    def execute(self, context):
+        directory = model_export_directory(context)
+        if not directory:
+            self.report({'WARNING'}, "请先设置模型导出目录或QC文件路径")
+            return {'CANCELLED'}
+        targets = bodygroup_export_targets(context)
+        if not targets:
+            self.report({'WARNING'}, "没有可导出的 bodygroup 集合")
+            return {'CANCELLED'}
+        settings = context.scene.qseparator_settings
+        start = time.perf_counter()
+        try:
+            results = export_smd_models(context, targets, directory,
+                                        settings.flex_tolerance if settings.export_flex else None)
+        except OSError as e:
+            self.report({'ERROR'}, f"导出SMD失败: {str(e)}")
+            return {'CANCELLED'}
+        tris = sum(result["tris"] for result in results)
+        flex_blocks = [vta_flexfile_block(result["name"], result["flexes"]) for result in results if result["flexes"]]
+        message = f"已导出 {len(results)} 个SMD文件（{tris} 个三角形）到 {directory}，用时 {time.perf_counter() - start:.2f} 秒"
+        if flex_blocks:
+            # flex 名称只记录在 QC 中，把 flexfile 块复制出来方便粘贴到对应的 $model
+            context.window_manager.clipboard = "\n\n".join(flex_blocks)
+            message += f"；{len(flex_blocks)} 个VTA，flexfile 配置已复制到剪贴板"
+        self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+class QSEPARATOR_OT_ExportDMX(bpy.types.Operator):
+    bl_idname = "qseparator.export_dmx"
+    bl_label = "导出DMX文件"
+    bl_description = "把所有 bodygroup 集合导出为QC引用的二进制DMX文件（模型+形态键）"
+    
+    def execute(self, context):
+        directory = model_export_directory(context)
+        if not directory:
+            self.report({'WARNING'}, "请先设置模型导出目录或QC文件路径")
+            return {'CANCELLED'}
+        targets = bodygroup_export_targets(context)
+        if not targets:
+            self.report({'WARNING'}, "没有可导出的 bodygroup 集合")
+            return {'CANCELLED'}
+        settings = context.scene.qseparator_settings
+        start = time.perf_counter()
+        try:
+            results = export_dmx_models(context, targets, directory,
+                                        settings.flex_tolerance if settings.export_flex else None)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, f"导出DMX失败: {str(e)}")
+            return {'CANCELLED'}
+        tris = sum(result["tris"] for result in results)
+        flexes = sum(len(result["flexes"]) for result in results)
+        self.report({'INFO'}, f"已导出 {len(results)} 个DMX文件（{tris} 个三角形，{flexes} 个形态键）到 {directory}，用时 {time.perf_counter() - start:.2f} 秒")
+        return {'FINISHED'}
+
 class QSEPARATOR_OT_CopyDefineVariable(bpy.types.Operator):
     bl_idname = "qseparator.copy_define_variable"
     bl_label = "复制DefineVariable"
@@ -680,6 +3252,70 @@ class QSEPARATOR_OT_CopyDefineVariable(bpy.types.Operator):
         self.report({'INFO'}, f"已复制DefineVariable: {define_variable_text}")
         return {'FINISHED'}
 
+class QSEPARATOR_OT_SetTranslationOverride(bpy.types.Operator):
+    bl_idname = "qseparator.set_translation_override"
+    bl_label = "设置翻译覆盖"
+    bl_description = "为当前翻译模式和风格手动指定某个名称的译文，优先于缓存和API结果（译文留空则删除覆盖）"
+    
+    source_text: bpy.props.StringProperty(name="原文")
+    translated_text: bpy.props.StringProperty(name="译文")
+    
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+    
+    def execute(self, context):
+        settings = context.scene.qseparator_settings
+        if not self.source_text.strip():
+            self.report({'WARNING'}, "原文不能为空")
+            return {'CANCELLED'}
+        translation_cache.load()
+        translation_cache.set_override(settings.translate_mode, settings.translation_style,
+                                       self.source_text.strip(), self.translated_text.strip())
+        translation_cache.save()
+        if self.translated_text.strip():
+            self.report({'INFO'}, f"已设置覆盖: {self.source_text} -> {self.translated_text}")
+        else:
+            self.report({'INFO'}, f"已删除覆盖: {self.source_text}")
+        return {'FINISHED'}
+
+class QSEPARATOR_OT_AddGlossaryTerm(bpy.types.Operator):
+    bl_idname = "qseparator.add_glossary_term"
+    bl_label = "添加术语"
+    bl_description = "向用户术语表添加一个词条（按当前翻译方向），名称由术语组合而成时无需联网翻译"
+    
+    source_text: bpy.props.StringProperty(name="术语")
+    translated_text: bpy.props.StringProperty(name="译文")
+    
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+    
+    def execute(self, context):
+        settings = context.scene.qseparator_settings
+        source, translated = self.source_text.strip(), self.translated_text.strip()
+        if not source or not translated:
+            self.report({'WARNING'}, "术语和译文都不能为空")
+            return {'CANCELLED'}
+        try:
+            glossary_translator.add_user_term(settings.translate_mode, source, translated)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, f"保存术语表失败: {str(e)}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"已添加术语: {source} -> {translated}")
+        return {'FINISHED'}
+
+class QSEPARATOR_OT_ClearTranslationCache(bpy.types.Operator):
+    bl_idname = "qseparator.clear_translation_cache"
+    bl_label = "清空翻译缓存"
+    bl_description = "删除所有缓存的翻译结果（保留手动覆盖）"
+    
+    def execute(self, context):
+        translation_cache.load()
+        count = len(translation_cache.entries)
+        translation_cache.clear(keep_overrides=True)
+        translation_cache.save()
+        self.report({'INFO'}, f"已清空 {count} 条翻译缓存")
+        return {'FINISHED'}
+
 class QSEPARATOR_OT_AddSearchItem(bpy.types.Operator):
     bl_idname = "qseparator.add_search_item"
     bl_label = "添加排除项"
@@ -777,6 +3413,81 @@ class QSEPARATOR_OT_OptimizeMaterialNames(bpy.types.Operator):
         
         return {'FINISHED'}
 
+class BufferedLogWriter:
+    """共享的缓冲日志写入器
+
+    各处日志只追加到内存缓冲，由后台线程按大小或时间阈值批量写入文件，
+    每个文件每次刷新只打开一次，避免在操作过程中频繁打开/关闭（网络盘上尤其慢）。
+    """
+
+    def __init__(self, flush_bytes: int = 64 * 1024, flush_interval: float = 1.0):
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()       # 保护缓冲区
+        self._io_lock = threading.Lock()    # 保证按写入顺序落盘
+        self._wake = threading.Event()
+        self._buffers: Dict[str, List[str]] = defaultdict(list)
+        self._pending_bytes = 0
+        self._known_dirs: Set[str] = set()
+        self._thread = None
+        self._stopping = False
+
+    def write(self, path: str, line: str):
+        with self._lock:
+            self._buffers[path].append(line + "\n")
+            self._pending_bytes += len(line) + 1
+            full = self._pending_bytes >= self.flush_bytes
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="MQToolsLogWriter", daemon=True)
+            self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self, wait: bool = False):
+        """wait=False 只唤醒后台线程；wait=True 在当前线程同步写完所有缓冲"""
+        if wait:
+            self._drain()
+        else:
+            self._wake.set()
+
+    def close(self):
+        """停止后台线程并写完剩余内容（注销插件与退出 Blender 时调用）"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self._drain()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def _drain(self):
+        with self._io_lock:
+            with self._lock:
+                if not self._buffers:
+                    return
+                buffers, self._buffers = self._buffers, defaultdict(list)
+                self._pending_bytes = 0
+            for path, lines in buffers.items():
+                try:
+                    directory = os.path.dirname(path)
+                    if directory and directory not in self._known_dirs:
+                        os.makedirs(directory, exist_ok=True)
+                        self._known_dirs.add(directory)
+                    with open(path, 'a', encoding='utf-8') as f:
+                        f.write("".join(lines))
+                except Exception as e:
+                    print(f"Error writing to log file {path}: {e}")
+
+
+# 全局日志写入器
+log_writer = BufferedLogWriter()
+
 def log_message(context, message):
     # Simple logger that prints to the console.
     # A more advanced version could write to a file or a text block in Blender.
@@ -786,11 +3497,7 @@ def log_message(context, message):
     settings = context.scene.mmd_separator_settings
     if settings.enable_file_logging and settings.log_file_path:
         log_path = bpy.path.abspath(settings.log_file_path)
-        try:
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}\n")
-        except Exception as e:
-            print(f"Error writing to log file: {e}")
+        log_writer.write(log_path, f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
     else:
         print(f"[MMD Separator] {message}")
 
@@ -1024,6 +3731,7 @@ class QSEPARATOR_OT_QuickSeparate(bpy.types.Operator):
     def execute(self, context):
         settings = context.scene.qseparator_settings
         total_collection = None
+        hierarchy = CollectionHierarchyIndex.build()
         
         # 如果是GLB模式且启用了总合集功能，处理总合集
         if (settings.export_mode == 'GLB' and 
@@ -1033,25 +3741,15 @@ class QSEPARATOR_OT_QuickSeparate(bpy.types.Operator):
             total_collection_name = settings.total_collection_name.strip()
             
             # 获取或创建总合集
-            total_collection = bpy.data.collections.get(total_collection_name)
+            total_collection = hierarchy.get(total_collection_name)
             if not total_collection:
-                total_collection = bpy.data.collections.new(total_collection_name)
-                context.scene.collection.children.link(total_collection)
+                total_collection = hierarchy.new(total_collection_name, context.scene.collection)
             
-            # 将所有非主集合移动到总合集下
-            for coll in bpy.data.collections:
-                if (coll != context.scene.collection and 
-                    coll != total_collection and 
-                    coll.name not in total_collection.children):
-                    # 从当前父级解除链接
-                    for parent_coll in bpy.data.collections:
-                        if coll.name in parent_coll.children:
-                            parent_coll.children.unlink(coll)
-                    # 从场景集合中解除链接
-                    if coll.name in context.scene.collection.children:
-                        context.scene.collection.children.unlink(coll)
-                    # 链接到总合集
-                    total_collection.children.link(coll)
+            # 将所有非主集合移动到总合集下（从当前父级和场景集合中解除链接）
+            for coll in list(hierarchy.by_name.values()):
+                if (coll != total_collection and 
+                    not hierarchy.is_child_of(coll, total_collection)):
+                    hierarchy.move(coll, total_collection)
             
             # 处理骨架对象
             for obj in context.scene.objects:
@@ -1099,27 +3797,18 @@ class QSEPARATOR_OT_QuickSeparate(bpy.types.Operator):
                 obj.name = clean_name  # 使用去除扩展名的名称
                 
                 # 创建/获取材质集合
-                collection = bpy.data.collections.get(clean_name)
+                collection = hierarchy.get(clean_name)
                 if not collection:
-                    collection = bpy.data.collections.new(clean_name)
                     # 如果启用了总合集，将新集合放入总合集
                     if total_collection and settings.enable_total_collection:
-                        total_collection.children.link(collection)
+                        collection = hierarchy.new(clean_name, total_collection)
                     else:
-                        context.scene.collection.children.link(collection)
+                        collection = hierarchy.new(clean_name, context.scene.collection)
                 else:
-                    # 如果集合已存在且启用了总合集，确保它在正确的位置
+                    # 如果集合已存在且启用了总合集，确保它在正确的位置（从其他父级和场景集合中解除链接）
                     if total_collection and settings.enable_total_collection:
-                        if collection.name not in total_collection.children:
-                            # 从其他父级解除链接
-                            for parent_coll in bpy.data.collections:
-                                if collection.name in parent_coll.children:
-                                    parent_coll.children.unlink(collection)
-                            # 从场景集合中解除链接
-                            if collection.name in context.scene.collection.children:
-                                context.scene.collection.children.unlink(collection)
-                            # 链接到总合集
-                            total_collection.children.link(collection)
+                        if not hierarchy.is_child_of(collection, total_collection):
+                            hierarchy.move(collection, total_collection)
                 
                 # 移动对象到集合
                 for coll in obj.users_collection:
@@ -1127,7 +3816,7 @@ class QSEPARATOR_OT_QuickSeparate(bpy.types.Operator):
                 collection.objects.link(obj)
 
             # 清理空集合
-            self.cleanup_empty_collections()
+            self.cleanup_empty_collections(hierarchy)
 
             # 清理所有分离对象的形态键
             for obj in all_separated_objects:
@@ -1152,24 +3841,12 @@ class QSEPARATOR_OT_QuickSeparate(bpy.types.Operator):
 
         return {'FINISHED'}
 
-    def cleanup_empty_collections(self):
+    def cleanup_empty_collections(self, hierarchy=None):
         """清理所有空集合"""
-        empty_collections = [
-            coll for coll in bpy.data.collections
-            if coll.name != "Collection"
-            and not coll.children
-            and len(coll.objects) == 0
-        ]
-
-        for coll in reversed(empty_collections):
-            try:
-                for scene in bpy.data.scenes:
-                    scene_collection = scene.collection
-                    if coll.name in scene_collection.children:
-                        scene_collection.children.unlink(coll)
-                bpy.data.collections.remove(coll)
-            except Exception as e:
-                print(f"清理集合时出错: {str(e)}")
+        if hierarchy is None:
+            hierarchy = CollectionHierarchyIndex.build()
+        hierarchy.cleanup_empty(exclude=("Collection",))
+        collection_cache.invalidate()
 
 class QSEPARATOR_OT_MMDSeparate(bpy.types.Operator):
     bl_idname = "qseparator.mmd_separate"
@@ -1240,26 +3917,15 @@ class QSEPARATOR_OT_MMDSeparate(bpy.types.Operator):
             if all_separated_objects and all_separated_objects[0].name in bpy.data.objects:
                 context.view_layer.objects.active = all_separated_objects[0]
 
+        log_writer.flush()
         return {'FINISHED'}
 
-    def cleanup_empty_collections(self):
+    def cleanup_empty_collections(self, hierarchy=None):
         """清理所有空集合"""
-        empty_collections = [
-            coll for coll in bpy.data.collections
-            if coll.name != "Collection"
-            and not coll.children
-            and len(coll.objects) == 0
-        ]
-
-        for coll in reversed(empty_collections):
-            try:
-                for scene in bpy.data.scenes:
-                    scene_collection = scene.collection
-                    if coll.name in scene_collection.children:
-                        scene_collection.children.unlink(coll)
-                bpy.data.collections.remove(coll)
-            except Exception as e:
-                print(f"清理集合时出错: {str(e)}")
+        if hierarchy is None:
+            hierarchy = CollectionHierarchyIndex.build()
+        hierarchy.cleanup_empty(exclude=("Collection",))
+        collection_cache.invalidate()
 
 # 添加材质列表操作符 
 class QSEPARATOR_OT_AddMaterialItem(bpy.types.Operator):
@@ -1347,12 +4013,12 @@ class QSEPARATOR_OT_OrganizeOutlines(bpy.types.Operator):
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        collections = bpy.data.collections
+        hierarchy = CollectionHierarchyIndex.build()
         outline_collections = {}
         base_collections = {}
         
         # 分类合集
-        for coll in collections:
+        for coll in hierarchy.by_name.values():
             if coll.name.startswith("Outline_"):
                 # 获取基础名称（去掉Outline_前缀）
                 base_name = coll.name[8:]  # 跳过"Outline_"
@@ -1369,36 +4035,77 @@ class QSEPARATOR_OT_OrganizeOutlines(bpy.types.Operator):
             
             if matching_base:
                 # 检查描边合集是否已经在正确的位置
-                already_child = False
-                for child in matching_base.children:
-                    if child == outline_coll:
-                        already_child = True
-                        break
-                
-                if not already_child:
-                    # 从当前父级解除链接
-                    for parent_coll in collections:
-                        try:
-                            if outline_coll.name in parent_coll.children:
-                                parent_coll.children.unlink(outline_coll)
-                        except:
-                            continue
-                    
-                    # 链接到新的父级
+                if not hierarchy.is_child_of(outline_coll, matching_base):
+                    # 从当前父级解除链接并链接到新的父级
                     try:
-                        matching_base.children.link(outline_coll)
+                        hierarchy.move(outline_coll, matching_base)
                         processed_count += 1
                         print(f"已移动 {outline_coll.name} 到 {matching_base.name}")
                     except Exception as e:
                         print(f"移动合集 {outline_coll.name} 时出错: {str(e)}")
         
         if processed_count > 0:
+            collection_cache.invalidate()
             self.report({'INFO'}, f"已整理 {processed_count} 个描边合集")
         else:
             self.report({'INFO'}, "没有需要整理的描边合集")
             
         return {'FINISHED'}
 
+class QSEPARATOR_OT_AnalyzeSourceLimits(bpy.types.Operator):
+    bl_idname = "qseparator.analyze_source_limits"
+    bl_label = "导出前检查"
+    bl_description = "按编译器视角统计每个 bodygroup 的顶点、骨骼、材质和权重影响数，检查 studiomdl 限制"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    auto_split: bpy.props.BoolProperty(
+        name="自动拆分",
+        description="把超出顶点上限的子模型拆分为多个 bodygroup 集合",
+        default=False,
+        options={'SKIP_SAVE'}
+    )
+
+    def execute(self, context):
+        global source_limit_report
+        settings = context.scene.qseparator_settings
+        if context.mode != 'OBJECT':
+            self.report({'WARNING'}, "请在物体模式下操作")
+            return {'CANCELLED'}
+
+        report = analyze_source_limits(context)
+        if self.auto_split and settings.limit_split_mode != 'NONE':
+            limit = SOURCE_LIMITS["verts_per_model"]
+            models = _export_models(context)
+            hierarchy = CollectionHierarchyIndex.build()
+            created, oversized = 0, 0
+            for model_name, verts, _, _ in report.models:
+                if verts > limit and model_name in models:
+                    model_created, model_oversized = split_model_for_limits(
+                        context, model_name, models[model_name], settings.limit_split_mode, limit, hierarchy)
+                    created += model_created
+                    oversized += model_oversized
+            report = analyze_source_limits(context)
+            report.split_count = created
+            if oversized:
+                report.issues.append(SourceLimitIssue('ERROR', "自动拆分",
+                    f"{oversized} 个{'材质' if settings.limit_split_mode == 'MATERIAL' else '连通块'}单独就超出顶点上限，无法按此方式拆分"))
+
+        source_limit_report = report
+        errors = sum(1 for issue in report.issues if issue.severity == 'ERROR')
+        warnings = len(report.issues) - errors
+        for issue in report.issues:
+            print(f"[导出前检查] {issue.severity} {issue.scope}: {issue.message}")
+        summary = f"检查 {len(report.models)} 个子模型，用时 {report.elapsed:.2f} 秒"
+        if report.split_count:
+            summary += f"，拆分出 {report.split_count} 个对象"
+        if errors:
+            self.report({'ERROR'}, f"{summary}：{errors} 个错误，{warnings} 个警告")
+        elif warnings:
+            self.report({'WARNING'}, f"{summary}：{warnings} 个警告")
+        else:
+            self.report({'INFO'}, f"{summary}：全部符合限制")
+        return {'FINISHED'}
+
 class QSEPARATOR_OT_SelectItem(bpy.types.Operator):
     bl_idname = "qseparator.select_item"
     bl_label = "选择列表项"
@@ -1488,174 +4195,470 @@ class BONE_OT_SelectBonesByKeyword(bpy.types.Operator):
 # 工具 3: 目白麦昆的一键描边插件
 # --------------------------------------------------------------------------
 
-def add_outline(context, size, all_objects):
-    """实际执行描边操作的函数"""
-    if bpy.context.mode != 'OBJECT':
-        bpy.ops.object.mode_set(mode='OBJECT')
+def _get_outline_material(name: str):
+    """获取或创建黑色描边材质"""
+    material = bpy.data.materials.get(name)
+    if material is None:
+        material = bpy.data.materials.new(name=name)
+        material.diffuse_color = (0, 0, 0, 1)
+    return material
+
+def outline_materials_for(context, obj) -> list:
+    """按面板设置为对象生成描边材质列表（与原材质插槽一一对应）"""
+    new_materials = []
+
+    # **执行逻辑 1: 使用特定材质**
+    if context.scene.use_named_materials:
+        if "hair" in obj.name.lower():
+            new_materials.append(_get_outline_material("Outline_Hair"))
+        elif "face" in obj.name.lower():
+            new_materials.append(_get_outline_material("Outline_Face"))
+        else:
+            # 如果既不是 "hair" 也不是 "face"，第一个材质使用 Outline_Base
+            new_materials.append(_get_outline_material("Outline_Base"))
+
+    # **执行逻辑 2: 使用统一 Outline_Base 材质**
+    elif context.scene.use_outline_base:
+        new_materials.append(_get_outline_material("Outline_Base"))
+
+    # **执行逻辑 3: 只加 Outline_ 前缀 (当两者关闭时)**
+    for mat in obj.data.materials[len(new_materials):]:  # 确保保留其他材质
+        new_materials.append(_get_outline_material("Outline_" + (mat.name if mat else "Empty")))
+    return new_materials
+
+def link_outline_object(context, obj, outline_obj, outline_mode: str) -> None:
+    """根据用户选择的模式放置描边对象到相应的集合中"""
+    if outline_mode == 'ORIGINAL':
+        # 放到与原始对象相同的集合
+        for collection in obj.users_collection:
+            collection.objects.link(outline_obj)
+    elif outline_mode == 'SINGLE':
+        # 放到统一的集合中
+        outline_collection = bpy.data.collections.get("Outline_Collection")
+        if not outline_collection:
+            outline_collection = bpy.data.collections.new(name="Outline_Collection")
+            context.scene.collection.children.link(outline_collection)
+        outline_collection.objects.link(outline_obj)
+    elif outline_mode == 'SEPARATE':
+        # 为每个描边对象创建单独的集合
+        collection_name = outline_obj.name
+        new_collection = bpy.data.collections.get(collection_name)
+        if new_collection is None:
+            new_collection = bpy.data.collections.new(name=collection_name)
+            context.scene.collection.children.link(new_collection)
+        new_collection.objects.link(outline_obj)
+
+def vertex_group_weights(obj, group_name: str, default: float = 0.0) -> Optional[np.ndarray]:
+    """读取顶点组的逐顶点权重（不在组内的顶点为 default），组不存在时返回 None"""
+    group = obj.vertex_groups.get(group_name) if group_name else None
+    if group is None:
+        return None
+    index = group.index
+    mesh = obj.data
+    return np.fromiter(
+        (next((g.weight for g in v.groups if g.group == index), default) for v in mesh.vertices),
+        dtype=np.float32, count=len(mesh.vertices))
 
+def build_outline_shell(source_mesh, outline_mesh, thickness: float, weights: Optional[np.ndarray] = None) -> None:
+    """在数据层生成描边外壳：顶点沿法线向外推（可按顶点权重缩放），再翻转面朝向
+
+    等价于原先的 翻转法线 + 缩放/膨胀，但不切换编辑模式，也不产生额外的撤销步骤。
+    """
+    count = len(outline_mesh.vertices)
+    coords = np.empty(count * 3, dtype=np.float32)
+    normals = np.empty(count * 3, dtype=np.float32)
+    outline_mesh.vertices.foreach_get("co", coords)
+    source_mesh.vertices.foreach_get("normal", normals)
+    offsets = normals.reshape(-1, 3) * thickness
+    if weights is not None:
+        offsets *= weights[:, None]
+    offsets = offsets.ravel()
+    coords += offsets
+    outline_mesh.vertices.foreach_set("co", coords)
+    # 有形态键时网格由形态键求值，同样的偏移需要加到每个形态键上（与原先 shrink_fatten 移动基型并带动形态键一致）
+    if outline_mesh.shape_keys:
+        for key_block in outline_mesh.shape_keys.key_blocks:
+            key_block.data.foreach_get("co", coords)
+            coords += offsets
+            key_block.data.foreach_set("co", coords)
+
+    # 保留原模型的材质分配（即面与材质插槽的关系），批量复制
+    if len(source_mesh.polygons):
+        material_index = np.empty(len(source_mesh.polygons), dtype=np.int32)
+        source_mesh.polygons.foreach_get("material_index", material_index)
+        outline_mesh.polygons.foreach_set("material_index", material_index)
+
+    outline_mesh.flip_normals()
+    outline_mesh.update()
+
+def outline_source_objects(context, all_objects: bool) -> list:
+    """需要添加描边的网格对象（排除描边对象与 smd_bone_vis）"""
     if all_objects:
         objs = [obj for obj in bpy.data.objects if obj.type == 'MESH' and not obj.name.startswith("Outline_")]  # 只选择网格对象，排除描边对象
     else:
         objs = [obj for obj in context.selected_objects if obj.type == 'MESH' and not obj.name.startswith("Outline_")]  # 只选择选中的网格对象，排除描边对象
-
-    outline_mode = context.scene.outline_mode
-
+    result = []
     for obj in objs:
         # 跳过名称包含 "smd_bone_vis" 的对象
         if "smd_bone_vis" in obj.name.lower():
             print(f"跳过 {obj.name}，因为它与 'smd_bone_vis' 相关。")
             continue
+        result.append(obj)
+    return result
 
-        outline_obj_name = "Outline_" + obj.name
+OUTLINE_MODIFIER_NAME = "MQ_Outline"
+OUTLINE_MATERIALS_PROP = "mq_outline_materials"   # 对象自定义属性：add_outline_modifiers 追加的描边材质名
+OUTLINE_PLACEHOLDER_PROP = "mq_outline_placeholder"  # 对象自定义属性：没有材质插槽时追加的空占位插槽
 
-        # 检查是否已有对应的描边对象，避免重复创建
+def outline_modifier(obj):
+    """非破坏描边使用的实体化修改器（没有时返回 None）"""
+    mod = obj.modifiers.get(OUTLINE_MODIFIER_NAME)
+    return mod if mod is not None and mod.type == 'SOLIDIFY' else None
+
+def shape_key_vertex_map(obj, mesh) -> Optional[np.ndarray]:
+    """评估后网格的顶点 → 原网格顶点（形态键数据的索引），无法对应时返回 None
+
+    拓扑不变时一一对应；非破坏描边的实体化修改器（简单模式、无边缘）按顺序输出两份顶点，
+    外壳顶点 i 对应原顶点 i % n。
+    """
+    count = len(obj.data.vertices)
+    if len(mesh.vertices) == count:
+        return np.arange(count, dtype=np.int64)
+    mod = outline_modifier(obj)
+    if mod is not None and mod.show_viewport and count and len(mesh.vertices) == count * 2:
+        return np.arange(count * 2, dtype=np.int64) % count
+    return None
+
+def add_outline_modifiers(context, size, objs) -> list:
+    """非破坏描边：添加翻转法线的实体化修改器，外壳通过材质偏移使用追加在末尾的描边材质
+
+    不复制网格，外壳随原模型编辑自动更新，导出前再用 bake_outline_modifiers 烘焙为真实几何体。
+    """
+    thickness_group = context.scene.outline_thickness_group.strip()
+    created = []
+    for obj in objs:
+        if outline_modifier(obj) is not None or bpy.data.objects.get("Outline_" + obj.name):
+            print(f"{obj.name} 已有描边，跳过。")
+            continue
+        mesh = obj.data
+        new_materials = outline_materials_for(context, obj) or [_get_outline_material("Outline_Base")]
+        # 没有材质插槽时先追加空占位插槽，保证偏移量至少为 1，原模型不会用到描边材质
+        if not len(mesh.materials):
+            mesh.materials.append(None)
+            obj[OUTLINE_PLACEHOLDER_PROP] = True
+        slot_offset = len(mesh.materials)
+        for new_material in new_materials:
+            mesh.materials.append(new_material)
+        obj[OUTLINE_MATERIALS_PROP] = [new_material.name for new_material in new_materials]
+
+        mod = obj.modifiers.new(name=OUTLINE_MODIFIER_NAME, type='SOLIDIFY')
+        mod.thickness = abs(size)
+        mod.offset = 1.0
+        mod.use_flip_normals = True
+        mod.use_rim = False
+        mod.material_offset = slot_offset
+        if thickness_group and obj.vertex_groups.get(thickness_group):
+            mod.vertex_group = thickness_group
+            mod.thickness_vertex_group = 0.0
+        created.append(obj)
+        print(f"已为 {obj.name} 添加非破坏描边")
+    return created
+
+OUTLINE_SOURCE_VERTEX_ATTR = "mq_source_vertex"
+
+def _copy_shape_keys_to_shell(obj, outline_obj, source_vertex) -> None:
+    """把原对象的形态键搬到烘焙出的外壳上：外壳顶点 = 外壳基型 + 对应原顶点的形态键偏移
+
+    同时复制数值、滑块范围、静音、顶点组、相对键以及形态键上的驱动器和动作，外壳与原模型表情保持一致。
+    """
+    src_key = obj.data.shape_keys
+    key_blocks = src_key.key_blocks
+    vert_count = len(obj.data.vertices)
+    basis = np.empty(vert_count * 3, dtype=np.float32)
+    key_blocks[0].data.foreach_get("co", basis)
+    basis = basis.reshape(-1, 3)
+    shell = outline_obj.data
+    shell_basis = np.empty(len(shell.vertices) * 3, dtype=np.float32)
+    shell.vertices.foreach_get("co", shell_basis)
+    shell_basis = shell_basis.reshape(-1, 3)
+
+    outline_obj.shape_key_add(name=key_blocks[0].name, from_mix=False)
+    coords = np.empty(vert_count * 3, dtype=np.float32)
+    for kb in key_blocks[1:]:
+        kb.data.foreach_get("co", coords)
+        new_kb = outline_obj.shape_key_add(name=kb.name, from_mix=False)
+        new_kb.data.foreach_set("co", (shell_basis + (coords.reshape(-1, 3) - basis)[source_vertex]).ravel())
+        new_kb.slider_min = kb.slider_min
+        new_kb.slider_max = kb.slider_max
+        new_kb.value = kb.value
+        new_kb.mute = kb.mute
+        new_kb.interpolation = kb.interpolation
+        new_kb.vertex_group = kb.vertex_group
+    dst_key = shell.shape_keys
+    dst_key.use_relative = src_key.use_relative
+    for kb in key_blocks[1:]:
+        relative = dst_key.key_blocks.get(kb.relative_key.name)
+        if relative is not None:
+            dst_key.key_blocks[kb.name].relative_key = relative
+
+    anim = src_key.animation_data
+    if anim is not None:
+        dst_anim = dst_key.animation_data_create()
+        dst_anim.action = anim.action
+        for fcurve in anim.drivers:
+            dst_anim.drivers.from_existing(src_driver=fcurve)
+
+def bake_outline_modifiers(context, objs=None) -> tuple:
+    """导出前把非破坏描边烘焙为独立的 Outline_ 对象，并停用原对象上的描边修改器，返回 (烘焙的对象, 跳过的对象名)
+
+    只保留描边修改器求值（临时关闭其他修改器，形态键只显示基型），新对象复制原对象的骨架等修改器，
+    删除原模型部分的面并去掉前面的原材质插槽。原对象有形态键时一并搬到外壳上；
+    外壳顶点无法对应到原顶点时不烘焙该对象（否则描边不再跟随表情）。
+    """
+    if objs is None:
+        objs = [obj for obj in bpy.data.objects if obj.type == 'MESH' and outline_modifier(obj) is not None]
+    baked = []
+    skipped = []
+    for obj in objs:
+        mod = outline_modifier(obj)
+        if mod is None or not mod.show_viewport:
+            continue
+        outline_obj_name = "Outline_" + obj.name
         if bpy.data.objects.get(outline_obj_name):
-            print(f"{outline_obj_name} 已存在，跳过描边创建。")
+            print(f"{outline_obj_name} 已存在，跳过烘焙。")
             continue
 
+        has_keys = bool(shape_key_names(obj))
+        others = [(m, m.show_viewport) for m in obj.modifiers if m != mod]
+        key_state = (obj.show_only_shape_key, obj.active_shape_key_index)
+        try:
+            for m, _ in others:
+                m.show_viewport = False
+            if has_keys:
+                obj.show_only_shape_key = True
+                obj.active_shape_key_index = 0
+            depsgraph = context.evaluated_depsgraph_get()
+            shell_mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph),
+                                                         preserve_all_data_layers=True, depsgraph=depsgraph)
+        finally:
+            for m, visible in others:
+                m.show_viewport = visible
+            if has_keys:
+                obj.show_only_shape_key, obj.active_shape_key_index = key_state
+
+        vert_count = len(obj.data.vertices)
+        if has_keys:
+            if len(shell_mesh.vertices) != vert_count * 2:
+                bpy.data.meshes.remove(shell_mesh)
+                print(f"警告：{obj.name} 有形态键，但描边外壳顶点无法对应到原顶点，未烘焙（请检查实体化修改器设置）")
+                skipped.append(obj.name)
+                continue
+            # 记录外壳每个顶点对应的原顶点，删除原模型部分的面后仍能对应
+            attr = shell_mesh.attributes.new(OUTLINE_SOURCE_VERTEX_ATTR, 'INT', 'POINT')
+            attr.data.foreach_set("value", np.arange(vert_count * 2, dtype=np.int32) % vert_count)
+
+        slot_offset = mod.material_offset
         outline_obj = obj.copy()
-        outline_obj.data = obj.data.copy()  # 复制网格数据
-        outline_obj.name = outline_obj_name  # 新对象的名称为 "Outline_原对象名"
+        outline_obj.data = shell_mesh
+        outline_obj.name = outline_obj_name
+        outline_obj.modifiers.remove(outline_obj.modifiers[mod.name])
+        link_outline_object(context, obj, outline_obj, context.scene.outline_mode)
+
+        # 只保留外壳（材质索引 >= 偏移量）并移除原材质插槽
+        material_index = np.empty(len(shell_mesh.polygons), dtype=np.int32)
+        shell_mesh.polygons.foreach_get("material_index", material_index)
+        _keep_faces(outline_obj, material_index >= slot_offset)
+        material_index = np.empty(len(shell_mesh.polygons), dtype=np.int32)
+        shell_mesh.polygons.foreach_get("material_index", material_index)
+        shell_mesh.polygons.foreach_set("material_index", np.maximum(material_index - slot_offset, 0))
+        for _ in range(min(slot_offset, len(shell_mesh.materials))):
+            shell_mesh.materials.pop(index=0)
+
+        if has_keys:
+            attr = shell_mesh.attributes[OUTLINE_SOURCE_VERTEX_ATTR]
+            source_vertex = np.empty(len(shell_mesh.vertices), dtype=np.int32)
+            attr.data.foreach_get("value", source_vertex)
+            shell_mesh.attributes.remove(attr)
+            _copy_shape_keys_to_shell(obj, outline_obj, source_vertex)
+
+        mod.show_viewport = False
+        mod.show_render = False
+        baked.append(outline_obj)
+        print(f"已烘焙 {obj.name} 的描边")
+    return baked, skipped
+
+def restore_outline_modifiers(context) -> int:
+    """删除烘焙出的描边对象并重新启用非破坏描边修改器"""
+    restored = 0
+    for obj in [o for o in bpy.data.objects if o.type == 'MESH' and outline_modifier(o) is not None]:
+        mod = outline_modifier(obj)
+        if mod.show_viewport:
+            continue
+        baked = bpy.data.objects.get("Outline_" + obj.name)
+        if baked is not None:
+            bpy.data.objects.remove(baked, do_unlink=True)
+        mod.show_viewport = True
+        mod.show_render = True
+        restored += 1
+    return restored
+
+def remove_outline_modifiers(context, tracker: Optional['DatablockTracker'] = None) -> int:
+    """移除非破坏描边修改器及其追加的描边材质插槽
+
+    只删除材质偏移之后、且是 add_outline_modifiers 追加的描边材质的插槽，用户之后自己添加的插槽保留；
+    传入 tracker 时记录被移除的描边材质，以便随后释放。
+    """
+    removed = 0
+    for obj in [o for o in bpy.data.objects if o.type == 'MESH' and outline_modifier(o) is not None]:
+        mod = outline_modifier(obj)
+        slot_offset = mod.material_offset
+        obj.modifiers.remove(mod)
+        mesh = obj.data
+        recorded = obj.get(OUTLINE_MATERIALS_PROP)
+        outline_names = set(recorded) if recorded is not None else None
+        for index in range(len(mesh.materials) - 1, slot_offset - 1, -1):
+            mat = mesh.materials[index]
+            if mat is None:
+                continue
+            # 没有记录（旧文件）时按描边材质的命名判断
+            is_outline = mat.name in outline_names if outline_names is not None else mat.name.startswith("Outline_")
+            if not is_outline:
+                continue
+            mesh.materials.pop(index=index)
+            if tracker is not None:
+                tracker.track_material(mat)
+        if OUTLINE_MATERIALS_PROP in obj:
+            del obj[OUTLINE_MATERIALS_PROP]
+        if obj.get(OUTLINE_PLACEHOLDER_PROP):
+            if len(mesh.materials) == 1 and mesh.materials[0] is None:
+                mesh.materials.pop(index=0)
+            del obj[OUTLINE_PLACEHOLDER_PROP]
+        removed += 1
+    return removed
 
-        # 根据用户选择的模式放置描边对象到相应的集合中
-        if outline_mode == 'ORIGINAL':
-            # 放到与原始对象相同的集合
-            for collection in obj.users_collection:
-                collection.objects.link(outline_obj)
-        elif outline_mode == 'SINGLE':
-            # 放到统一的集合中
-            outline_collection = bpy.data.collections.get("Outline_Collection")
-            if not outline_collection:
-                outline_collection = bpy.data.collections.new(name="Outline_Collection")
-                bpy.context.scene.collection.children.link(outline_collection)
-            outline_collection.objects.link(outline_obj)
-        elif outline_mode == 'SEPARATE':
-            # 为每个描边对象创建单独的集合
-            collection_name = outline_obj_name
-            if collection_name not in bpy.data.collections:
-                new_collection = bpy.data.collections.new(name=collection_name)
-                bpy.context.scene.collection.children.link(new_collection)
-            new_collection = bpy.data.collections[collection_name]
-            new_collection.objects.link(outline_obj)
+def add_outline(context, size, all_objects):
+    """实际执行描边操作的函数：一次处理所有目标对象，全部在数据层完成"""
+    if bpy.context.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
 
-        obj.select_set(False)
+    if context.scene.outline_method == 'MODIFIER':
+        return add_outline_modifiers(context, size, outline_source_objects(context, all_objects))
 
-        new_materials = []
+    outline_mode = context.scene.outline_mode
+    thickness_group = context.scene.outline_thickness_group.strip()
+    created = []
 
-        # **执行逻辑 1: 使用特定材质**
-        if context.scene.use_named_materials:
-            if "hair" in obj.name.lower():
-                hair_material = bpy.data.materials.get("Outline_Hair")
-                if hair_material is None:
-                    hair_material = bpy.data.materials.new(name="Outline_Hair")
-                    hair_material.diffuse_color = (0, 0, 0, 1)
-                new_materials.append(hair_material)
+    for obj in outline_source_objects(context, all_objects):
+        outline_obj_name = "Outline_" + obj.name
 
-            elif "face" in obj.name.lower():
-                face_material = bpy.data.materials.get("Outline_Face")
-                if face_material is None:
-                    face_material = bpy.data.materials.new(name="Outline_Face")
-                    face_material.diffuse_color = (0, 0, 0, 1)
-                new_materials.append(face_material)
+        # 检查是否已有对应的描边对象，避免重复创建
+        if bpy.data.objects.get(outline_obj_name):
+            print(f"{outline_obj_name} 已存在，跳过描边创建。")
+            continue
 
-            else:
-                # 如果既不是 "hair" 也不是 "face"，第一个材质使用 Outline_Base
-                outline_base_material = bpy.data.materials.get("Outline_Base")
-                if outline_base_material is None:
-                    outline_base_material = bpy.data.materials.new(name="Outline_Base")
-                    outline_base_material.diffuse_color = (0, 0, 0, 1)
-                new_materials.append(outline_base_material)
-
-        # **执行逻辑 2: 使用统一 Outline_Base 材质**
-        elif context.scene.use_outline_base:
-            outline_base_material = bpy.data.materials.get("Outline_Base")
-            if outline_base_material is None:
-                outline_base_material = bpy.data.materials.new(name="Outline_Base")
-                outline_base_material.diffuse_color = (0, 0, 0, 1)
-            new_materials.append(outline_base_material)
-
-        # **执行逻辑 3: 只加 Outline_ 前缀 (当两者关闭时)**
-        for mat in obj.data.materials[len(new_materials):]:  # 确保保留其他材质
-            new_material = bpy.data.materials.new(name="Outline_" + mat.name)
-            new_material.diffuse_color = (0, 0, 0, 1)
-            new_materials.append(new_material)
+        outline_obj = obj.copy()
+        outline_obj.data = obj.data.copy()  # 复制网格数据
+        outline_obj.name = outline_obj_name  # 新对象的名称为 "Outline_原对象名"
+        link_outline_object(context, obj, outline_obj, outline_mode)
+        obj.select_set(False)
 
         # 清除并重新分配材质
+        new_materials = outline_materials_for(context, obj)
         outline_obj.data.materials.clear()
         for new_material in new_materials:
             outline_obj.data.materials.append(new_material)
 
-        # 保留原模型的材质分配（即面与材质插槽的关系）
-        outline_mesh = outline_obj.data
-        for poly in outline_mesh.polygons:
-            poly.material_index = obj.data.polygons[poly.index].material_index
+        # size 为负值：沿翻转前的法线向外推 |size|
+        build_outline_shell(obj.data, outline_obj.data, -size, vertex_group_weights(obj, thickness_group))
+        created.append(outline_obj)
+        print(f"已为 {obj.name} 添加描边")
 
+    if created:
         bpy.ops.object.select_all(action='DESELECT')
-        outline_obj.select_set(True)
-        bpy.context.view_layer.objects.active = outline_obj
+        for outline_obj in created:
+            outline_obj.select_set(True)
+        context.view_layer.objects.active = created[-1]
+    return created
 
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action='SELECT')
-        bpy.ops.mesh.flip_normals()
-
-        bpy.ops.transform.shrink_fatten(value=size)
-
-        bpy.ops.object.mode_set(mode='OBJECT')
+def delete_outline_objects_and_collections(context, global_purge: bool = False):
+    """删除所有描边对象和相关的集合，并释放描边用到的网格和材质
 
-        print(f"已为 {obj.name} 添加描边")
-
-def delete_outline_objects_and_collections(context):
-    """删除所有描边对象和相关的集合，并清理孤立数据"""
+    global_purge 为 True 时额外执行全局孤立数据清理。
+    """
+    tracker = DatablockTracker()
+    removed_modifiers = remove_outline_modifiers(context, tracker)
+    if removed_modifiers:
+        print(f"已移除 {removed_modifiers} 个非破坏描边修改器。")
     outline_objects = [obj for obj in bpy.data.objects if obj.name.startswith("Outline_")]
     outline_collections = [col for col in bpy.data.collections if col.name.startswith("Outline_")]
 
     if outline_objects:
-        bpy.ops.object.select_all(action='DESELECT')  # 清除所有选择
         for obj in outline_objects:
-            # 检查对象是否在当前视图层中
+            # 只删除当前视图层中可见的描边对象
             if obj.visible_get():
-                obj.select_set(True)  # 选择描边对象
-        bpy.ops.object.delete()  # 删除选中的对象
+                tracker.track_object_data(obj)
+                bpy.data.objects.remove(obj, do_unlink=True)
 
         # 删除空的 Outline_ 开头的集合
         for collection in outline_collections:
             if not collection.objects:  # 只有集合为空时才删除
                 bpy.data.collections.remove(collection)
+        collection_cache.invalidate()
 
-        # 清理孤立数据（孤立的材质、网格、集合等）
-        bpy.ops.outliner.orphans_purge(do_recursive=True)
-
-        print("所有描边对象及相关集合已删除，并清理孤立数据。")
-    else:
+        print("所有描边对象及相关集合已删除。")
+    elif not removed_modifiers:
         print("没有找到描边对象或集合。")
 
+    # 只释放描边自己的网格、材质（其它对象仍在使用的不会被删除）
+    freed = tracker.free()
+    if global_purge:
+        purge_all_orphans()
+    if freed:
+        print(f"释放了 {freed} 个描边数据块。")
+
+def outline_entries(context) -> list:
+    """所有描边：(描边对象名, 原对象, 描边所在集合列表)，包括尚未烘焙的非破坏描边"""
+    entries = []
+    seen = set()
+    for obj in bpy.data.objects:
+        if obj.type != 'MESH':
+            continue
+        if obj.name.startswith("Outline_"):
+            entries.append((obj.name, obj, list(obj.users_collection)))
+            seen.add(obj.name)
+    for obj in bpy.data.objects:
+        if obj.type == 'MESH' and outline_modifier(obj) is not None:
+            name = "Outline_" + obj.name
+            if name not in seen:
+                # 烘焙后与原对象放在相同集合（原集合模式）
+                entries.append((name, obj, list(obj.users_collection)))
+    return entries
+
 def copy_smd_to_clipboard(context):
-    """生成 SMD 文本并复制到剪贴板，根据不同模式输出不同的 SMD 内容"""
+    """生成 SMD 文本并复制到剪贴板，根据不同模式输出不同的 SMD 内容（复制网格与非破坏描边均适用）"""
     smd_export_lines = []
     outline_mode = context.scene.outline_mode
     include_all_models = context.scene.include_all_models
+    entries = outline_entries(context)
 
     if outline_mode == 'SINGLE':
-        # 统一集合模式，输出单个 $body，集合名为 "Outline_Collection"
-        outline_collection = bpy.data.collections.get("Outline_Collection")
-        if outline_collection:
-            smd_line = f"$body {outline_collection.name} \"{outline_collection.name}.smd\""
-            smd_export_lines.append(smd_line)
+        # 统一集合模式，输出单个 $body，集合名为 "Outline_Collection"（非破坏描边烘焙时才创建）
+        if bpy.data.collections.get("Outline_Collection") or entries:
+            smd_export_lines.append('$body Outline_Collection "Outline_Collection.smd"')
 
     elif outline_mode == 'ORIGINAL':
         # 原集合模式，输出每个原模型所在集合
-        for obj in bpy.data.objects:
-            if obj.name.startswith("Outline_") and obj.type == 'MESH':
-                for collection in obj.users_collection:
-                    smd_line = f"$body {collection.name} \"{collection.name}.smd\""
+        for _, _, collections in entries:
+            for collection in collections:
+                smd_line = f"$body {collection.name} \"{collection.name}.smd\""
+                if smd_line not in smd_export_lines:
                     smd_export_lines.append(smd_line)
 
     elif outline_mode == 'SEPARATE':
         # 单独集合模式，输出每个描边对象的名称
-        for obj in bpy.data.objects:
-            if obj.name.startswith("Outline_") and obj.type == 'MESH':
-                smd_line = f"$body {obj.name} \"{obj.name}.smd\""
-                smd_export_lines.append(smd_line)
+        for name, _, _ in entries:
+            smd_line = f"$body {name} \"{name}.smd\""
+            smd_export_lines.append(smd_line)
 
     # 如果选择了 "输出全部" 选项，添加原始模型的 SMD 文本
     if include_all_models:
@@ -1670,10 +4673,65 @@ def copy_smd_to_clipboard(context):
     context.window_manager.clipboard = smd_text
     return smd_text
 
+def outline_export_targets(context) -> Dict[str, list]:
+    """与 copy_smd_to_clipboard 输出的 $body 行一一对应的导出内容：文件名 → [(对象, 导出部分)]
+
+    复制网格的 Outline_ 对象整体导出；非破坏描边只导出外壳，原集合模式下集合整体导出（原模型+外壳）。
+    """
+    targets = {}
+    outline_mode = context.scene.outline_mode
+    entries = outline_entries(context)
+
+    def shell(name, obj):
+        return (obj, 'ALL' if obj.name == name else 'SHELL')
+
+    if outline_mode == 'SINGLE':
+        if entries:
+            targets["Outline_Collection"] = [shell(name, obj) for name, obj, _ in entries]
+    elif outline_mode == 'ORIGINAL':
+        for _, _, collections in entries:
+            for collection in collections:
+                if collection.name not in targets:
+                    targets[collection.name] = [(obj, 'ALL') for obj in collection.all_objects if obj.type == 'MESH']
+    elif outline_mode == 'SEPARATE':
+        for name, obj, _ in entries:
+            targets[name] = [shell(name, obj)]
+
+    if context.scene.include_all_models:
+        for obj in bpy.data.objects:
+            if obj.type == 'MESH' and not obj.name.lower().startswith("outline_") and "face" not in obj.name.lower() and "smd_bone_vis" not in obj.name.lower():
+                targets[obj.name] = [(obj, 'BASE')]
+    return {name: items for name, items in targets.items() if items}
+
+class OUTLINE_OT_ExportSMD(bpy.types.Operator):
+    """把描边导出为"复制描边模型文本"中引用的SMD文件"""
+    bl_idname = "outline.export_smd"
+    bl_label = "导出描边SMD"
+
+    def execute(self, context):
+        directory = model_export_directory(context)
+        if not directory:
+            self.report({'WARNING'}, "请先在分离工具中设置模型导出目录或QC文件路径")
+            return {'CANCELLED'}
+        targets = outline_export_targets(context)
+        if not targets:
+            self.report({'WARNING'}, "没有找到描边对象")
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        try:
+            results = export_smd_models(context, targets, directory)
+        except OSError as e:
+            self.report({'ERROR'}, f"导出SMD失败: {str(e)}")
+            return {'CANCELLED'}
+        tris = sum(result["tris"] for result in results)
+        self.report({'INFO'}, f"已导出 {len(results)} 个SMD文件（{tris} 个三角形），用时 {time.perf_counter() - start:.2f} 秒")
+        return {'FINISHED'}
+
 class OUTLINE_OT_AddAll(bpy.types.Operator):
     """为所有模型对象添加描边"""
     bl_idname = "outline.add_all"
     bl_label = "快速描边"
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         add_outline(context, -abs(context.scene.outline_size), all_objects=True)  # 将输入值转为负值
@@ -1683,19 +4741,54 @@ class OUTLINE_OT_AddSelected(bpy.types.Operator):
     """为选中的模型对象添加描边"""
     bl_idname = "outline.add_selected"
     bl_label = "选择描边"
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         add_outline(context, -abs(context.scene.outline_size), all_objects=False)  # 将输入值转为负值
         bpy.context.space_data.shading.show_backface_culling = True
         return {'FINISHED'}
 
-class OUTLINE_OT_DeleteAll(bpy.types.Operator):
-    """删除所有描边对象"""
-    bl_idname = "outline.delete_all"
-    bl_label = "删除所有描边"
+class OUTLINE_OT_DeleteAll(bpy.types.Operator):
+    """删除所有描边对象"""
+    bl_idname = "outline.delete_all"
+    bl_label = "删除所有描边"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    global_purge: bpy.props.BoolProperty(
+        name="全局清理孤立数据",
+        description="删除描边后额外清理文件中所有零用户数据块（包括与描边无关的数据）",
+        default=False
+    )
+
+    def execute(self, context):
+        delete_outline_objects_and_collections(context, global_purge=self.global_purge)
+        return {'FINISHED'}
+
+class OUTLINE_OT_BakeModifiers(bpy.types.Operator):
+    """导出前将非破坏描边烘焙为独立的描边对象"""
+    bl_idname = "outline.bake_modifiers"
+    bl_label = "烘焙描边"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        if context.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        baked, skipped = bake_outline_modifiers(context)
+        if skipped:
+            self.report({'WARNING'}, f"已烘焙 {len(baked)} 个描边对象；{len(skipped)} 个有形态键的对象无法对应外壳顶点，未烘焙: {', '.join(skipped)}")
+        else:
+            self.report({'INFO'}, f"已烘焙 {len(baked)} 个描边对象" if baked else "没有需要烘焙的非破坏描边")
+        return {'FINISHED'}
+
+class OUTLINE_OT_RestoreModifiers(bpy.types.Operator):
+    """删除烘焙出的描边对象，恢复非破坏描边修改器"""
+    bl_idname = "outline.restore_modifiers"
+    bl_label = "恢复非破坏描边"
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        delete_outline_objects_and_collections(context)
+        restored = restore_outline_modifiers(context)
+        self.report({'INFO'}, f"已恢复 {restored} 个非破坏描边")
         return {'FINISHED'}
 
 class OUTLINE_OT_CopySMD(bpy.types.Operator):
@@ -1755,6 +4848,307 @@ def clean_material_name(name):
     name = re.sub(r'\.\d+$', '', name)
     return name.lower()  # 转换为小写以进行比较
 
+_VMT_TOKEN_RE = re.compile(r'"([^"]*)"|(//[^\n]*)|([{}])|([^\s{}"]+)')
+
+def parse_vmt(text: str) -> tuple:
+    """解析 VMT 的 KeyValues，返回 (着色器, {小写键: 值})
+
+    只保留顶层参数；Proxies 等嵌套块整体跳过，注释忽略。
+    """
+    shader = ""
+    params = {}
+    depth = 0
+    pending_key = None
+    for quoted, comment, brace, bare in _VMT_TOKEN_RE.findall(text):
+        if comment:
+            continue
+        if brace == "{":
+            depth += 1
+            pending_key = None
+            continue
+        if brace == "}":
+            depth -= 1
+            continue
+        token = quoted if bare == "" else bare
+        if depth == 0:
+            if not shader:
+                shader = token
+        elif depth == 1:
+            if pending_key is None:
+                pending_key = token.lower()
+            else:
+                params.setdefault(pending_key, token)
+                pending_key = None
+    return shader, params
+
+def vmt_texture_key(path: str) -> str:
+    """贴图路径的比较键：小写、无扩展名的文件名"""
+    name = path.replace("\\", "/").rsplit("/", 1)[-1]
+    return os.path.splitext(name)[0].lower()
+
+VMT_TEXTURE_PARAMS = ("$basetexture", "$basetexture2", "$bumpmap", "$normalmap", "$phongexponenttexture",
+                      "$lightwarptexture", "$envmapmask", "$detail", "$selfillummask")
+
+@dataclass
+class VMTRecord:
+    path: str                 # 相对源文件夹的路径
+    mtime: int                # mtime_ns
+    size: int
+    shader: str
+    params: Dict[str, str]
+
+    @property
+    def name(self) -> str:
+        return clean_material_name(os.path.basename(self.path))
+
+    @property
+    def textures(self) -> List[str]:
+        return [self.params[key] for key in VMT_TEXTURE_PARAMS if key in self.params]
+
+
+class VMTIndex:
+    """VMT 材质库索引：递归扫描一次并解析参数，之后只重新解析修改时间或大小变化的文件
+
+    索引持久化到配置目录，所有 .blend 文件共享；按材质名、贴图名建立查找表。
+    """
+    FILE_VERSION = 1
+
+    def __init__(self):
+        self.root = None
+        self.records: Dict[str, VMTRecord] = {}
+        self.by_name: Dict[str, List[str]] = {}
+        self.by_texture: Dict[str, List[str]] = {}
+        self._store = None
+
+    @staticmethod
+    def get_path() -> str:
+        directory = bpy.utils.user_resource('CONFIG', path="mq_tools", create=True)
+        return os.path.join(directory, "vmt_index.json")
+
+    def _load_store(self) -> dict:
+        if self._store is None:
+            self._store = {}
+            try:
+                with open(self.get_path(), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == self.FILE_VERSION:
+                    self._store = data.get("roots", {})
+            except (OSError, ValueError):
+                pass
+        return self._store
+
+    def _save_store(self) -> None:
+        path = self.get_path()
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.FILE_VERSION, "roots": self._store}, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"保存VMT索引失败: {e}")
+
+    @staticmethod
+    def _scan(root: str):
+        """os.scandir 递归遍历，产出 (相对路径, stat)"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith('.vmt'):
+                            yield os.path.relpath(entry.path, root), entry.stat()
+            except OSError as e:
+                print(f"扫描文件夹失败: {directory}: {e}")
+
+    def refresh(self, root: str) -> dict:
+        """同步索引与磁盘，返回 {"total", "parsed", "removed", "seconds"}"""
+        start = time.perf_counter()
+        root = os.path.normpath(root)
+        store = self._load_store()
+        rebuild = root != self.root
+        if rebuild:
+            self.root = root
+            self.records = {rel: VMTRecord(rel, *values) for rel, values in store.get(root, {}).items()}
+        parsed = 0
+        seen = set()
+        for rel, stat in self._scan(root):
+            seen.add(rel)
+            record = self.records.get(rel)
+            if record is not None and record.mtime == stat.st_mtime_ns and record.size == stat.st_size:
+                continue
+            try:
+                with open(os.path.join(root, rel), 'r', encoding='utf-8', errors='replace') as f:
+                    shader, params = parse_vmt(f.read())
+            except OSError as e:
+                print(f"读取VMT失败: {rel}: {e}")
+                continue
+            self.records[rel] = VMTRecord(rel, stat.st_mtime_ns, stat.st_size, shader, params)
+            parsed += 1
+        removed = [rel for rel in self.records if rel not in seen]
+        for rel in removed:
+            del self.records[rel]
+        if rebuild or parsed or removed:
+            self._build_lookups()
+        if parsed or removed or root not in store:
+            store[root] = {rel: [r.mtime, r.size, r.shader, r.params] for rel, r in self.records.items()}
+            self._save_store()
+        return {"total": len(self.records), "parsed": parsed, "removed": len(removed),
+                "seconds": time.perf_counter() - start}
+
+    def _build_lookups(self) -> None:
+        self.by_name, self.by_texture = {}, {}
+        for rel, record in self.records.items():
+            self.by_name.setdefault(record.name, []).append(rel)
+            for texture in record.textures:
+                self.by_texture.setdefault(vmt_texture_key(texture), []).append(rel)
+
+    def absolute(self, rel: str) -> str:
+        return os.path.join(self.root, rel)
+
+    def match_name(self, material_name: str) -> Optional[VMTRecord]:
+        rels = self.by_name.get(clean_material_name(material_name))
+        return self.records[rels[0]] if rels else None
+
+    def match_textures(self, texture_names) -> Optional[VMTRecord]:
+        """按贴图匹配：VMT 中引用同名贴图最多的那个"""
+        votes = Counter()
+        for texture in texture_names:
+            votes.update(self.by_texture.get(vmt_texture_key(texture), ()))
+        if not votes:
+            return None
+        return self.records[votes.most_common(1)[0][0]]
+
+    def match_fuzzy(self, material_name: str, cutoff: float = 0.8) -> Optional[VMTRecord]:
+        close = difflib.get_close_matches(clean_material_name(material_name), list(self.by_name), n=1, cutoff=cutoff)
+        return self.records[self.by_name[close[0]][0]] if close else None
+
+vmt_index = VMTIndex()
+
+def material_texture_names(mat) -> List[str]:
+    """材质节点树中图像的文件名（用于按贴图匹配 VMT）"""
+    names = []
+    if mat.use_nodes and mat.node_tree:
+        for node in mat.node_tree.nodes:
+            if node.type == 'TEX_IMAGE' and node.image is not None:
+                names.append(node.image.filepath or node.image.name)
+    return names
+
+def vmt_texture_dir_from_target(target_path: str) -> str:
+    """目标文件夹在 materials 目录下的相对路径（VMT 中贴图路径的写法），不在 materials 下时返回空"""
+    parts = os.path.normpath(target_path).replace("\\", "/").split("/")
+    lowered = [part.lower() for part in parts]
+    if "materials" not in lowered:
+        return ""
+    index = len(lowered) - 1 - lowered[::-1].index("materials")
+    return "/".join(part for part in parts[index + 1:] if part)
+
+def rewrite_vmt_textures(text: str, params, texture_dir: str, mode: str, source_name: str, target_name: str) -> tuple:
+    """把贴图参数改写到目标材质目录，返回 (新文本, 改写数量)
+
+    BASENAME：目标目录 + 原贴图文件名；MATERIAL：同时把文件名中的源材质名替换为目标材质名。
+    """
+    if mode == 'NONE' or not texture_dir:
+        return text, 0
+    keys = {param.lower() for param in params}
+    if not keys:
+        return text, 0
+    texture_dir = texture_dir.strip("/\\").replace("\\", "/")
+    source_name = source_name.lower()
+    # 与 parse_vmt 相同的分词方式，只改写顶层（depth 1）参数的值，保留其余原文
+    pieces = []
+    last = 0
+    count = 0
+    depth = 0
+    pending_key = None
+    for match in _VMT_TOKEN_RE.finditer(text):
+        quoted, comment, brace, bare = match.groups()
+        if comment:
+            continue
+        if brace == "{":
+            depth += 1
+            pending_key = None
+            continue
+        if brace == "}":
+            depth -= 1
+            pending_key = None
+            continue
+        if depth != 1:
+            continue
+        token = quoted if quoted is not None else bare
+        if pending_key is None:
+            pending_key = token.lower()
+            continue
+        # 空值（以及只有目录没有文件名的值）不是有效的贴图引用，保持原样
+        basename = token.strip().replace("\\", "/").rsplit("/", 1)[-1]
+        if pending_key in keys and basename:
+            if mode == 'MATERIAL' and source_name:
+                basename = re.sub(re.escape(source_name), lambda _: target_name, basename, flags=re.IGNORECASE)
+            pieces.append(text[last:match.start()])
+            pieces.append(f'"{texture_dir}/{basename}"')
+            last = match.end()
+            count += 1
+        pending_key = None
+    pieces.append(text[last:])
+    return "".join(pieces), count
+
+@dataclass
+class VMTCopyResult:
+    name: str
+    target: str
+    status: str          # WRITTEN / UNCHANGED / ERROR
+    rewritten: int = 0
+    message: str = ""
+
+def _write_vmt_if_changed(name: str, target: str, data: bytes, rewritten: int) -> VMTCopyResult:
+    """内容与目标文件相同（哈希比较）时不写入，保留修改时间"""
+    try:
+        if os.path.exists(target) and os.path.getsize(target) == len(data):
+            with open(target, 'rb') as f:
+                if hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest():
+                    return VMTCopyResult(name, target, 'UNCHANGED', rewritten)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+        return VMTCopyResult(name, target, 'WRITTEN', rewritten)
+    except OSError as e:
+        return VMTCopyResult(name, target, 'ERROR', rewritten, str(e))
+
+def copy_vmts(jobs, texture_dir: str, mode: str, params, max_workers: int = 8) -> List[VMTCopyResult]:
+    """jobs 为 [(目标材质名, 源VMT, 目标VMT)]：源文件只读取一次，改写后在线程池中并行写出
+
+    源文件按字节读取，用 surrogateescape 无损解码（GBK、Latin-1 等非 UTF-8 注释原样保留），
+    没有改写任何参数时直接写出原始字节。
+    """
+    sources = {}
+    results = []
+    pending = []
+    for name, source, target in jobs:
+        if source not in sources:
+            try:
+                with open(source, 'rb') as f:
+                    sources[source] = f.read()
+            except OSError as e:
+                sources[source] = e
+        data = sources[source]
+        if isinstance(data, OSError):
+            results.append(VMTCopyResult(name, target, 'ERROR', message=f"读取源文件失败: {data}"))
+            continue
+        source_name = clean_material_name(os.path.basename(source))
+        new_text, rewritten = rewrite_vmt_textures(data.decode('utf-8', errors='surrogateescape'),
+                                                   params, texture_dir, mode, source_name, name)
+        if rewritten:
+            data = new_text.encode('utf-8', errors='surrogateescape')
+        pending.append((name, target, data, rewritten))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results.extend(pool.map(lambda job: _write_vmt_if_changed(*job), pending))
+    return results
+
+vmt_copy_results: List[VMTCopyResult] = []
+
 class MaterialGroupItem(PropertyGroup):
     is_selected: BoolProperty(
         name="选择",
@@ -1766,6 +5160,10 @@ class MaterialGroupItem(PropertyGroup):
         description="选择源VMT文件",
         subtype='FILE_PATH'
     )
+    match_kind: StringProperty(
+        name="匹配方式",
+        description="自动建议源VMT时使用的匹配方式（贴图/名称），手动指定时为空"
+    )
 
 class VMT_OT_RefreshList(Operator):
     bl_idname = "vmt.refresh_list"
@@ -1802,110 +5200,83 @@ class VMT_OT_RefreshList(Operator):
     
     def execute(self, context):
         scene = context.scene
-        log_lines = []  # 用于收集日志信息
+        # 只有启用日志时才收集逐材质的明细，控制台只输出汇总
+        log_lines = [] if scene.vmt_enable_logging else None
         
         # 清除现有列表
         scene.material_groups.clear()
-        log_lines.append("开始刷新材质列表...")
         
         if not scene.source_vmt_path:
             error_msg = "请先选择源VMT文件夹"
-            log_lines.append(f"错误: {error_msg}")
-            self.write_log(scene, log_lines)
+            if log_lines is not None:
+                log_lines.append(f"错误: {error_msg}")
+                self.write_log(scene, log_lines)
             self.report({'ERROR'}, error_msg)
             return {'CANCELLED'}
         
-        log_lines.append(f"源VMT文件夹: {scene.source_vmt_path}")
-        
-        # 获取源文件夹中的材质名称
-        source_materials = set()
-        vmt_files_found = []
-        
         # 将Blender的相对路径转换为绝对路径
         source_path = bpy.path.abspath(scene.source_vmt_path)
-        log_lines.append(f"原始路径: {scene.source_vmt_path}")
-        log_lines.append(f"转换后绝对路径: {source_path}")
-        
-        if os.path.exists(source_path):
-            log_lines.append(f"正在扫描源文件夹: {source_path}")
-            for f in os.listdir(source_path):
-                if f.endswith('.vmt'):
-                    vmt_files_found.append(f)
-                    base_name = clean_material_name(f)
-                    source_materials.add(base_name)
-                    log_lines.append(f"找到源材质: {f} -> 清理后: {base_name}")
-                    print(f"Found source material: {f} -> cleaned: {base_name}")
-        else:
+        if not os.path.isdir(source_path):
             error_msg = f"源文件夹不存在: {source_path} (原始路径: {scene.source_vmt_path})"
-            log_lines.append(f"错误: {error_msg}")
-            self.write_log(scene, log_lines)
+            if log_lines is not None:
+                log_lines.append(f"错误: {error_msg}")
+                self.write_log(scene, log_lines)
             self.report({'ERROR'}, error_msg)
             return {'CANCELLED'}
         
-        log_lines.append(f"\n在源文件夹中找到 {len(vmt_files_found)} 个VMT文件")
-        log_lines.append(f"源材质清理后名称集合: {sorted(source_materials)}\n")
-        
-        # 报告找到的VMT文件数量
-        self.report({'INFO'}, f"在源文件夹中找到 {len(vmt_files_found)} 个VMT文件")
+        # 增量刷新索引：只解析新增或修改过的VMT
+        stats = vmt_index.refresh(source_path)
+        print(f"VMT索引: {stats['total']} 个文件，重新解析 {stats['parsed']} 个，移除 {stats['removed']} 个，用时 {stats['seconds']:.2f} 秒")
+        if log_lines is not None:
+            log_lines.append(f"源VMT文件夹: {source_path}")
+            log_lines.append(f"索引中共 {stats['total']} 个VMT，本次重新解析 {stats['parsed']} 个，移除 {stats['removed']} 个\n")
         
         # 添加场景中的所有不同名材质到列表
         excluded_keywords = {'点笔划', '点', '笔划', 'stroke', 'dot'}  # 添加更多需要排除的关键词
-        matched_materials = []
-        unmatched_materials = []
-        
-        log_lines.append("开始检查场景中的材质...")
-        log_lines.append(f"排除关键词: {excluded_keywords}\n")
+        auto_match = scene.vmt_auto_match
+        matched_count = 0
+        suggested_count = 0
         
         for mat in bpy.data.materials:
             # 检查材质名称是否包含任何需要排除的关键词
-            should_exclude = any(keyword.lower() in mat.name.lower() for keyword in excluded_keywords)
-            if not mat.name.startswith('.') and not should_exclude:
-                clean_name = clean_material_name(mat.name)
-                log_lines.append(f"检查材质: {mat.name} (清理后: {clean_name})")
-                print(f"Checking material: {mat.name} (cleaned: {clean_name})")
-                
-                # 详细检查匹配过程
-                if clean_name in source_materials:
-                    matched_materials.append(mat.name)
-                    log_lines.append(f"  -> 已匹配: {mat.name} -> {clean_name}")
-                    print(f"MATCHED: {mat.name} -> {clean_name}")
-                else:
-                    unmatched_materials.append(mat.name)
-                    item = scene.material_groups.add()
-                    item.name = mat.name
-                    item.is_selected = False
-                    log_lines.append(f"  -> 未匹配: {mat.name} -> {clean_name} (添加到待处理列表)")
-                    print(f"UNMATCHED: {mat.name} -> {clean_name} (添加到待处理列表)")
-            else:
-                if mat.name.startswith('.'):
-                    log_lines.append(f"跳过隐藏材质: {mat.name}")
-                elif should_exclude:
-                    log_lines.append(f"跳过排除材质: {mat.name} (包含排除关键词)")
-        
-        # 详细报告匹配结果
-        log_lines.append(f"\n=== 匹配结果统计 ===")
-        log_lines.append(f"已匹配的材质 ({len(matched_materials)}个):")
-        for mat in matched_materials:
-            log_lines.append(f"  - {mat}")
-        
-        log_lines.append(f"\n未匹配的材质 ({len(unmatched_materials)}个):")
-        for mat in unmatched_materials:
-            log_lines.append(f"  - {mat}")
-        
-        if matched_materials:
-            print(f"已匹配的材质 ({len(matched_materials)}个): {matched_materials}")
-        if unmatched_materials:
-            print(f"未匹配的材质 ({len(unmatched_materials)}个): {unmatched_materials}")
-        
-
-        
-        # 写入日志文件
-        self.write_log(scene, log_lines)
+            if mat.name.startswith('.') or any(keyword.lower() in mat.name.lower() for keyword in excluded_keywords):
+                continue
+            
+            # 源库中已有同名VMT，不需要处理
+            record = vmt_index.match_name(mat.name)
+            if record is not None:
+                matched_count += 1
+                if log_lines is not None:
+                    log_lines.append(f"已匹配: {mat.name} -> {record.path}")
+                continue
+            
+            item = scene.material_groups.add()
+            item.name = mat.name
+            item.is_selected = False
+            if auto_match:
+                # 先按贴图匹配，再按名称模糊匹配，作为建议的源材质
+                kind = "贴图"
+                record = vmt_index.match_textures(material_texture_names(mat))
+                if record is None:
+                    kind = "名称"
+                    record = vmt_index.match_fuzzy(mat.name)
+                if record is not None:
+                    item.source_vmt = os.path.normpath(vmt_index.absolute(record.path))
+                    item.match_kind = kind
+                    suggested_count += 1
+            if log_lines is not None:
+                suggestion = f" (建议[{item.match_kind}]: {os.path.basename(item.source_vmt)})" if item.source_vmt else ""
+                log_lines.append(f"未匹配: {mat.name}{suggestion}")
+        
+        if log_lines is not None:
+            log_lines.append(f"\n=== 匹配结果统计 ===")
+            log_lines.append(f"已匹配 {matched_count} 个，待处理 {len(scene.material_groups)} 个，其中自动建议 {suggested_count} 个")
+            self.write_log(scene, log_lines)
         
         if len(scene.material_groups) == 0:
-            self.report({'INFO'}, "没有需要处理的新材质")
+            self.report({'INFO'}, f"索引 {stats['total']} 个VMT，没有需要处理的新材质")
         else:
-            self.report({'INFO'}, f"找到 {len(scene.material_groups)} 个需要处理的材质")
+            self.report({'INFO'}, f"索引 {stats['total']} 个VMT，找到 {len(scene.material_groups)} 个需要处理的材质（自动建议 {suggested_count} 个）")
         
         return {'FINISHED'}
 
@@ -1937,6 +5308,7 @@ class VMT_OT_AssignSource(Operator):
         for item in context.scene.material_groups:
             if item.is_selected:
                 item.source_vmt = abs_filepath
+                item.match_kind = ""
                 item.is_selected = False  # 自动取消选择已指定的材质
         
         return {'FINISHED'}
@@ -1968,26 +5340,40 @@ class VMT_OT_CopyMaterials(Operator):
             self.report({'ERROR'}, f"创建目标路径失败: {str(e)}")
             return {'CANCELLED'}
         
-        # 复制材质文件
-        copied_count = 0
+        # 收集复制任务（自动建议的源材质需要先确认）
+        jobs = []
+        unconfirmed = 0
         for item in scene.material_groups:
-            if item.source_vmt:
+            if item.source_vmt and item.match_kind:
+                unconfirmed += 1
+            elif item.source_vmt:
                 # 将源文件路径转换为绝对路径
-                source_path = bpy.path.abspath(item.source_vmt)
-                source_path = os.path.normpath(source_path)
-                
+                source_path = os.path.normpath(bpy.path.abspath(item.source_vmt))
                 if os.path.exists(source_path):
-                    # 构建目标文件路径
-                    target_file = os.path.join(target_path, f"{clean_material_name(item.name)}.vmt")
-                    try:
-                        shutil.copy2(source_path, target_file)
-                        copied_count += 1
-                    except Exception as e:
-                        self.report({'WARNING'}, f"复制材质 {item.name} 时出错: {str(e)}")
+                    name = clean_material_name(item.name)
+                    jobs.append((name, source_path, os.path.join(target_path, f"{name}.vmt")))
                 else:
                     self.report({'WARNING'}, f"源文件不存在: {item.source_vmt} -> {source_path}")
+        if unconfirmed:
+            self.report({'WARNING'}, f"跳过 {unconfirmed} 个未确认的自动建议，请先确认或重新指定源材质")
+        if not jobs:
+            self.report({'WARNING'}, "没有已指定源材质的材质")
+            return {'CANCELLED'}
         
-        self.report({'INFO'}, f"成功复制 {copied_count} 个材质文件")
+        texture_dir = scene.vmt_texture_dir.strip() or vmt_texture_dir_from_target(target_path)
+        if scene.vmt_rewrite_mode != 'NONE' and not texture_dir:
+            self.report({'WARNING'}, "目标路径不在 materials 目录下，且未设置贴图目录，贴图路径不会被改写")
+        params = [param.strip().lower() for param in scene.vmt_rewrite_params.split(",") if param.strip()]
+        results = copy_vmts(jobs, texture_dir, scene.vmt_rewrite_mode, params, scene.vmt_copy_workers)
+        vmt_copy_results[:] = results
+        
+        counts = Counter(result.status for result in results)
+        for result in results:
+            detail = f"，改写 {result.rewritten} 个贴图路径" if result.rewritten else ""
+            print(f"[{result.status}] {result.name} -> {result.target}{detail} {result.message}")
+            if result.status == 'ERROR':
+                self.report({'WARNING'}, f"复制材质 {result.name} 时出错: {result.message}")
+        self.report({'INFO'}, f"写入 {counts['WRITTEN']} 个，内容相同跳过 {counts['UNCHANGED']} 个，失败 {counts['ERROR']} 个材质文件")
         return {'FINISHED'}
 
 class VMT_OT_SelectAll(Operator):
@@ -2000,6 +5386,19 @@ class VMT_OT_SelectAll(Operator):
                 item.is_selected = True
         return {'FINISHED'}
 
+class VMT_OT_ConfirmSuggestion(Operator):
+    bl_idname = "vmt.confirm_suggestion"
+    bl_label = "确认建议"
+    bl_description = "确认自动建议的源材质，确认后才会被复制"
+    index: IntProperty(default=-1, options={'SKIP_SAVE'})
+    
+    def execute(self, context):
+        items = context.scene.material_groups
+        targets = [items[self.index]] if 0 <= self.index < len(items) else list(items)
+        for item in targets:
+            item.match_kind = ""
+        return {'FINISHED'}
+
 class VMT_OT_DeselectAll(Operator):
     bl_idname = "vmt.deselect_all"
     bl_label = "取消全选"
@@ -2042,6 +5441,29 @@ class MQT_PT_SeparatorPanel(Panel):
         main_col = layout.column(align=True)
         main_col.prop(settings, "uma_musume_mode")
         main_col.operator(QSEPARATOR_OT_QuickSeparate.bl_idname, icon='MOD_EXPLODE')
+
+        # 导出前检查
+        limit_box = layout.box()
+        limit_box.label(text="导出前检查:", icon='CHECKMARK')
+        limit_box.prop(settings, "limit_split_mode")
+        row = limit_box.row(align=True)
+        row.operator(QSEPARATOR_OT_AnalyzeSourceLimits.bl_idname, icon='VIEWZOOM')
+        split_row = row.row(align=True)
+        split_row.enabled = settings.limit_split_mode != 'NONE'
+        split_row.operator(QSEPARATOR_OT_AnalyzeSourceLimits.bl_idname, text="检查并拆分", icon='MOD_EXPLODE').auto_split = True
+        if source_limit_report is not None:
+            report = source_limit_report
+            limit_box.label(text=f"{len(report.models)} 个子模型，用时 {report.elapsed:.2f} 秒")
+            for model_name, verts, bone_count, material_count in report.models[:8]:
+                row = limit_box.row()
+                row.alert = verts > SOURCE_LIMITS["verts_per_model"]
+                row.label(text=model_name)
+                row.label(text=f"顶点 {verts}  骨骼 {bone_count}  材质 {material_count}")
+            for issue in report.issues[:8]:
+                limit_box.label(text=f"{issue.scope}: {issue.message}",
+                                icon='ERROR' if issue.severity == 'ERROR' else 'INFO')
+            if len(report.issues) > 8:
+                limit_box.label(text=f"…另有 {len(report.issues) - 8} 条，详见控制台")
         
         # 材质工具区
         material_box = layout.box()
@@ -2067,12 +5489,9 @@ class MQT_PT_SeparatorPanel(Panel):
             # 控制按钮
             ctrl_row = blank_ctrl_box.row(align=True)
             
-            # 检查是否还有可选择的材质
-            available_materials = [mat for mat in bpy.data.materials 
-                                 if mat not in {item.material for item in settings.material_blank_controls if item.material}]
-            
+            # 检查是否还有可选择的材质（缓存）
             add_row = ctrl_row.row()
-            add_row.enabled = bool(available_materials)
+            add_row.enabled = has_available_materials(settings.material_blank_controls, "material_blank_controls")
             add_row.operator(QSEPARATOR_OT_AddBlankControlItem.bl_idname, text="添加", icon='ADD')
             
             ctrl_row.operator(QSEPARATOR_OT_RemoveBlankControlItem.bl_idname, text="移除", icon='REMOVE')
@@ -2098,6 +5517,20 @@ class MQT_PT_SeparatorPanel(Panel):
         config_box.operator(QSEPARATOR_OT_CopyText.bl_idname, 
                           text="生成QC配置", 
                           icon='TEXT')
+        qc_file_row = config_box.row(align=True)
+        qc_file_row.prop(settings, "qc_output_path", text="")
+        qc_file_row.prop(settings, "qc_copy_to_clipboard", text="", icon='COPYDOWN')
+        qc_file_row.operator(QSEPARATOR_OT_WriteQCFile.bl_idname, text="", icon='FILE_TICK')
+        if settings.export_mode in {'SMD', 'DMX'}:
+            model_row = config_box.row(align=True)
+            model_row.prop(settings, "model_export_dir", text="")
+            export_op = QSEPARATOR_OT_ExportSMD if settings.export_mode == 'SMD' else QSEPARATOR_OT_ExportDMX
+            model_row.operator(export_op.bl_idname, text="", icon='EXPORT')
+            flex_row = config_box.row(align=True)
+            flex_row.prop(settings, "export_flex")
+            sub = flex_row.row(align=True)
+            sub.enabled = settings.export_flex
+            sub.prop(settings, "flex_tolerance", text="容差")
         config_box.operator(QSEPARATOR_OT_CopyDefineVariable.bl_idname, 
                           text="复制DefineVariable", 
                           icon='COPYDOWN')
@@ -2109,14 +5542,9 @@ class MQT_PT_SeparatorPanel(Panel):
         # 列表控制按钮
         ctrl_row = ex_box.row(align=True)
         
-        # 检查是否还有可选择的对象
-        available_objects = [obj for obj in context.scene.objects 
-                           if obj.type == 'MESH' and 
-                           obj not in {item.target for item in settings.excluded_items if item.target}]
-        
-        # 使用子行来控制启用状态
+        # 使用子行来控制启用状态（是否还有可选择的对象，缓存）
         add_row = ctrl_row.row()
-        add_row.enabled = bool(available_objects)
+        add_row.enabled = has_available_mesh_objects(context, settings.excluded_items)
         add_row.operator(QSEPARATOR_OT_AddSearchItem.bl_idname, icon='ADD')
         
         ctrl_row.operator(QSEPARATOR_OT_RemoveSearchItem.bl_idname, icon='REMOVE')
@@ -2150,20 +5578,37 @@ class MQT_PT_SeparatorPanel(Panel):
         # 仅在选择了需要API的翻译模式时显示API密钥输入框
         if settings.translate_mode != 'NONE':
             translate_box.prop(settings, "api_key")
+            translate_box.prop(settings, "api_endpoint")
+            translate_box.prop(settings, "api_model")
+            net_row = translate_box.row(align=True)
+            net_row.prop(settings, "api_timeout")
+            net_row.prop(settings, "api_max_retries")
+            net_row.prop(settings, "api_concurrency")
+            if translation_job.running:
+                factor = translation_job.done / translation_job.total if translation_job.total else 0.0
+                translate_box.progress(factor=factor, type='BAR',
+                                       text=f"后台翻译中 {translation_job.done}/{translation_job.total}")
+            elif translation_client.is_open():
+                translate_box.label(text="翻译接口连续失败，暂时使用原始名称", icon='ERROR')
+            glossary_row = translate_box.row(align=True)
+            glossary_row.prop(settings, "use_glossary")
+            glossary_row.operator(QSEPARATOR_OT_AddGlossaryTerm.bl_idname, icon='ADD')
+            cache_row = translate_box.row(align=True)
+            cache_row.prop(settings, "use_translation_cache")
+            cache_row.prop(settings, "translation_cache_ttl_days")
+            cache_row = translate_box.row(align=True)
+            cache_row.operator(QSEPARATOR_OT_SetTranslationOverride.bl_idname, icon='GREASEPENCIL')
+            cache_row.operator(QSEPARATOR_OT_ClearTranslationCache.bl_idname, icon='TRASH')
 
         # 材质排除列表
         mat_box = layout.box()
         mat_box.label(text="材质排除列表:", icon='MATERIAL')
         mat_box.prop(settings, "affect_materials", text="应用材质排除")
         
-        # 检查是否还有可选择的材质
-        available_materials = [mat for mat in bpy.data.materials 
-                             if mat not in {item.material for item in settings.excluded_materials if item.material}]
-        
-        # 材质列表控制按钮
+        # 材质列表控制按钮（是否还有可选择的材质，缓存）
         mat_row = mat_box.row(align=True)
         add_mat_row = mat_row.row()
-        add_mat_row.enabled = bool(available_materials)
+        add_mat_row.enabled = has_available_materials(settings.excluded_materials, "excluded_materials")
         add_mat_row.operator(QSEPARATOR_OT_AddMaterialItem.bl_idname, icon='ADD')
         
         mat_row.operator(QSEPARATOR_OT_RemoveMaterialItem.bl_idname, icon='REMOVE')
@@ -2275,6 +5720,10 @@ class MQT_PT_OutlinePanel(Panel):
 
         # 描边大小输入框
         layout.prop(scene, "outline_size", text="描边大小 (米)")
+        layout.prop(scene, "outline_thickness_group", text="厚度顶点组")
+
+        # 描边方式
+        layout.prop(scene, "outline_method", text="描边方式")
 
         # 描边模式选择
         layout.prop(scene, "outline_mode", text="描边放置模式")
@@ -2302,9 +5751,18 @@ class MQT_PT_OutlinePanel(Panel):
         row = layout.row()
         row.operator("outline.delete_all", text="删除所有描边")
 
+        # 非破坏描边：导出前烘焙 / 导出后恢复
+        if scene.outline_method == 'MODIFIER':
+            row = layout.row(align=True)
+            row.operator("outline.bake_modifiers", icon='MOD_SOLIDIFY')
+            row.operator("outline.restore_modifiers", icon='LOOP_BACK')
+
         # 复制描边模型文本按钮
         row = layout.row()
         row.operator("outline.copy_smd", text="复制描边模型文本")
+        row = layout.row(align=True)
+        row.prop(context.scene.qseparator_settings, "model_export_dir", text="")
+        row.operator("outline.export_smd", text="", icon='EXPORT')
 
 # --------------------------------------------------------------------------
 # 工具 4: 清除骨骼自定义形状面板
@@ -2350,6 +5808,7 @@ class MQT_PT_VMTPanel(Panel):
         box.label(text="路径设置:")
         box.prop(scene, "source_vmt_path", text="源VMT文件夹")
         box.prop(scene, "target_vmt_path", text="目标VMT路径")
+        box.prop(scene, "vmt_auto_match", text="按贴图/相似名称自动建议源材质")
         
         # 日志设置
         log_box = layout.box()
@@ -2382,17 +5841,44 @@ class MQT_PT_VMTPanel(Panel):
             # 已指定源材质的材质列表
             box = layout.box()
             box.label(text="已指定材质:")
-            for item in scene.material_groups:
+            for index, item in enumerate(scene.material_groups):
                 if item.source_vmt:  # 显示已指定源材质的材质
                     row = box.row()
                     row.label(text=item.name)
                     row.label(text=os.path.basename(item.source_vmt))
+                    if item.match_kind:
+                        row.label(text=f"建议:{item.match_kind}", icon='QUESTION')
+                        row.operator("vmt.confirm_suggestion", text="", icon='CHECKMARK').index = index
+            if any(item.source_vmt and item.match_kind for item in scene.material_groups):
+                box.operator("vmt.confirm_suggestion", text="确认全部建议", icon='CHECKMARK').index = -1
             
             # 源材质指定和复制按钮
             row = layout.row()
             row.operator("vmt.assign_source", text="指定源材质")
             row.operator("vmt.copy_materials", text="复制材质")
         
+        # 贴图路径改写
+        box = layout.box()
+        box.label(text="贴图路径改写:")
+        box.prop(scene, "vmt_rewrite_mode", text="方式")
+        if scene.vmt_rewrite_mode != 'NONE':
+            box.prop(scene, "vmt_texture_dir", text="贴图目录")
+            box.prop(scene, "vmt_rewrite_params", text="参数")
+        box.prop(scene, "vmt_copy_workers", text="并行写入数")
+        
+        # 上次复制结果
+        if vmt_copy_results:
+            box = layout.box()
+            counts = Counter(result.status for result in vmt_copy_results)
+            box.label(text=f"上次复制: 写入 {counts['WRITTEN']}，跳过 {counts['UNCHANGED']}，失败 {counts['ERROR']}", icon='INFO')
+            # 失败的排在前面，最多显示 20 条（完整结果见控制台）
+            shown = sorted(vmt_copy_results, key=lambda result: result.status != 'ERROR')[:20]
+            for result in shown:
+                icon = {'WRITTEN': 'CHECKMARK', 'UNCHANGED': 'DOT', 'ERROR': 'ERROR'}[result.status]
+                row = box.row()
+                row.label(text=os.path.basename(result.target), icon=icon)
+                row.label(text=result.message or (f"改写 {result.rewritten}" if result.rewritten else ""))
+        
         # 使用说明
         box = layout.box()
         box.label(text="使用说明:", icon='INFO')
@@ -2430,8 +5916,24 @@ class BoneCaptureSettings(PropertyGroup):
         description="在每条记录前添加时间戳",
         default=True
     )
+    throttle_interval: FloatProperty(
+        name="检查间隔",
+        description="骨架变更合并检查的最短间隔（秒），间隔内的多次更新只检查一次",
+        default=0.5,
+        min=0.05,
+        max=5.0
+    )
 
 _bone_capture_snapshot: Dict[str, Set[str]] = {}
+# 骨架的轻量签名 {骨架对象名: (骨骼数量, 名称哈希)}，签名不变时跳过完整比对
+_bone_capture_signatures: Dict[str, tuple] = {}
+# 骨架数据名 -> 使用它的骨架对象名，用于把 Armature 数据的更新映射到对象
+_bone_capture_data_users: Dict[str, Set[str]] = defaultdict(set)
+# 等待检查的骨架对象名；_bone_capture_rescan 表示需要重新扫描骨架对象的增删
+_bone_capture_dirty: Set[str] = set()
+_bone_capture_rescan: bool = False
+_bone_capture_object_count: int = 0
+_bone_capture_timer_pending: bool = False
 _bone_capture_handler_registered: bool = False
 
 
@@ -2452,15 +5954,10 @@ def _write_capture_line(context, line: str):
     path = _get_capture_full_path(context)
     if not path:
         return
-    os.makedirs(os.path.dirname(path), exist_ok=True)
     ts_prefix = ""
     if s.include_timestamp:
         ts_prefix = f"[{datetime.datetime.now().isoformat(timespec='seconds')}] "
-    try:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(ts_prefix + line + "\n")
-    except Exception as e:
-        print(f"BoneCapture write error: {e}")
+    log_writer.write(path, ts_prefix + line)
 
 
 def log_bone_operation(context, op: str, details: str):
@@ -2470,6 +5967,11 @@ def log_bone_operation(context, op: str, details: str):
     _write_capture_line(context, f"{op}: {details}")
 
 
+def _armature_signature(obj) -> tuple:
+    bones = obj.data.bones
+    return (len(bones), hash(tuple(b.name for b in bones)))
+
+
 def _snapshot_armatures() -> Dict[str, Set[str]]:
     snap: Dict[str, Set[str]] = {}
     for obj in bpy.data.objects:
@@ -2482,6 +5984,23 @@ def _snapshot_armatures() -> Dict[str, Set[str]]:
     return snap
 
 
+def _reset_bone_capture_state():
+    global _bone_capture_snapshot, _bone_capture_rescan, _bone_capture_object_count
+    _bone_capture_snapshot = _snapshot_armatures()
+    _bone_capture_signatures.clear()
+    _bone_capture_data_users.clear()
+    for name in _bone_capture_snapshot:
+        obj = bpy.data.objects[name]
+        _bone_capture_data_users[obj.data.name].add(name)
+        try:
+            _bone_capture_signatures[name] = _armature_signature(obj)
+        except Exception:
+            pass
+    _bone_capture_dirty.clear()
+    _bone_capture_rescan = False
+    _bone_capture_object_count = len(bpy.data.objects)
+
+
 def _diff_and_log(context, before: Dict[str, Set[str]], after: Dict[str, Set[str]]):
     for arm_name in after.keys() | before.keys():
         bset = before.get(arm_name, set())
@@ -2494,15 +6013,82 @@ def _diff_and_log(context, before: Dict[str, Set[str]], after: Dict[str, Set[str
             log_bone_operation(context, "BoneAdded", f"{arm_name}.{bn}")
 
 
-def bone_capture_handler(scene):
+def _process_bone_capture_dirty():
+    """节流后的检查：只处理被标记的骨架，签名相同则跳过完整比对"""
+    global _bone_capture_timer_pending, _bone_capture_rescan
+    _bone_capture_timer_pending = False
+    context = bpy.context
+    s = getattr(context.scene, "bone_capture_settings", None)
+    if not s or not s.capture_enabled:
+        _bone_capture_dirty.clear()
+        return None
+
+    names = set(_bone_capture_dirty)
+    _bone_capture_dirty.clear()
+    if _bone_capture_rescan:
+        # 骨架对象可能被新增或删除
+        names |= {o.name for o in bpy.data.objects if o.type == 'ARMATURE'}
+        names |= set(_bone_capture_snapshot)
+        _bone_capture_rescan = False
+
+    before: Dict[str, Set[str]] = {}
+    after: Dict[str, Set[str]] = {}
+    for name in names:
+        obj = bpy.data.objects.get(name)
+        if obj is None or obj.type != 'ARMATURE':
+            if name in _bone_capture_snapshot:
+                before[name] = _bone_capture_snapshot.pop(name)
+                after[name] = set()
+                _bone_capture_signatures.pop(name, None)
+            continue
+        _bone_capture_data_users[obj.data.name].add(name)
+        try:
+            signature = _armature_signature(obj)
+        except Exception:
+            continue
+        if _bone_capture_signatures.get(name) == signature:
+            continue
+        _bone_capture_signatures[name] = signature
+        before[name] = _bone_capture_snapshot.get(name, set())
+        after[name] = set(b.name for b in obj.data.bones)
+        _bone_capture_snapshot[name] = after[name]
+
+    if after:
+        _diff_and_log(context, before, after)
+        log_writer.flush()
+    return None
+
+
+def bone_capture_handler(scene, depsgraph=None):
     s = getattr(scene, "bone_capture_settings", None)
     if not s or not s.capture_enabled:
         return
-    global _bone_capture_snapshot
+    global _bone_capture_rescan, _bone_capture_timer_pending, _bone_capture_object_count
     try:
-        after = _snapshot_armatures()
-        _diff_and_log(bpy.context, _bone_capture_snapshot, after)
-        _bone_capture_snapshot = after
+        if depsgraph is None:
+            _bone_capture_rescan = True
+        else:
+            for update in depsgraph.updates:
+                id_data = update.id
+                if isinstance(id_data, bpy.types.Object):
+                    if id_data.type == 'ARMATURE':
+                        _bone_capture_dirty.add(id_data.original.name)
+                elif isinstance(id_data, bpy.types.Armature):
+                    users = _bone_capture_data_users.get(id_data.original.name)
+                    if users:
+                        _bone_capture_dirty.update(users)
+                    else:
+                        _bone_capture_rescan = True
+                elif isinstance(id_data, bpy.types.Collection):
+                    # 对象增删会更新集合
+                    _bone_capture_rescan = True
+            object_count = len(bpy.data.objects)
+            if object_count != _bone_capture_object_count:
+                _bone_capture_object_count = object_count
+                _bone_capture_rescan = True
+        if (_bone_capture_dirty or _bone_capture_rescan) and not _bone_capture_timer_pending:
+            _bone_capture_timer_pending = True
+            bpy.app.timers.register(_process_bone_capture_dirty, first_interval=s.throttle_interval)
     except Exception as e:
         print(f"BoneCapture handler error: {e}")
 
@@ -2518,8 +6104,8 @@ class BONECAPTURE_OT_Start(Operator):
             self.report({'ERROR'}, "捕捉设置未注册")
             return {'CANCELLED'}
         s.capture_enabled = True
-        global _bone_capture_snapshot, _bone_capture_handler_registered
-        _bone_capture_snapshot = _snapshot_armatures()
+        global _bone_capture_handler_registered
+        _reset_bone_capture_state()
         if not _bone_capture_handler_registered:
             bpy.app.handlers.depsgraph_update_post.append(bone_capture_handler)
             _bone_capture_handler_registered = True
@@ -2538,6 +6124,10 @@ class BONECAPTURE_OT_Stop(Operator):
         if not s:
             self.report({'ERROR'}, "捕捉设置未注册")
             return {'CANCELLED'}
+        # 写入尚未处理的变更
+        if bpy.app.timers.is_registered(_process_bone_capture_dirty):
+            bpy.app.timers.unregister(_process_bone_capture_dirty)
+        _process_bone_capture_dirty()
         s.capture_enabled = False
         global _bone_capture_handler_registered
         if _bone_capture_handler_registered:
@@ -2547,6 +6137,7 @@ class BONECAPTURE_OT_Stop(Operator):
                 pass
             _bone_capture_handler_registered = False
         _write_capture_line(context, "--- Bone capture stopped ---")
+        log_writer.flush(wait=True)
         self.report({'INFO'}, "骨骼捕捉已停止")
         return {'FINISHED'}
 
@@ -2566,6 +6157,7 @@ class MQT_PT_BoneCapturePanel(Panel):
         col.prop(s, "capture_dir")
         col.prop(s, "capture_filename")
         col.prop(s, "include_timestamp")
+        col.prop(s, "throttle_interval")
         row = layout.row(align=True)
         row.operator("bonecapture.start", text="开始捕捉", icon='REC')
         row.operator("bonecapture.stop", text="停止", icon='CANCEL')
@@ -2738,6 +6330,7 @@ class BONE_OT_merge_to_parent(Operator):
         # 返回姿态模式
         bpy.ops.object.mode_set(mode='POSE')
         
+        log_writer.flush()
         return {'FINISHED'}
 
 class BONE_OT_merge_to_active(Operator):
@@ -2824,6 +6417,7 @@ class BONE_OT_merge_to_active(Operator):
         # 返回姿态模式
         bpy.ops.object.mode_set(mode='POSE')
         
+        log_writer.flush()
         return {'FINISHED'}
 
 class BONE_OT_remove_zero_weight(Operator):
@@ -3227,12 +6821,424 @@ class BONE_OT_apply_pose_transform(Operator):
         self.report({'INFO'}, "已成功应用姿态变换")
         return {'FINISHED'}
 
+class BoneNameIndex:
+    """骨骼名称索引：小写名查找 + 父子关系模拟
+
+    在不进入编辑模式的情况下规划合并/删除，删除骨骼时子骨骼自动挂到其父级，
+    与 edit_bones.remove() 的行为一致。最终通过 commit_edit_bones() 一次性提交。
+    """
+
+    def __init__(self, armature):
+        self.parent: Dict[str, Optional[str]] = {}
+        self.children: Dict[str, List[str]] = defaultdict(list)
+        self.by_lower: Dict[str, str] = {}
+        self.removed: List[str] = []
+        for bone in armature.bones:
+            parent_name = bone.parent.name if bone.parent else None
+            self.parent[bone.name] = parent_name
+            if parent_name:
+                self.children[parent_name].append(bone.name)
+            self.by_lower.setdefault(bone.name.lower(), bone.name)
+
+    def __contains__(self, name):
+        return name in self.parent
+
+    def names(self):
+        return list(self.parent.keys())
+
+    def find(self, name_lower):
+        """按小写名称查找骨骼（不区分大小写）"""
+        name = self.by_lower.get(name_lower)
+        return name if name in self.parent else None
+
+    def siblings(self, name):
+        parent_name = self.parent.get(name)
+        if parent_name is None:
+            return [n for n, p in self.parent.items() if p is None and n != name]
+        return [n for n in self.children[parent_name] if n != name]
+
+    def final_parent(self, name, merging: Set[str]):
+        """沿父级链向上，返回第一个不在合并集合中的骨骼"""
+        current = self.parent.get(name)
+        while current is not None and current in merging:
+            current = self.parent.get(current)
+        return current
+
+    def remove(self, name):
+        parent_name = self.parent.pop(name)
+        kids = self.children.pop(name, [])
+        if parent_name is not None:
+            self.children[parent_name].remove(name)
+            self.children[parent_name].extend(kids)
+        for child in kids:
+            self.parent[child] = parent_name
+        self.removed.append(name)
+
+    def commit_edit_bones(self, armature):
+        """在一次编辑模式会话中删除所有已规划的骨骼并修正父级关系（需已处于编辑模式）"""
+        edit_bones = armature.edit_bones
+        removed_count = 0
+        for name in self.removed:
+            edit_bone = edit_bones.get(name)
+            if edit_bone is None:
+                continue
+            try:
+                edit_bones.remove(edit_bone)
+                removed_count += 1
+            except Exception as e_bone_remove:
+                print(f"      - 删除骨骼 {name} 时出错: {e_bone_remove}")
+        for name, parent_name in self.parent.items():
+            edit_bone = edit_bones.get(name)
+            if edit_bone is None:
+                continue
+            current = edit_bone.parent.name if edit_bone.parent else None
+            if current != parent_name:
+                edit_bone.use_connect = False
+                edit_bone.parent = edit_bones.get(parent_name) if parent_name else None
+        self.removed = []
+        return removed_count
+
+
+def fold_vertex_groups(mesh_objects, fold_map: Dict[str, str]):
+    """批量权重合并：把 fold_map 中每个源顶点组的权重累加到目标顶点组（上限 1.0），然后删除源顶点组
+
+    每个网格只遍历一次顶点影响数据，写入时按相同权重值分批调用 VertexGroup.add。
+    fold_map 中的链式映射 (a->b, b->c) 会先解析为最终目标。
+    """
+    resolved = {}
+    for src in fold_map:
+        dst, seen = fold_map[src], {src}
+        while dst in fold_map and dst not in seen:
+            seen.add(dst)
+            dst = fold_map[dst]
+        if dst != src:
+            resolved[src] = dst
+
+    folded = 0
+    for mesh_obj in mesh_objects:
+        vgroups = mesh_obj.vertex_groups
+        src_index = {vg.index: resolved[vg.name] for vg in vgroups if vg.name in resolved}
+        if not src_index:
+            continue
+        for dst_name in set(src_index.values()):
+            if dst_name not in vgroups:
+                vgroups.new(name=dst_name)
+        dst_index = {name: vgroups[name].index for name in set(src_index.values())}
+        dst_indices = set(dst_index.values())
+
+        # 单次遍历：累加源权重，同时记录目标组已有权重
+        sums: Dict[int, Dict[int, float]] = defaultdict(dict)
+        for vert in mesh_obj.data.vertices:
+            incoming = {}
+            existing = {}
+            for g in vert.groups:
+                if g.group in src_index:
+                    if g.weight > 0:
+                        di = dst_index[src_index[g.group]]
+                        incoming[di] = incoming.get(di, 0.0) + g.weight
+                elif g.group in dst_indices:
+                    existing[g.group] = g.weight
+            for di, w in incoming.items():
+                sums[di][vert.index] = min(1.0, existing.get(di, 0.0) + w)
+
+        for di, per_vertex in sums.items():
+            by_weight: Dict[float, List[int]] = defaultdict(list)
+            for vi, w in per_vertex.items():
+                by_weight[w].append(vi)
+            target = vgroups[di]
+            for w, indices in by_weight.items():
+                target.add(indices, w, 'REPLACE')
+
+        for vg in [vg for vg in vgroups if vg.name in resolved]:
+            vgroups.remove(vg)
+            folded += 1
+    return folded
+
+
+def weighted_group_names(mesh_objects, epsilon=1e-6):
+    """返回所有网格中至少有一个顶点权重大于 epsilon 的顶点组名称"""
+    names = set()
+    for mesh_obj in mesh_objects:
+        if not mesh_obj.vertex_groups:
+            continue
+        used = set()
+        for vert in mesh_obj.data.vertices:
+            for g in vert.groups:
+                if g.weight > epsilon:
+                    used.add(g.group)
+        names.update(vg.name for vg in mesh_obj.vertex_groups if vg.index in used)
+    return names
+
+
+# ----- 少前2预处理流水线 -----
+
+GFL2_PROTECTED_BONES = {"chest_m"}
+GFL2_EYE_BONES = {"face_eye_l", "face_eye_r", "face_base_eye_l", "face_base_eye_r"}
+GFL2_SKIN_EXCLUDE_PREFIXES = ("lf", "rf", "rt_", "lt_")
+
+
+class GFL2Pipeline:
+    """少前2预处理的运行状态：骨骼索引、待提交的删除以及各步骤耗时"""
+
+    def __init__(self, context, armature_obj):
+        self.context = context
+        self.obj = armature_obj
+        self.armature = armature_obj.data
+        self.index = None
+        self.timings: List[tuple] = []
+
+    def ensure_mode(self, mode):
+        if self.context.view_layer.objects.active != self.obj:
+            self.context.view_layer.objects.active = self.obj
+        if self.obj.mode != mode:
+            bpy.ops.object.mode_set(mode=mode)
+
+    def bone_index(self):
+        if self.index is None:
+            self.ensure_mode('OBJECT')
+            self.index = BoneNameIndex(self.armature)
+        return self.index
+
+    def mesh_children(self):
+        return [o for o in bpy.data.objects if o.type == 'MESH' and o.parent == self.obj]
+
+    def commit_bones(self):
+        """一次编辑模式会话中提交所有规划好的骨骼删除"""
+        if self.index is None or not self.index.removed:
+            return 0
+        removed = list(self.index.removed)
+        self.ensure_mode('EDIT')
+        count = self.index.commit_edit_bones(self.armature)
+        self.ensure_mode('OBJECT')
+        for name in removed:
+            log_bone_operation(self.context, "GFL2Preprocess", f"remove {name} on {self.obj.name}")
+        self.index = None
+        return count
+
+
+def _gfl2_delete_lod(pipe):
+    pipe.ensure_mode('OBJECT')
+    objects_to_delete = [o for o in bpy.data.objects if o.type == 'MESH' and 'lod1' in o.name.lower()]
+    if not objects_to_delete:
+        print("  - 未找到 LOD1 模型。")
+        return
+    deleted_lod_count = 0
+    for obj_to_delete in objects_to_delete:
+        obj_name = obj_to_delete.name
+        try:
+            bpy.data.objects.remove(obj_to_delete, do_unlink=True)
+            deleted_lod_count += 1
+        except Exception as e_remove_lod1:
+            print(f"    - 移除对象 '{obj_name}' 时出错 (可能已被删除或有特殊链接): {e_remove_lod1}")
+    print(f"  - 移除了 {deleted_lod_count} 个 LOD1 模型。")
+
+
+def _gfl2_scale(pipe):
+    pipe.ensure_mode('OBJECT')
+    # 统一缩放与旋转可交换，直接放大物体缩放即等同于以原点为中心的 resize
+    pipe.obj.scale = pipe.obj.scale * 1000
+    pipe.context.view_layer.update()
+    print("  - 骨架缩放完成。")
+
+
+def _gfl2_apply_pose(pipe):
+    pipe.ensure_mode('POSE')
+    bpy.ops.pose.armature_apply(selected=False)
+    pipe.ensure_mode('OBJECT')
+    print("  - 应用姿态完成。")
+
+
+def _gfl2_fix_parents(pipe):
+    pipe.ensure_mode('OBJECT')
+    obj = pipe.obj
+    models = [c for c in obj.children
+              if c.type == 'MESH' and not any(m.type == 'ARMATURE' for m in c.modifiers)]
+    print(f"  - 找到 {len(models)} 个没有骨架修改器的模型需要处理...")
+    parent_inverse = obj.matrix_world.inverted()
+    for model in models:
+        try:
+            # 等同于 清除父级(保持变换) + 设置物体父级(保持变换)
+            world = model.matrix_world.copy()
+            model.parent = obj
+            model.parent_type = 'OBJECT'
+            model.matrix_parent_inverse = parent_inverse
+            model.matrix_world = world
+            armature_modifier = model.modifiers.new(name="Armature", type='ARMATURE')
+            armature_modifier.object = obj
+            print(f"    - {model.name}: 已重新设置父级并添加骨架修改器")
+        except Exception as e_model_fix:
+            print(f"    - 处理模型 {model.name} 时出错: {e_model_fix}")
+
+
+def _gfl2_merge_bones(pipe):
+    index = pipe.bone_index()
+
+    def is_merge_candidate(name):
+        lower = name.lower()
+        if lower in GFL2_PROTECTED_BONES or index.parent.get(name) is None:
+            return False
+        if "part" in lower or "finger4" in lower or "cup" in lower:
+            return True
+        return ("skin" in lower and
+                not any(lower.startswith(prefix) for prefix in GFL2_SKIN_EXCLUDE_PREFIXES) and
+                not any(f"_{prefix}" in lower for prefix in GFL2_SKIN_EXCLUDE_PREFIXES))
+
+    # 'part'/'finger4'/'skin'/'cup' 合并到第一个不参与合并的祖先
+    merging = {name for name in index.names() if is_merge_candidate(name)}
+    fold_map = {}
+    for name in merging:
+        target = index.final_parent(name, merging)
+        if target:
+            fold_map[name] = target
+    for name in merging:
+        index.remove(name)
+    print(f"  - 'part'/'finger4'/'skin'/'cup' 骨骼: {len(merging)} 个合并到父级。")
+
+    # Root: 同层级骨骼与父级合并到 Root
+    root_name = index.find("root")
+    if root_name:
+        root_parent = index.parent.get(root_name)
+        siblings = index.siblings(root_name) if root_parent else []
+        for name in siblings + ([root_parent] if root_parent else []):
+            fold_map[name] = root_name
+            index.remove(name)
+        print(f"  - Root 骨骼 {root_name}: 合并了 {len(siblings)} 个同层级骨骼"
+              f"{' 和父级 ' + root_parent if root_parent else ''}。")
+    else:
+        print("  - 未找到名为 'root' 的骨骼。")
+
+    pipe.ensure_mode('OBJECT')
+    folded = fold_vertex_groups(pipe.mesh_children(), fold_map)
+    print(f"  - 合并了 {folded} 个顶点组，待删除骨骼 {len(index.removed)} 个。")
+
+
+def _gfl2_remove_zero_weight(pipe):
+    index = pipe.bone_index()
+    pipe.ensure_mode('OBJECT')
+    bones_with_weights = weighted_group_names(pipe.mesh_children())
+    print(f"  - {len(bones_with_weights)} 个顶点组具有有效权重。")
+    keep = GFL2_EYE_BONES | GFL2_PROTECTED_BONES
+    bones_to_remove = [name for name in index.names()
+                       if name not in bones_with_weights and name.lower() not in keep]
+    for name in bones_to_remove:
+        index.remove(name)
+    print(f"  - 找到 {len(bones_to_remove)} 个零权重骨骼准备删除 (已排除眼睛骨骼)。")
+
+
+def _gfl2_apply_transforms(pipe):
+    pipe.ensure_mode('OBJECT')
+    context = pipe.context
+    obj = pipe.obj
+    bpy.ops.object.select_all(action='DESELECT')
+    obj.select_set(True)
+    mesh_children_final = [child for child in obj.children if child.type == 'MESH']
+    for child in mesh_children_final:
+        child.select_set(True)
+    context.view_layer.objects.active = obj
+    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    bpy.ops.object.select_all(action='DESELECT')
+    print(f"  - 已对骨架和 {len(mesh_children_final)} 个剩余子模型应用变换。")
+
+
+def _gfl2_eye_material_indices(mesh):
+    indices = []
+    for i, mat in enumerate(mesh.materials):
+        if mat:
+            mat_name_lower = mat.name.lower()
+            if ((("eyenew" in mat_name_lower and "eyenewmu" not in mat_name_lower) or
+                 "eyenewadd" in mat_name_lower) and
+                not any(exclude in mat_name_lower for exclude in ["eyenewmul", "eyenewmult"])):
+                indices.append(i)
+    return indices
+
+
+def _gfl2_face_groups(pipe):
+    pipe.ensure_mode('OBJECT')
+    face_models = [o for o in bpy.data.objects if o.type == 'MESH' and 'face' in o.name.lower()]
+    print(f"  - 找到 {len(face_models)} 个面部模型进行顶点组处理...")
+    processed = 0
+    for face_model in face_models:
+        mesh = face_model.data
+        if not mesh.polygons:
+            print(f"    - 警告: 模型 {face_model.name} 没有面，无法分配顶点组。")
+            continue
+        face_model.vertex_groups.clear()
+        head_group = face_model.vertex_groups.new(name="Head_M")
+        eye_l_group = face_model.vertex_groups.new(name="Face_Eye_L")
+        eye_r_group = face_model.vertex_groups.new(name="Face_Eye_R")
+
+        poly_count = len(mesh.polygons)
+        material_index = np.empty(poly_count, dtype=np.int32)
+        mesh.polygons.foreach_get("material_index", material_index)
+        loop_totals = np.empty(poly_count, dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_verts)
+        coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coords)
+
+        # 每个顶点以它第一次出现的面为准（与逐面遍历的结果一致）
+        loop_poly = np.repeat(np.arange(poly_count), loop_totals)
+        verts, first_loop = np.unique(loop_verts, return_index=True)
+        is_eye = np.isin(material_index[loop_poly[first_loop]], _gfl2_eye_material_indices(mesh))
+        is_left = coords.reshape(-1, 3)[verts, 0] > 0
+
+        for group, mask in ((head_group, ~is_eye),
+                            (eye_l_group, is_eye & is_left),
+                            (eye_r_group, is_eye & ~is_left)):
+            selected = verts[mask]
+            if len(selected):
+                group.add(selected.tolist(), 1.0, 'REPLACE')
+        processed += 1
+    print(f"  - 已处理 {processed} 个面部模型顶点组。")
+
+
+# (标识, 显示名称, 处理函数, 是否修改骨骼)
+GFL2_STAGES = (
+    ('DELETE_LOD', "删除 LOD1 模型", _gfl2_delete_lod, False),
+    ('SCALE', "缩放骨架", _gfl2_scale, False),
+    ('APPLY_POSE', "应用姿态为静止姿态", _gfl2_apply_pose, False),
+    ('FIX_PARENTS', "修复模型父级与骨架修改器", _gfl2_fix_parents, False),
+    ('MERGE_BONES', "合并特定骨骼与 Root", _gfl2_merge_bones, True),
+    ('ZERO_WEIGHT', "清理零权重骨骼", _gfl2_remove_zero_weight, True),
+    ('APPLY_TRANSFORMS', "应用变换", _gfl2_apply_transforms, False),
+    ('FACE_GROUPS', "处理面部模型顶点组", _gfl2_face_groups, False),
+)
+
+
+def run_gfl2_pipeline(context, armature_obj, stage_ids):
+    """按顺序运行指定步骤，骨骼删除在连续的骨骼步骤结束后一次性提交，返回耗时列表"""
+    pipe = GFL2Pipeline(context, armature_obj)
+    stages = [s for s in GFL2_STAGES if s[0] in stage_ids]
+    for i, (stage_id, label, func, edits_bones) in enumerate(stages):
+        print(f"步骤 {i + 1}/{len(stages)}: {label}...")
+        start = time.perf_counter()
+        func(pipe)
+        next_edits_bones = i + 1 < len(stages) and stages[i + 1][3]
+        if edits_bones and not next_edits_bones:
+            removed = pipe.commit_bones()
+            print(f"  - 编辑模式中删除了 {removed} 个骨骼。")
+        elapsed = time.perf_counter() - start
+        pipe.timings.append((label, elapsed))
+        print(f"  - 耗时 {elapsed:.3f} 秒")
+    return pipe.timings
+
+
 class BONE_OT_GFL2_preprocess(Operator):
     bl_idname = "object.gfl2_preprocess" # 修改 bl_idname 以反映操作对象
     bl_label = "少前2模型一键预处理" # 修改 bl_label
     bl_description = "一键处理少前2模型：缩放，应用姿态和变换，处理特定骨骼，删除lod1模型，处理face模型顶点组，清理零权重骨骼(保留眼睛骨骼)" # 修改 bl_description
     bl_options = {'REGISTER', 'UNDO'}
 
+    stage: EnumProperty(
+        name="步骤",
+        description="运行全部步骤或只重新运行其中一步",
+        items=[('ALL', "全部步骤", "按顺序运行所有预处理步骤")] +
+              [(stage_id, label, label) for stage_id, label, _, _ in GFL2_STAGES],
+        default='ALL',
+        options={'SKIP_SAVE'}
+    )
+
     @classmethod
     def poll(cls, context):
         # 允许在物体模式或姿态模式下启动，只要活动对象是骨架
@@ -3245,417 +7251,31 @@ class BONE_OT_GFL2_preprocess(Operator):
             self.report({'ERROR'}, "请先选择一个骨架对象")
             return {'CANCELLED'}
 
-        armature = obj.data
-        original_mode = context.mode # 记录原始模式
+        original_mode = obj.mode # 记录原始模式
+        if self.stage == 'ALL':
+            stage_ids = {s[0] for s in GFL2_STAGES}
+        else:
+            stage_ids = {self.stage}
 
         try:
-            # --- 最终调整后的顺序 --- #
-
-            # --- 1. 删除LOD1模型 (物体模式) --- <--- 使用 bpy.data.objects.remove() 重构
-            print("步骤 1: 删除 LOD1 模型 (直接移除)...")
-            if context.mode != 'OBJECT': # 确保在物体模式
-                bpy.ops.object.mode_set(mode='OBJECT')
-            bpy.ops.object.select_all(action='DESELECT') # 清理选择以防万一
-
-            deleted_lod_count = 0
-            # 收集需要删除的对象名称，因为在迭代时直接删除可能导致问题
-            objects_to_delete_names = [o.name for o in bpy.data.objects if o.type == 'MESH' and 'lod1' in o.name.lower()]
-            
-            if objects_to_delete_names:
-                print(f"  - 找到 {len(objects_to_delete_names)} 个 LOD1 模型准备删除...")
-                for obj_name in objects_to_delete_names:
-                    obj_to_delete = bpy.data.objects.get(obj_name)
-                    if obj_to_delete: # 确保对象仍然存在
-                        try:
-                            bpy.data.objects.remove(obj_to_delete, do_unlink=True)
-                            print(f"    - 已移除对象: {obj_name}")
-                            deleted_lod_count += 1
-                        except Exception as e_remove_lod1:
-                            print(f"    - 移除对象 '{obj_name}' 时出错 (可能已被删除或有特殊链接): {e_remove_lod1}")
-                print(f"  - 完成 LOD1 模型移除尝试，移除了 {deleted_lod_count} 个。")
-            else:
-                print("  - 未找到 LOD1 模型。")
-
-            # --- 2. 缩放 (物体模式) ---
-            print("步骤 2: 缩放骨架...")
-            if context.mode != 'OBJECT':
-                bpy.ops.object.mode_set(mode='OBJECT')
-            # 确保只选择骨架
-            bpy.ops.object.select_all(action='DESELECT')
-            obj.select_set(True)
-            context.view_layer.objects.active = obj
-            bpy.ops.transform.resize(value=(1000, 1000, 1000))
-            print("  - 骨架缩放完成。")
-
-            # --- 3. 应用姿态为静止姿态 (姿态模式) ---
-            print("步骤 3: 应用当前姿态为静止姿态...")
-            bpy.ops.object.mode_set(mode='POSE')
-            bpy.ops.pose.select_all(action='SELECT')
-            bpy.ops.pose.armature_apply(selected=False)
-            bpy.ops.pose.select_all(action='DESELECT')
-            print("  - 应用姿态完成。")
-
-            # --- 3.5. 修复没有骨架修改器的模型父级关系 (物体模式) ---
-            print("步骤 3.5: 修复没有骨架修改器的模型父级关系...")
-            if context.mode != 'OBJECT':
-                bpy.ops.object.mode_set(mode='OBJECT')
-            
-            # 查找所有子对象中没有骨架修改器的网格对象
-            models_without_armature_modifier = []
-            for child in obj.children:
-                if child.type == 'MESH':
-                    has_armature_modifier = False
-                    for modifier in child.modifiers:
-                        if modifier.type == 'ARMATURE':
-                            has_armature_modifier = True
-                            break
-                    if not has_armature_modifier:
-                        models_without_armature_modifier.append(child)
-            
-            print(f"  - 找到 {len(models_without_armature_modifier)} 个没有骨架修改器的模型需要处理...")
-            
-            # 处理每个没有骨架修改器的模型
-            processed_models = 0
-            for model in models_without_armature_modifier:
-                try:
-                    print(f"    - 处理模型: {model.name}")
-                    
-                    # 选择并激活该模型
-                    bpy.ops.object.select_all(action='DESELECT')
-                    model.select_set(True)
-                    context.view_layer.objects.active = model
-                    
-                    # 清除父级并保持变换结果
-                    bpy.ops.object.parent_clear(type='CLEAR_KEEP_TRANSFORM')
-                    print(f"      - 已清除父级并保持变换")
-                    
-                    # 重新设置父级为骨架（使用对象父级，不使用骨骼父级）
-                    obj.select_set(True)
-                    context.view_layer.objects.active = obj
-                    bpy.ops.object.parent_set(type='OBJECT', keep_transform=True)
-                    print(f"      - 已重新设置父级为骨架")
-                    
-                    # 为该模型添加骨架修改器
-                    try:
-                        # 确保模型被选中并激活
-                        bpy.ops.object.select_all(action='DESELECT')
-                        model.select_set(True)
-                        context.view_layer.objects.active = model
-                        
-                        # 添加骨架修改器
-                        armature_modifier = model.modifiers.new(name="Armature", type='ARMATURE')
-                        armature_modifier.object = obj  # 设置骨架对象为用户选择的骨架
-                        print(f"      - 已添加骨架修改器并设置目标为: {obj.name}")
-                        
-                    except Exception as e_modifier:
-                        print(f"      - 添加骨架修改器时出错: {e_modifier}")
-                    
-                    processed_models += 1
-                    
-                except Exception as e_model_fix:
-                    print(f"      - 处理模型 {model.name} 时出错: {e_model_fix}")
-                    continue
-            
-            if processed_models > 0:
-                print(f"  - 成功处理了 {processed_models} 个没有骨架修改器的模型")
-            else:
-                print("  - 没有需要处理的模型或处理失败")
-            
-            # 清理选择状态
-            bpy.ops.object.select_all(action='DESELECT')
-            obj.select_set(True)
-            context.view_layer.objects.active = obj
-
-            # --- 4. 处理特定骨骼 & Root 合并 (姿态模式) ---
-            print("步骤 4: 处理特定骨骼和 Root 合并...")
-            if context.mode != 'POSE':
-                 bpy.ops.object.mode_set(mode='POSE')
-            # ... (骨骼合并逻辑保持不变) ...
-            # 合并 "part" 或 "finger4" (排除 CHest_M)
-            print("  - 检查 'part'/'finger4' 骨骼 (排除 CHest_M)...")
-            bpy.ops.pose.select_all(action='DESELECT')
-            found_bones_part1 = False
-            bones_to_select_p1 = []
-            for pose_bone in obj.pose.bones:
-                bone_name_lower = pose_bone.name.lower()
-                # 排除 Chest_M 骨骼（不区分大小写）
-                if pose_bone.name.lower() == "chest_m":
-                    print(f"    - 跳过保护骨骼: {pose_bone.name}")
-                    continue
-                if ("part" in bone_name_lower or "finger4" in bone_name_lower) and pose_bone.parent:
-                    bones_to_select_p1.append(pose_bone.name)
-                    found_bones_part1 = True
-            if found_bones_part1:
-                print(f"    - 找到 {len(bones_to_select_p1)} 个，准备合并到父级...")
-                for bone_name in bones_to_select_p1:
-                    if bone_name in obj.pose.bones: obj.pose.bones[bone_name].bone.select = True
-                if context.selected_pose_bones:
-                    bpy.ops.bone.merge_to_parent()
-                    print("    - 'part'/'finger4' 骨骼合并完成。")
-                else:
-                    print("    - 警告：选择 'part'/'finger4' 骨骼失败或没有选中项，跳过合并。")
-            else:
-                print("  - 未找到 'part'/'finger4' 骨骼。")
-            # 合并 "skin" (排除特定前缀和CHest_M)
-            print("  - 检查 'skin' 骨骼 (排除 'lf', 'rf', 'rt_', 'lt_', CHest_M)...")
-            bpy.ops.pose.select_all(action='DESELECT')
-            found_bones_part2 = False
-            bones_to_select_p2 = []
-            exclude_prefixes = ("lf", "rf", "rt_", "lt_")
-            for pose_bone in obj.pose.bones:
-                bone_name = pose_bone.name.lower()
-                # 排除 Chest_M 骨骼（不区分大小写）
-                if bone_name == "chest_m":
-                    print(f"    - 跳过保护骨骼: {pose_bone.name}")
-                    continue
-                if ("skin" in bone_name and
-                    not any(bone_name.startswith(prefix) for prefix in exclude_prefixes) and
-                    not any(f"_{prefix}" in bone_name for prefix in exclude_prefixes) and
-                    pose_bone.parent):
-                    bones_to_select_p2.append(pose_bone.name)
-                    found_bones_part2 = True
-            if found_bones_part2:
-                print(f"    - 找到 {len(bones_to_select_p2)} 个，准备合并到父级...")
-                for bone_name in bones_to_select_p2:
-                    if bone_name in obj.pose.bones: obj.pose.bones[bone_name].bone.select = True
-                if context.selected_pose_bones:
-                    bpy.ops.bone.merge_to_parent()
-                    print("    - 'skin' 骨骼合并完成。")
-                else:
-                    print("    - 警告：选择 'skin' 骨骼失败或没有选中项，跳过合并。")
-            else:
-                print("  - 未找到符合条件的 'skin' 骨骼。")
-            # 合并 "cup" (排除CHest_M)
-            print("  - 检查 'cup' 骨骼 (排除CHest_M)...")
-            bpy.ops.pose.select_all(action='DESELECT')
-            found_bones_cup = False
-            bones_to_select_cup = []
-            for pose_bone in obj.pose.bones:
-                bone_name_lower = pose_bone.name.lower()
-                # 排除 Chest_M 骨骼（不区分大小写）
-                if bone_name_lower == "chest_m":
-                    print(f"    - 跳过保护骨骼: {pose_bone.name}")
-                    continue
-                if "cup" in bone_name_lower and pose_bone.parent:
-                    bones_to_select_cup.append(pose_bone.name)
-                    found_bones_cup = True
-            if found_bones_cup:
-                print(f"    - 找到 {len(bones_to_select_cup)} 个，准备合并到父级...")
-                for bone_name in bones_to_select_cup:
-                    if bone_name in obj.pose.bones: obj.pose.bones[bone_name].bone.select = True
-                if context.selected_pose_bones:
-                    bpy.ops.bone.merge_to_parent()
-                    print("    - 'cup' 骨骼合并完成。")
-                else:
-                    print("    - 警告：选择 'cup' 骨骼失败或没有选中项，跳过合并。")
-            else:
-                print("  - 未找到 'cup' 骨骼。")
-            # 处理 root 骨骼
-            print("  - 处理 Root 骨骼合并...")
-            bpy.ops.pose.select_all(action='DESELECT')
-            root_bone = None
-            for pose_bone in obj.pose.bones:
-                if pose_bone.name.lower() == "root":
-                    root_bone = pose_bone
-                    break
-            if root_bone:
-                print(f"    - 找到 Root 骨骼: {root_bone.name}")
-                try:
-                    bpy.ops.pose.select_all(action='DESELECT')
-                    obj.data.bones.active = root_bone.bone
-                    root_bone.bone.select = True
-                except Exception as e_select_root:
-                    print(f"    - 警告：选择或设置Root为活动骨骼时出错: {e_select_root}")
-                    root_bone = None
-                if root_bone:
-                    root_parent = root_bone.parent
-                    siblings_selected = False
-                    bones_to_select_siblings = []
-                    if root_parent:
-                        print(f"    - 查找 Root 的同层级骨骼 (父级: {root_parent.name})...")
-                        for pose_bone in obj.pose.bones:
-                            if pose_bone != root_bone and pose_bone.parent == root_parent:
-                                bones_to_select_siblings.append(pose_bone.name)
-                                siblings_selected = True
-                                print(f"      - 待选同层级: {pose_bone.name}")
-                    if siblings_selected:
-                        print("    - 合并同层级骨骼到 Root...")
-                        for bone_name in bones_to_select_siblings:
-                            if bone_name in obj.pose.bones: obj.pose.bones[bone_name].bone.select = True
-                        obj.data.bones.active = root_bone.bone
-                        root_bone.bone.select = True 
-                        if len(context.selected_pose_bones) > 1:
-                            bpy.ops.bone.merge_to_active()
-                        else:
-                             print("    - 警告：选择同层级骨骼后，选中数量不足以合并。")
-                        bpy.ops.pose.select_all(action='DESELECT')
-                    if root_parent:
-                        print(f"    - 选择 Root 的父级 {root_parent.name} 并合并到 Root...")
-                        bpy.ops.pose.select_all(action='DESELECT')
-                        root_bone.bone.select = True
-                        obj.data.bones.active = root_bone.bone
-                        if root_parent.name in obj.pose.bones:
-                            obj.pose.bones[root_parent.name].bone.select = True
-                            if len(context.selected_pose_bones) == 2:
-                                bpy.ops.bone.merge_to_active()
-                                print("    - Root 父级合并完成。")
-                            else:
-                                print("    - 警告：选择父级骨骼后，选中数量不为2，无法合并。")
-                        else:
-                            print(f"    - 警告: 无法在 Pose 模式下找到父级骨骼 {root_parent.name}。")
-                        bpy.ops.pose.select_all(action='DESELECT')
-            else:
-                print("  - 未找到名为 'root' 的骨骼。")
-
-            # --- 5. 清理零权重骨骼 (物体/编辑模式) ---
-            print("步骤 5: 清理零权重骨骼...")
-            # ... (清理逻辑保持不变，确保先切到 OBJECT 模式检查权重) ...
-            bpy.ops.object.mode_set(mode='OBJECT')
-            mesh_objects = [o for o in bpy.data.objects if o.type == 'MESH' and o.parent == obj]
-            print(f"  - 检查 {len(mesh_objects)} 个当前关联模型的权重...")
-            bones_with_weights = set()
-            for mesh_obj in mesh_objects:
-                 if not mesh_obj.vertex_groups: continue
-                 for vgroup in mesh_obj.vertex_groups:
-                      if vgroup.name not in armature.bones: continue
-                      has_weight = False
-                      if vgroup.index in [g.group for v in mesh_obj.data.vertices for g in v.groups]:
-                           for vert in mesh_obj.data.vertices:
-                                try:
-                                     weight = vgroup.weight(vert.index)
-                                     if weight > 1e-6:
-                                          has_weight = True
-                                          break
-                                except RuntimeError:
-                                     continue
-                      if has_weight:
-                           bones_with_weights.add(vgroup.name)
-            print(f"  - {len(bones_with_weights)} 个骨骼具有有效权重。")
-            excluded_bone_names = {"face_eye_l", "face_eye_r", "face_base_eye_l", "face_base_eye_r"}
-            bones_to_remove = []
-            for bone in armature.bones:
-                if (bone.name not in bones_with_weights and
-                    bone.name.lower() not in excluded_bone_names and
-                    bone.name.lower() != "chest_m"):  # 排除 Chest_M 骨骼（不区分大小写）
-                    bones_to_remove.append(bone.name)
-            print(f"  - 找到 {len(bones_to_remove)} 个零权重骨骼准备删除 (已排除眼睛骨骼)。")
-            if bones_to_remove:
-                print("  - 切换到编辑模式删除骨骼...")
-                bpy.ops.object.mode_set(mode='EDIT')
-                removed_count = 0
-                for bone_name in bones_to_remove:
-                    if bone_name in armature.edit_bones:
-                        edit_bone = armature.edit_bones[bone_name]
-                        parent = edit_bone.parent
-                        children_to_reparent = list(edit_bone.children)
-                        if children_to_reparent and parent and parent.name in armature.edit_bones:
-                             valid_parent_edit_bone = armature.edit_bones[parent.name]
-                             for child in children_to_reparent:
-                                  if child.name in armature.edit_bones:
-                                       armature.edit_bones[child.name].parent = valid_parent_edit_bone
-                        try:
-                            armature.edit_bones.remove(edit_bone)
-                            removed_count += 1
-                        except Exception as e_bone_remove:
-                             print(f"      - 删除骨骼 {bone_name} 时出错: {e_bone_remove}")
-                print(f"  - 实际删除了 {removed_count} 个零权重骨骼。")
-            else:
-                print("  - 没有需要删除的零权重骨骼。")
-
-            # --- 6. 应用变换 (物体模式) ---
-            print("步骤 6: 应用骨架和剩余子模型变换...")
-            # ... (应用变换逻辑保持不变) ...
-            if context.mode != 'OBJECT':
-                bpy.ops.object.mode_set(mode='OBJECT')
-            bpy.ops.object.select_all(action='DESELECT')
-            obj.select_set(True)
-            context.view_layer.objects.active = obj
-            mesh_children_final = []
-            for child in obj.children:
-                if child.type == 'MESH':
-                    child.select_set(True)
-                    mesh_children_final.append(child)
-            if context.selected_objects:
-                bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-                print(f"  - 已对骨架和 {len(mesh_children_final)} 个剩余子模型应用变换。")
-            else:
-                print("  - 没有选中对象可以应用变换。")
-            bpy.ops.object.select_all(action='DESELECT')
-
-            # --- 7. 处理面部模型顶点组 (物体模式) ---
-            print("步骤 7: 处理剩余面部模型顶点组...")
-            # ... (面部顶点组处理逻辑保持不变) ...
-            if context.mode != 'OBJECT':
-                bpy.ops.object.mode_set(mode='OBJECT')
-            face_models_final = [o for o in bpy.data.objects if o.type == 'MESH' and 'face' in o.name.lower()]
-            print(f"  - 找到 {len(face_models_final)} 个剩余的面部模型进行顶点组处理...")
-            face_models_processed = 0
-            for face_model in face_models_final:
-                print(f"    - 处理模型: {face_model.name}")
-                bpy.ops.object.select_all(action='DESELECT')
-                context.view_layer.objects.active = face_model
-                face_model.select_set(True)
-                print("      - 清除现有顶点组...")
-                while face_model.vertex_groups:
-                    try:
-                         face_model.vertex_groups.remove(face_model.vertex_groups[0])
-                    except Exception as e_vg_remove:
-                         print(f"        - 删除顶点组时出错 (可能已删除): {e_vg_remove}")
-                         break
-                print("      - 创建 Head_M, Face_Eye_L, Face_Eye_R 顶点组...")
-                head_group = face_model.vertex_groups.new(name="Head_M")
-                eye_l_group = face_model.vertex_groups.new(name="Face_Eye_L")
-                eye_r_group = face_model.vertex_groups.new(name="Face_Eye_R")
-                eye_material_indices = []
-                if face_model.data.materials:
-                    for i, mat in enumerate(face_model.data.materials):
-                        if mat:
-                            mat_name_lower = mat.name.lower()
-                            if ((("eyenew" in mat_name_lower and "eyenewmu" not in mat_name_lower) or
-                                 "eyenewadd" in mat_name_lower) and
-                                not any(exclude in mat_name_lower for exclude in ["eyenewmul", "eyenewmult"])):
-                                eye_material_indices.append(i)
-                print("      - 分配顶点到组...")
-                verts_head = []
-                verts_eye_l = []
-                verts_eye_r = []
-                processed_verts = set()
-                if not face_model.data.polygons:
-                     print("      - 警告: 模型没有面，无法分配顶点组。")
-                     continue
-                for poly in face_model.data.polygons:
-                    is_eye_material = poly.material_index in eye_material_indices
-                    for vert_idx in poly.vertices:
-                        if vert_idx in processed_verts: continue
-                        vert = face_model.data.vertices[vert_idx]
-                        processed_verts.add(vert_idx)
-                        if is_eye_material:
-                            if vert.co.x > 0: verts_eye_l.append(vert_idx)
-                            else: verts_eye_r.append(vert_idx)
-                        else: verts_head.append(vert_idx)
-                if verts_head: head_group.add(verts_head, 1.0, 'REPLACE');
-                if verts_eye_l: eye_l_group.add(verts_eye_l, 1.0, 'REPLACE');
-                if verts_eye_r: eye_r_group.add(verts_eye_r, 1.0, 'REPLACE');
-                face_models_processed += 1
-                bpy.ops.object.select_all(action='DESELECT')
-            if face_models_processed == 0 and len(face_models_final) > 0:
-                print("  - 未成功处理任何面部模型顶点组。")
-            elif face_models_processed > 0:
-                print(f"  - 已处理 {face_models_processed} 个面部模型顶点组。")
+            timings = run_gfl2_pipeline(context, obj, stage_ids)
 
-            # --- 8. 完成与报告 --- (旧的步骤7)
             # 切换回原始模式
-            bpy.ops.object.mode_set(mode=original_mode if original_mode in {'OBJECT', 'POSE', 'EDIT'} else 'OBJECT') # 确保是有效模式
+            context.view_layer.objects.active = obj
+            if obj.mode != original_mode and original_mode in {'OBJECT', 'POSE', 'EDIT'}:
+                bpy.ops.object.mode_set(mode=original_mode)
 
-            # 最终报告
-            final_message = "少前2模型预处理完成。"
+            total = sum(t for _, t in timings)
+            final_message = f"少前2模型预处理完成，共 {len(timings)} 个步骤，耗时 {total:.2f} 秒。"
             self.report({'INFO'}, final_message)
             print(f"\n{final_message}")
+            for label, elapsed in timings:
+                print(f"  {label}: {elapsed:.3f} 秒")
 
         except Exception as e:
             # 发生错误时，尝试恢复原始模式
             try:
-                if bpy.context.mode != original_mode:
+                if obj.mode != original_mode:
                    bpy.ops.object.mode_set(mode=original_mode if original_mode in {'OBJECT', 'POSE', 'EDIT'} else 'OBJECT')
             except Exception as mode_restore_error:
                  print(f"尝试恢复原始模式时也发生错误: {mode_restore_error}")
@@ -3665,6 +7285,7 @@ class BONE_OT_GFL2_preprocess(Operator):
             self.report({'ERROR'}, f"处理过程中发生错误: {str(e)}")
             return {'CANCELLED'}
 
+        log_writer.flush()
         return {'FINISHED'}
 
 class BONE_OT_merge_siblings_half(Operator):
@@ -3780,6 +7401,7 @@ class BONE_OT_merge_siblings_half(Operator):
         # 返回姿态模式
         bpy.ops.object.mode_set(mode='POSE')
         
+        log_writer.flush()
         return {'FINISHED'}
     
     def draw(self, context):
@@ -4033,6 +7655,7 @@ class BONE_OT_mmd_quick_merge(Operator):
             total += 1
 
         self.report({'INFO'}, f"快速合并完成：{total} 项")
+        log_writer.flush()
         return {'FINISHED'}
 
 class BONE_OT_unlock_all_transforms(Operator):
@@ -4079,22 +7702,218 @@ class BONE_OT_unlock_all_transforms(Operator):
         self.report({'INFO'}, f"已解锁 {count} 个骨骼的移动/旋转/缩放")
         return {'FINISHED'}
 
+# ----- 主体骨骼重命名引擎 -----
+
+# 内置主体骨映射（覆盖从脚趾到手指所有部分），映射文件中没有对应预设时使用
+PRIMARY_BONE_RENAME_PAIRS = [
+    # 参考自 StandardRename 的标准目标名称
+    ("Shoulder_R","Right shoulder"),("RightShoulder","Right shoulder"),("UpperArm_R","Right arm"),("RightUpperArm","Right arm"),("LowerArm_R","Right_elbow"),("RightLowerArm","Right_elbow"),("RightHand","Right wrist"),("Hand_R","Right wrist"),("RightUpperLeg","Right leg"),("UpperLeg_R","Right leg"),("RightLowerLeg","Right knee"),("LowerLeg_R","Right knee"),("RightFoot","Right_ankle"),("Foot_R","Right_ankle"),("RightToeBase","Right toe"),("Toe_R","Right toe"),
+    ("IndexProximal_R","IndexFinger1_R"),("RightIndexProximal","IndexFinger1_R"),("IndexIntermediate_R","IndexFinger2_R"),("RightIndexIntermediate","IndexFinger2_R"),("IndexDistal_R","IndexFinger3_R"),("RightIndexDistal","IndexFinger3_R"),
+    ("LittleProximal_R","LittleFinger1_R"),("RightLittleProximal","LittleFinger1_R"),("LittleIntermediate_R","LittleFinger2_R"),("RightLittleIntermediate","LittleFinger2_R"),("LittleDistal_R","LittleFinger3_R"),("RightLittleDistal","LittleFinger3_R"),
+    ("MiddleProximal_R","MiddleFinger1_R"),("RightMiddleProximal","MiddleFinger1_R"),("MiddleIntermediate_R","MiddleFinger2_R"),("RightMiddleIntermediate","MiddleFinger2_R"),("MiddleDistal_R","MiddleFinger3_R"),("RightMiddleDistal","MiddleFinger3_R"),
+    ("RingProximal_R","RingFinger1_R"),("RightRingProximal","RingFinger1_R"),("RingIntermediate_R","RingFinger2_R"),("RightRingIntermediate","RingFinger2_R"),("RingDistal_R","RingFinger3_R"),("RightRingDistal","RingFinger3_R"),
+    ("ThumbProximal_R","Thumb0_R"),("RightThumbProximal","Thumb0_R"),("ThumbIntermediate_R","Thumb1_R"),("RightThumbIntermediate","Thumb1_R"),("ThumbDistal_R","Thumb2_R"),("RightThumbDistal","Thumb2_R"),
+    ("Shoulder_L","Left shoulder"),("LeftShoulder","Left shoulder"),("UpperArm_L","Left arm"),("LeftUpperArm","Left arm"),("LowerArm_L","Left_elbow"),("LeftLowerArm","Left_elbow"),("LeftHand","Left wrist"),("Hand_L","Left wrist"),("LeftUpperLeg","Left leg"),("UpperLeg_L","Left leg"),("LeftLowerLeg","Left knee"),("LowerLeg_L","Left knee"),("LeftFoot","Left_ankle"),("Foot_L","Left_ankle"),("LeftToeBase","Left toe"),("Toe_L","Left toe"),
+    ("IndexProximal_L","IndexFinger1_L"),("LeftIndexProximal","IndexFinger1_L"),("IndexIntermediate_L","IndexFinger2_L"),("LeftIndexIntermediate","IndexFinger2_L"),("IndexDistal_L","IndexFinger3_L"),("LeftIndexDistal","IndexFinger3_L"),
+    ("LittleProximal_L","LittleFinger1_L"),("LeftLittleProximal","LittleFinger1_L"),("LittleIntermediate_L","LittleFinger2_L"),("LeftLittleIntermediate","LittleFinger2_L"),("LittleDistal_L","LittleFinger3_L"),("LeftLittleDistal","LittleFinger3_L"),
+    ("MiddleProximal_L","MiddleFinger1_L"),("LeftMiddleProximal","MiddleFinger1_L"),("MiddleIntermediate_L","MiddleFinger2_L"),("LeftMiddleIntermediate","MiddleFinger2_L"),("MiddleDistal_L","MiddleFinger3_L"),("LeftMiddleDistal","MiddleFinger3_L"),
+    ("RingProximal_L","RingFinger1_L"),("LeftRingProximal","RingFinger1_L"),("RingIntermediate_L","RingFinger2_L"),("LeftRingIntermediate","RingFinger2_L"),("RingDistal_L","RingFinger3_L"),("LeftRingDistal","RingFinger3_L"),
+    ("ThumbProximal_L","Thumb0_L"),("LeftThumbProximal","Thumb0_L"),("ThumbIntermediate_L","Thumb1_L"),("LeftThumbIntermediate","Thumb1_L"),("ThumbDistal_L","Thumb2_L"),("LeftThumbDistal","Thumb2_L"),
+    ("Hips","Hips"),("Spine","Spine"),("Chest","Chest"),("Neck","Neck"),("Head","Head"),
+
+    # 结合骨骼日志中的 MMD 命名（主体肢体）
+    ("Shoulder_L","Left shoulder"),("Shoulder_R","Right shoulder"),
+    ("Arm_L","Left arm"),("Arm_R","Right arm"),
+    ("Elbow_L","Left_elbow"),("Elbow_R","Right_elbow"),
+    ("Wrist_L","Left wrist"),("Wrist_R","Right wrist"),
+    ("Leg_L","Left leg"),("Leg_R","Right leg"),
+    ("Knee_L","Left knee"),("Knee_R","Right knee"),
+    ("Ankle_L","Left_ankle"),("Ankle_R","Right_ankle"),
+    ("ToeTip_L","Left toe"),("ToeTip_R","Right toe"),
+
+    # 常见主体节点：按你的要求调整
+    ("Waist","Hips"),
+    ("UpperBody","Spine"),("Upperbody","Spine"),
+    ("UpperBody2","Spine2"),("Upperbody2","Spine2"),("Upperboody2","Spine2"),
+    ("UpperBody3","Chest"),("Upperbody3","Chest"),
+]
+
+_RENAME_PRESET_STATIC_ITEMS = [
+    ('StandardRename', 'Standard', ''),
+    ('WutheringWaves', 'WutheringWaves', ''),
+    ('Snowbreak', 'Snowbreak', ''),
+    ('GF2', 'GF2', ''),
+    ('UMA', 'UMA', ''),
+    ('Sio', 'Sio', ''),
+    ('idol', 'idol', ''),
+    ('Chunli', 'Chunli', ''),
+]
+# 映射文件缓存 {路径: (修改时间, {预设名: [(旧名, 新名), ...]})}
+_rename_preset_cache: Dict[str, tuple] = {}
+# Blender 要求动态枚举项保持引用
+_rename_preset_items: List[tuple] = []
+
+
+def load_rename_presets(path: str) -> Dict[str, List[tuple]]:
+    """读取INI格式的重命名映射文件，按修改时间缓存
+
+    格式：每个 [预设名] 段落下写 `旧骨骼名 = 新骨骼名`，以 ; 或 # 开头的行为注释。
+    保留书写顺序，同一旧名出现多次时以第一次为准。
+    """
+    if not path or not os.path.isfile(path):
+        return {}
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _rename_preset_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    presets: Dict[str, List[tuple]] = {}
+    current = None
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for raw in f:
+                line = raw.strip()
+                if not line or line[0] in ';#':
+                    continue
+                if line.startswith('[') and line.endswith(']'):
+                    current = presets.setdefault(line[1:-1].strip(), [])
+                    continue
+                if current is None or '=' not in line:
+                    continue
+                old_name, new_name = (part.strip() for part in line.split('=', 1))
+                if old_name and new_name:
+                    current.append((old_name, new_name))
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"读取重命名映射文件失败: {path}: {e}")
+        return {}
+    _rename_preset_cache[path] = (mtime, presets)
+    return presets
+
+
+def rename_preset_items(self, context):
+    """预设枚举：内置预设 + 映射文件中新增的段落"""
+    items = list(_RENAME_PRESET_STATIC_ITEMS)
+    known = {item[0] for item in items}
+    for name in load_rename_presets(bpy.path.abspath(self.file_path)):
+        if name not in known:
+            items.append((name, name, "来自映射文件"))
+            known.add(name)
+    _rename_preset_items[:] = items
+    return _rename_preset_items
+
+
+@dataclass
+class RenamePlan:
+    renames: Dict[str, str]      # 实际骨骼名 -> 新名称
+    folds: Dict[str, str]        # 目标名已被占用的骨骼 -> 目标名（只合并顶点组权重）
+    matched: Set[str]            # 映射表命中的实际骨骼名
+    missing: int                 # 映射表中未找到的条目数
+    cycles: List[List[str]]      # 检测到的循环重命名（通过临时名称处理）
+
+
+def _name_lookup(names, case_sensitive):
+    index = {}
+    for name in names:
+        index.setdefault(name if case_sensitive else name.lower(), name)
+    return index
+
+
+def resolve_rename_plan(bone_names, pairs, case_sensitive=False) -> RenamePlan:
+    """一次性解析整个映射表
+
+    所有重命名视为同时发生：a->b, b->c 的链式映射以及 a->b, b->a 的循环都能正确处理；
+    目标名已被保留的骨骼占用或被更早的条目占用时，改为只合并权重。
+    """
+    index = _name_lookup(bone_names, case_sensitive)
+    targets: Dict[str, str] = {}
+    missing = 0
+    for old_name, new_name in pairs:
+        actual = index.get(old_name if case_sensitive else old_name.lower())
+        if actual is None:
+            missing += 1
+            continue
+        targets.setdefault(actual, new_name)
+
+    # 不参与重命名的骨骼保留原名；同名映射优先占用目标名
+    claimed = {name for name in bone_names if name not in targets}
+    claimed.update(src for src, dst in targets.items() if src == dst)
+    renames, folds = {}, {}
+    for src, dst in targets.items():
+        if src == dst:
+            continue
+        if dst in claimed:
+            folds[src] = dst
+        else:
+            claimed.add(dst)
+            renames[src] = dst
+
+    cycles, visited = [], set()
+    for start in renames:
+        chain, current = [], start
+        while current in renames and current not in visited:
+            visited.add(current)
+            chain.append(current)
+            current = renames[current]
+        if current in chain:
+            cycles.append(chain[chain.index(current):])
+
+    return RenamePlan(renames, folds, set(targets), missing, cycles)
+
+
+def apply_rename_plan(arm, meshes, plan: RenamePlan, case_sensitive=False, sync_vertex_groups=True):
+    """执行重命名计划，返回 (成功重命名数, 合并的顶点组数)
+
+    先把相关顶点组移到临时名称，避免骨骼改名时 Blender 自动同步顶点组造成串名；
+    骨骼经临时名称两步改名；最后顶点组改为目标名，目标组已存在时批量合并权重。
+    """
+    group_moves = []   # (网格, 临时名, 目标名)
+    if sync_vertex_groups:
+        sources = list(plan.renames.items()) + list(plan.folds.items())
+        for obj in meshes:
+            lookup = _name_lookup([vg.name for vg in obj.vertex_groups], case_sensitive)
+            for i, (src, dst) in enumerate(sources):
+                vg_name = lookup.get(src if case_sensitive else src.lower())
+                if vg_name is None or vg_name == dst:
+                    continue
+                tmp_name = f"__mq_vg_{i}"
+                obj.vertex_groups[vg_name].name = tmp_name
+                group_moves.append((obj, tmp_name, dst))
+
+    renamed = 0
+    pose_bones = arm.pose.bones
+    staged = []
+    for i, (src, dst) in enumerate(plan.renames.items()):
+        tmp_name = f"__mq_bone_{i}"
+        try:
+            pose_bones[src].name = tmp_name
+            staged.append((tmp_name, src, dst))
+        except Exception as e:
+            print(f"重命名骨骼 {src} -> {dst} 失败: {e}")
+    for tmp_name, src, dst in staged:
+        pose_bones[tmp_name].name = dst
+        renamed += 1
+
+    folded = 0
+    fold_maps: Dict[object, Dict[str, str]] = defaultdict(dict)
+    for obj, tmp_name, dst in group_moves:
+        if dst in obj.vertex_groups:
+            fold_maps[obj][tmp_name] = dst
+        else:
+            obj.vertex_groups[tmp_name].name = dst
+    for obj, fold_map in fold_maps.items():
+        folded += fold_vertex_groups([obj], fold_map)
+    return renamed, folded
+
+
 # 主体骨骼重命名设置
 class RenamePrimarySettings(PropertyGroup):
     preset: EnumProperty(
         name="预设",
-        description="选择重命名预设",
-        items=[
-            ('StandardRename', 'Standard', ''),
-            ('WutheringWaves', 'WutheringWaves', ''),
-            ('Snowbreak', 'Snowbreak', ''),
-            ('GF2', 'GF2', ''),
-            ('UMA', 'UMA', ''),
-            ('Sio', 'Sio', ''),
-            ('idol', 'idol', ''),
-            ('Chunli', 'Chunli', ''),
-        ],
-        default='StandardRename'
+        description="选择重命名预设（映射文件中的 [段落] 会自动加入列表）",
+        items=rename_preset_items
     )
     file_path: StringProperty(
         name="映射文件",
@@ -4142,18 +7961,10 @@ class BONE_OT_rename_primary_bones(Operator):
                     break
         return meshes
 
-    def _find_name_case_insensitive(self, candidates, name):
-        name_lower = name.lower()
-        for c in candidates:
-            if c.name.lower() == name_lower:
-                return c
-        return None
-
     def execute(self, context):
-        import re
-        # 一键硬编码重命名（不读取任何外部文件）
-        case_sensitive = False
-        merge_vertex_groups = True
+        settings = context.scene.rename_primary_settings
+        case_sensitive = settings.case_sensitive
+        merge_vertex_groups = settings.merge_vertex_groups
 
         arm = self._get_armature(context)
         if arm is None:
@@ -4175,133 +7986,73 @@ class BONE_OT_rename_primary_bones(Operator):
         except Exception as e:
             self.report({'WARNING'}, f"重命名骨架到 Armature 失败: {str(e)}")
 
-        # 硬编码主体骨映射（覆盖从脚趾到手指所有部分）
-        pairs = [
-            # 参考自 StandardRename 的标准目标名称
-            ("Shoulder_R","Right shoulder"),("RightShoulder","Right shoulder"),("UpperArm_R","Right arm"),("RightUpperArm","Right arm"),("LowerArm_R","Right_elbow"),("RightLowerArm","Right_elbow"),("RightHand","Right wrist"),("Hand_R","Right wrist"),("RightUpperLeg","Right leg"),("UpperLeg_R","Right leg"),("RightLowerLeg","Right knee"),("LowerLeg_R","Right knee"),("RightFoot","Right_ankle"),("Foot_R","Right_ankle"),("RightToeBase","Right toe"),("Toe_R","Right toe"),
-            ("IndexProximal_R","IndexFinger1_R"),("RightIndexProximal","IndexFinger1_R"),("IndexIntermediate_R","IndexFinger2_R"),("RightIndexIntermediate","IndexFinger2_R"),("IndexDistal_R","IndexFinger3_R"),("RightIndexDistal","IndexFinger3_R"),
-            ("LittleProximal_R","LittleFinger1_R"),("RightLittleProximal","LittleFinger1_R"),("LittleIntermediate_R","LittleFinger2_R"),("RightLittleIntermediate","LittleFinger2_R"),("LittleDistal_R","LittleFinger3_R"),("RightLittleDistal","LittleFinger3_R"),
-            ("MiddleProximal_R","MiddleFinger1_R"),("RightMiddleProximal","MiddleFinger1_R"),("MiddleIntermediate_R","MiddleFinger2_R"),("RightMiddleIntermediate","MiddleFinger2_R"),("MiddleDistal_R","MiddleFinger3_R"),("RightMiddleDistal","MiddleFinger3_R"),
-            ("RingProximal_R","RingFinger1_R"),("RightRingProximal","RingFinger1_R"),("RingIntermediate_R","RingFinger2_R"),("RightRingIntermediate","RingFinger2_R"),("RingDistal_R","RingFinger3_R"),("RightRingDistal","RingFinger3_R"),
-            ("ThumbProximal_R","Thumb0_R"),("RightThumbProximal","Thumb0_R"),("ThumbIntermediate_R","Thumb1_R"),("RightThumbIntermediate","Thumb1_R"),("ThumbDistal_R","Thumb2_R"),("RightThumbDistal","Thumb2_R"),
-            ("Shoulder_L","Left shoulder"),("LeftShoulder","Left shoulder"),("UpperArm_L","Left arm"),("LeftUpperArm","Left arm"),("LowerArm_L","Left_elbow"),("LeftLowerArm","Left_elbow"),("LeftHand","Left wrist"),("Hand_L","Left wrist"),("LeftUpperLeg","Left leg"),("UpperLeg_L","Left leg"),("LeftLowerLeg","Left knee"),("LowerLeg_L","Left knee"),("LeftFoot","Left_ankle"),("Foot_L","Left_ankle"),("LeftToeBase","Left toe"),("Toe_L","Left toe"),
-            ("IndexProximal_L","IndexFinger1_L"),("LeftIndexProximal","IndexFinger1_L"),("IndexIntermediate_L","IndexFinger2_L"),("LeftIndexIntermediate","IndexFinger2_L"),("IndexDistal_L","IndexFinger3_L"),("LeftIndexDistal","IndexFinger3_L"),
-            ("LittleProximal_L","LittleFinger1_L"),("LeftLittleProximal","LittleFinger1_L"),("LittleIntermediate_L","LittleFinger2_L"),("LeftLittleIntermediate","LittleFinger2_L"),("LittleDistal_L","LittleFinger3_L"),("LeftLittleDistal","LittleFinger3_L"),
-            ("MiddleProximal_L","MiddleFinger1_L"),("LeftMiddleProximal","MiddleFinger1_L"),("MiddleIntermediate_L","MiddleFinger2_L"),("LeftMiddleIntermediate","MiddleFinger2_L"),("MiddleDistal_L","MiddleFinger3_L"),("LeftMiddleDistal","MiddleFinger3_L"),
-            ("RingProximal_L","RingFinger1_L"),("LeftRingProximal","RingFinger1_L"),("RingIntermediate_L","RingFinger2_L"),("LeftRingIntermediate","RingFinger2_L"),("RingDistal_L","RingFinger3_L"),("LeftRingDistal","RingFinger3_L"),
-            ("ThumbProximal_L","Thumb0_L"),("LeftThumbProximal","Thumb0_L"),("ThumbIntermediate_L","Thumb1_L"),("LeftThumbIntermediate","Thumb1_L"),("ThumbDistal_L","Thumb2_L"),("LeftThumbDistal","Thumb2_L"),
-            ("Hips","Hips"),("Spine","Spine"),("Chest","Chest"),("Neck","Neck"),("Head","Head"),
-
-            # 结合骨骼日志中的 MMD 命名（主体肢体）
-            ("Shoulder_L","Left shoulder"),("Shoulder_R","Right shoulder"),
-            ("Arm_L","Left arm"),("Arm_R","Right arm"),
-            ("Elbow_L","Left_elbow"),("Elbow_R","Right_elbow"),
-            ("Wrist_L","Left wrist"),("Wrist_R","Right wrist"),
-            ("Leg_L","Left leg"),("Leg_R","Right leg"),
-            ("Knee_L","Left knee"),("Knee_R","Right knee"),
-            ("Ankle_L","Left_ankle"),("Ankle_R","Right_ankle"),
-            ("ToeTip_L","Left toe"),("ToeTip_R","Right toe"),
-
-            # 常见主体节点：按你的要求调整
-            ("Waist","Hips"),
-            ("UpperBody","Spine"),("Upperbody","Spine"),
-            ("UpperBody2","Spine2"),("Upperbody2","Spine2"),("Upperboody2","Spine2"),
-            ("UpperBody3","Chest"),("Upperbody3","Chest"),
-        ]
-
-        # 统一大小写匹配
-        current_names = {pb.name for pb in arm.pose.bones}
-        rename_count = 0
-        miss_bones = 0
-        mapped_old_names = set()
-
-        for old_name, new_name in pairs:
-            pb = arm.pose.bones.get(old_name)
-            if pb is None and not case_sensitive:
-                pb = self._find_name_case_insensitive(arm.pose.bones, old_name)
-            if pb is None:
-                miss_bones += 1
-                continue
-
-            source_name_for_vg = pb.name
-            mapped_old_names.add(old_name)
-
-            if pb.name != new_name:
-                try:
-                    pb.name = new_name
-                except Exception as e:
-                    self.report({'WARNING'}, f"重命名骨骼 {old_name} -> {new_name} 失败: {str(e)}")
-                    continue
-
-            if merge_vertex_groups:
-                for obj in meshes:
-                    vg_old = obj.vertex_groups.get(source_name_for_vg)
-                    if vg_old is None and not case_sensitive:
-                        for vg in obj.vertex_groups:
-                            if vg.name.lower() == source_name_for_vg.lower():
-                                vg_old = vg
-                                break
-                    if vg_old is None:
-                        continue
-
-                    # 如果目标名与源名一致，跳过同步，避免误删顶点组
-                    if new_name == source_name_for_vg:
-                        continue
-
-                    vg_new = obj.vertex_groups.get(new_name)
-                    if vg_new is None:
-                        try:
-                            vg_old.name = new_name
-                            # 重命名成功，无需新建或移除
-                            continue
-                        except Exception:
-                            vg_new = obj.vertex_groups.new(name=new_name)
-                            for v in obj.data.vertices:
-                                try:
-                                    w = vg_old.weight(v.index)
-                                except RuntimeError:
-                                    w = 0.0
-                                if w > 0.0:
-                                    vg_new.add([v.index], w, 'REPLACE')
-                            obj.vertex_groups.remove(vg_old)
-                    else:
-                        # 已存在不同名称的目标组，合并权重后移除旧组
-                        if vg_new is vg_old:
-                            # 同一个组（保护性判断），无需处理
-                            continue
-                        for v in obj.data.vertices:
-                            try:
-                                w_old = vg_old.weight(v.index)
-                            except RuntimeError:
-                                w_old = 0.0
-                            if w_old > 0.0:
-                                try:
-                                    w_new = vg_new.weight(v.index)
-                                except RuntimeError:
-                                    w_new = 0.0
-                                w_final = min(1.0, w_new + w_old)
-                                vg_new.add([v.index], w_final, 'REPLACE')
-                        obj.vertex_groups.remove(vg_old)
-
-            rename_count += 1
+        # 优先使用映射文件中的同名预设，否则使用内置映射
+        presets = load_rename_presets(bpy.path.abspath(settings.file_path))
+        pairs = presets.get(settings.preset)
+        source_label = f"映射文件预设 {settings.preset}"
+        if not pairs:
+            pairs = PRIMARY_BONE_RENAME_PAIRS
+            source_label = "内置 MMD 映射"
+
+        current_names = [pb.name for pb in arm.pose.bones]
+        plan = resolve_rename_plan(current_names, pairs, case_sensitive)
+        for cycle in plan.cycles:
+            print(f"检测到循环重命名: {' -> '.join(cycle + cycle[:1])}")
+        for src, dst in plan.folds.items():
+            print(f"目标名 {dst} 已被占用，{src} 仅合并顶点组权重")
+
+        rename_count, folded_groups = apply_rename_plan(arm, meshes, plan, case_sensitive, merge_vertex_groups)
+        for src, dst in plan.renames.items():
             try:
-                log_bone_operation(context, "Rename", f"{old_name} -> {new_name} on {arm.name} [Hardcoded]")
+                log_bone_operation(context, "Rename", f"{src} -> {dst} on {arm.name} [{source_label}]")
             except Exception:
                 pass
 
         # 检测主体骨中可能缺失的映射（关键词），排除应在合并阶段处理的节点
         major_keywords = re.compile(r"(shoulder|upperarm|lowerarm|arm|elbow|hand|wrist|thigh|calf|leg|knee|foot|ankle|toe|hips|pelvis|waist|upperbody|spine|chest|neck|head)", re.I)
         ignore_primary_names = {"center","groove","lowerbody"}
-        unknown_primary_bones = [n for n in current_names if major_keywords.search(n) and n.lower() not in ignore_primary_names and n not in mapped_old_names]
+        unknown_primary_bones = [n for n in current_names if major_keywords.search(n) and n.lower() not in ignore_primary_names and n not in plan.matched]
         if unknown_primary_bones:
             try:
                 log_bone_operation(context, "MissingMapping", f"未覆盖主体骨: {', '.join(sorted(unknown_primary_bones))}")
             except Exception:
                 pass
             preview_list = ", ".join(sorted(unknown_primary_bones[:8]))
-            self.report({'WARNING'}, f"存在未在硬编码映射覆盖的主体骨：{preview_list} …")
+            self.report({'WARNING'}, f"存在未在映射中覆盖的主体骨：{preview_list} …")
+
+        self.report({'INFO'}, f"重命名完成：{rename_count} 成功, {len(plan.folds)} 合并, {plan.missing} 未找到, "
+                              f"合并顶点组 {folded_groups} 个；使用{source_label}")
+        log_writer.flush()
+        return {'FINISHED'}
+
+class BONE_OT_export_rename_preset(Operator):
+    bl_idname = "bone.export_rename_preset"
+    bl_label = "写入内置映射"
+    bl_description = "将内置映射作为当前预设写入映射文件，便于在此基础上为其它游戏添加预设"
+    bl_options = {'REGISTER'}
 
-        self.report({'INFO'}, f"重命名完成：{rename_count} 成功, {miss_bones} 未找到；使用硬编码 MMD 映射")
+    def execute(self, context):
+        settings = context.scene.rename_primary_settings
+        path = bpy.path.abspath(settings.file_path)
+        if not path:
+            self.report({'ERROR'}, "请先设置映射文件路径")
+            return {'CANCELLED'}
+        if settings.preset in load_rename_presets(path):
+            self.report({'WARNING'}, f"映射文件中已存在预设 [{settings.preset}]")
+            return {'CANCELLED'}
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f"\n[{settings.preset}]\n")
+                seen = set()
+                for old_name, new_name in PRIMARY_BONE_RENAME_PAIRS:
+                    if old_name not in seen:
+                        seen.add(old_name)
+                        f.write(f"{old_name} = {new_name}\n")
+        except OSError as e:
+            self.report({'ERROR'}, f"写入映射文件失败: {str(e)}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"已写入预设 [{settings.preset}] 到 {path}")
         return {'FINISHED'}
 
 class MQT_PT_BoneToolsPanel(Panel):
@@ -4345,6 +8096,7 @@ class MQT_PT_BoneToolsPanel(Panel):
         row = box.row()
         # 使用修改后的 bl_idname
         row.operator("object.gfl2_preprocess", text="少前2模型一键预处理") # 按钮文本可以保持不变或同步修改
+        row.operator_menu_enum("object.gfl2_preprocess", "stage", text="", icon='DOWNARROW_HLT')
         
         # 清理工具
         box = layout.box()
@@ -4372,6 +8124,16 @@ class MQT_PT_BoneToolsPanel(Panel):
         box = layout.box()
         box.label(text="命名工具")
         row = box.row()
+        rename_settings = context.scene.rename_primary_settings
+        col = box.column(align=True)
+        col.prop(rename_settings, "preset")
+        row = col.row(align=True)
+        row.prop(rename_settings, "file_path", text="")
+        row.operator("bone.export_rename_preset", text="", icon='EXPORT')
+        row = col.row(align=True)
+        row.prop(rename_settings, "case_sensitive")
+        row.prop(rename_settings, "merge_vertex_groups")
+        row = box.row()
         row.operator("bone.rename_primary_bones", text="主体骨骼一键重命名")
         
         # 检查是否选择了骨架来启用按钮（而不是检查模式）
@@ -5010,6 +8772,101 @@ def _link_textures_to_principled(nodes, links, principled_node, diffuse_tex, rmo
         principled_node.inputs["Metallic"].default_value = 0.0
 
 
+# Alpha 检测：文件头判断 → 向量化像素检查，结果按 (文件路径, 修改时间) 缓存
+ALPHA_OPAQUE_THRESHOLD = 0.999
+_alpha_cache: Dict[tuple, bool] = {}
+
+def _png_alpha_hint(f) -> Optional[bool]:
+    """PNG：带 Alpha 的颜色类型需要解码确认；其余类型只有存在 tRNS 块时才可能透明"""
+    header = f.read(33)
+    if len(header) < 33 or header[12:16] != b'IHDR':
+        return None
+    color_type = header[25]
+    if color_type in (4, 6):
+        return None
+    # 在 IDAT 之前查找 tRNS
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return False
+        length, chunk_type = struct.unpack('>I4s', chunk)
+        if chunk_type == b'tRNS':
+            return None
+        if chunk_type in (b'IDAT', b'IEND'):
+            return False
+        f.seek(length + 4, os.SEEK_CUR)
+
+def _tga_alpha_hint(header: bytes) -> Optional[bool]:
+    """TGA：24 位及以下没有 Alpha；32 位或描述符声明了 Alpha 位时需要解码"""
+    if len(header) < 18:
+        return None
+    depth, alpha_bits = header[16], header[17] & 0x0F
+    if depth == 32 or alpha_bits:
+        return None
+    return False
+
+def _dds_alpha_hint(header: bytes) -> Optional[bool]:
+    """DDS：未压缩格式看 DDPF_ALPHAPIXELS，单/双通道的法线压缩格式没有 Alpha，其余需要解码"""
+    if len(header) < 108 or header[:4] != b'DDS ':
+        return None
+    flags, fourcc = struct.unpack_from('<I4s', header, 80)
+    if flags & 0x4:   # DDPF_FOURCC
+        if fourcc in (b'ATI1', b'ATI2', b'BC4U', b'BC4S', b'BC5U', b'BC5S'):
+            return False
+        return None
+    return None if flags & 0x1 else False
+
+def file_alpha_hint(path: str) -> Optional[bool]:
+    """只读文件头判断是否可能含 Alpha：False 表示肯定不透明，None 表示需要解码像素确认"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jpg', '.jpeg'):
+        return False
+    try:
+        with open(path, 'rb') as f:
+            if ext == '.png':
+                return _png_alpha_hint(f)
+            if ext == '.tga':
+                return _tga_alpha_hint(f.read(18))
+            if ext == '.dds':
+                return _dds_alpha_hint(f.read(128))
+    except OSError:
+        pass
+    return None
+
+def image_has_alpha(image) -> bool:
+    """图像是否有非不透明的 Alpha（任意像素 Alpha < 0.999）
+
+    先用文件头排除肯定不透明的贴图；需要解码时用 foreach_get 把像素读入预分配的 float32 缓冲区（用完即释放），
+    再对 Alpha 通道取最小值。有文件的图像按 (路径, 修改时间) 缓存，共享贴图只分析一次。
+    """
+    if image.channels != 4:
+        return False
+    key = None
+    path = bpy.path.abspath(image.filepath) if image.filepath and image.packed_file is None else ""
+    if path:
+        try:
+            key = (os.path.normpath(path), os.path.getmtime(path))
+        except OSError:
+            key = None
+    if key is not None:
+        cached = _alpha_cache.get(key)
+        if cached is not None:
+            return cached
+        if file_alpha_hint(path) is False:
+            _alpha_cache[key] = False
+            return False
+
+    width, height = image.size
+    count = width * height * image.channels
+    if count == 0:
+        return False
+    buffer = np.empty(count, dtype=np.float32)
+    image.pixels.foreach_get(buffer)
+    result = bool(buffer[3::image.channels].min() < ALPHA_OPAQUE_THRESHOLD)
+    if key is not None:
+        _alpha_cache[key] = result
+    return result
+
 def _handle_alpha_channel(mat, links, principled_node, diffuse_tex):
     """处理Alpha通道连接和材质设置 (使用像素检查)"""
     logger = logging.getLogger('pbr_materials') # Get logger instance
@@ -5031,45 +8888,12 @@ def _handle_alpha_channel(mat, links, principled_node, diffuse_tex):
     logger.info(f"  - 检查 Alpha for Node: {diffuse_tex.name}, Image: {image.name}")
     has_meaningful_alpha = False # Renamed variable for clarity
 
-    # 首先，检查基本条件：必须有4个通道才可能包含Alpha
+    # 文件头判断 + 向量化像素检查（带缓存）
     if image.channels == 4:
-        logger.info(f"    - 图像有 {image.channels} 个通道，开始像素检查...")
         try:
-            # 确保像素数据已加载 (如果图像很大或未完全加载，这步可能会耗时)
-            start_load_time = time.time()
-            # Accessing pixels implicitly loads them if needed
-            pixels = image.pixels[:] # Use slicing to ensure we get a copy, might help with large images
-            load_time = time.time() - start_load_time
-            if load_time > 0.1: # Log if loading took noticeable time
-                 logger.info(f"    - 加载/访问像素耗时: {load_time:.4f} 秒")
-
-            pixel_count = len(pixels) // image.channels # 计算像素总数
-
-            # 检查 Alpha 值 (索引 3, 7, 11, ...)
-            # Limit check for performance? For now, check all.
-            check_limit = pixel_count # 检查所有像素
-            # check_limit = min(pixel_count, 100000) # Example: Limit check
-
-            logger.info(f"    - 准备检查 {check_limit} / {pixel_count} 个像素的 Alpha 值...")
             start_check_time = time.time()
-            alpha_step = image.channels # Step should be number of channels
-
-            for i in range(0, check_limit * alpha_step, alpha_step):
-                alpha_index = i + 3 # Alpha is the 4th channel (index 3)
-                if pixels[alpha_index] < 0.999: # Use a threshold for float comparison
-                    has_meaningful_alpha = True
-                    logger.info(f"    - 在像素 {i // alpha_step} 发现非不透明 Alpha 值: {pixels[alpha_index]:.4f}")
-                    break # 找到一个就足够了
-
-            end_check_time = time.time()
-            logger.info(f"    - 像素检查耗时: {end_check_time - start_check_time:.4f} 秒")
-
-            if not has_meaningful_alpha:
-                logger.info("    - 所有检查过的像素 Alpha 值均接近 1.0")
-
-        except IndexError as idx_err:
-             logger.error(f"    - 检查像素时发生索引错误 (可能图像数据不完整?): {idx_err}")
-             has_meaningful_alpha = False # Assume no alpha on error
+            has_meaningful_alpha = image_has_alpha(image)
+            logger.info(f"    - Alpha 检查结果: {'存在非不透明像素' if has_meaningful_alpha else '完全不透明'}，耗时 {time.time() - start_check_time:.4f} 秒")
         except MemoryError as mem_err:
              logger.error(f"    - 检查像素时发生内存错误 (图像可能过大): {mem_err}")
              logger.info(f"    - 跳过 Alpha 像素检查 for {image.name}")
@@ -5131,14 +8955,15 @@ class AUTO_OT_create_pbr_materials(Operator):
 
     @classmethod
     def poll(cls, context):
-        """检查是否可以执行操作"""
+        """检查是否可以执行操作（材质扫描和文件检查都走面板缓存）"""
         # 检查是否有eyenewadd或eyenewmul材质
-        has_eye_materials = False
-        for mat in bpy.data.materials:
-            mat_name_lower = mat.name.lower()
-            if 'eyenewadd' in mat_name_lower or 'eyenewmul' in mat_name_lower:
-                has_eye_materials = True
-                break
+        def find_eye_materials():
+            for mat in bpy.data.materials:
+                mat_name_lower = mat.name.lower()
+                if 'eyenewadd' in mat_name_lower or 'eyenewmul' in mat_name_lower:
+                    return True
+            return False
+        has_eye_materials = draw_cache.get('materials', ("eye_materials", len(bpy.data.materials)), find_eye_materials)
         
         # 如果有eye材质，检查是否指定了eyeblend贴图
         if has_eye_materials:
@@ -5147,7 +8972,7 @@ class AUTO_OT_create_pbr_materials(Operator):
                 return False
             # 检查文件是否存在
             eyeblend_path = bpy.path.abspath(pbr_settings.eyeblend_texture_path)
-            if not os.path.exists(eyeblend_path):
+            if not draw_cache.file_exists(eyeblend_path):
                 return False
         
         return True
@@ -5177,7 +9002,16 @@ class AUTO_OT_create_pbr_materials(Operator):
             # 1. 清理旧节点，保留必要的节点
             logger.info("  - 清理旧节点...")
             remove_normals = (processing_mode == 'BASE_ALPHA')
+            tracker = getattr(self, "_tracker", None)
+            if tracker is not None:
+                # 记录旧节点引用的贴图/节点组，替换后变为孤立的会被释放
+                tracker.track_node_tree(mat.node_tree)
             existing_output, existing_bsdf, existing_normal_map, existing_normal_texture = _cleanup_material_nodes(nodes, links, remove_normal_nodes=remove_normals)
+            if tracker is not None:
+                # 立即释放，避免新贴图按材质名重命名时得到 .001 后缀
+                freed = tracker.free()
+                if freed:
+                    logger.info(f"    - 释放了 {freed} 个被替换的数据块")
             logger.info(f"    - 保留节点: Output={existing_output}, BSDF={existing_bsdf}, NormalMap={existing_normal_map}, NormalTexture={existing_normal_texture}")
             if remove_normals:
                 logger.info("    - BASE_ALPHA模式: 已删除法向相关节点")
@@ -5468,6 +9302,8 @@ class AUTO_OT_create_pbr_materials(Operator):
 
         # 从场景属性获取所有设置
         clean_data = context.scene.pbr_clean_data
+        global_purge = context.scene.pbr_global_purge
+        self._tracker = DatablockTracker() if clean_data else None
         skinuber_cloth_type = context.scene.pbr_skinuber_cloth_type
         cloth2double_cloth_type = context.scene.pbr_cloth2double_cloth_type
         silkstock_cloth_type = context.scene.pbr_silkstock_cloth_type
@@ -5493,6 +9329,7 @@ class AUTO_OT_create_pbr_materials(Operator):
         logger.info(f"创建独立数据块: {clean_data}")
         logger.info(f"复制纹理到外部: {copy_textures_externally}")
         logger.info(f"清理未使用数据: {clean_data}")
+        logger.info(f"全局清理孤立数据: {global_purge}")
         logger.info(f"Skinuber贴图类型: {skinuber_cloth_type}")
         logger.info(f"Cloth2Double贴图类型: {cloth2double_cloth_type}")
         logger.info(f"Silkstock贴图类型: {silkstock_cloth_type}")
@@ -5500,12 +9337,22 @@ class AUTO_OT_create_pbr_materials(Operator):
         logger.info("=" * 50)
 
         # 1. 清理未使用数据 (可选)
-        if clean_data:
-            logger.info("开始清理未使用数据")
+        if global_purge:
+            logger.info("开始全局清理孤立数据")
+            try:
+                purge_all_orphans()
+                logger.info("已执行全局孤立数据清理")
+            except Exception as clean_err:
+                 logger.error(f"全局清理数据时出错: {clean_err}")
+        elif clean_data:
+            # 只释放与场景材质同名的孤立贴图（上次运行遗留），它们会让新贴图得到 .001 后缀
+            logger.info("开始清理与材质同名的孤立贴图")
+            material_names = {mat.name for mat in bpy.data.materials}
+            for img in bpy.data.images:
+                if img.users == 0 and (img.name in material_names or img.name.rsplit('.', 1)[0] in material_names):
+                    self._tracker.track(img)
             try:
-                bpy.ops.outliner.orphans_purge(do_recursive=True)
-                bpy.ops.outliner.orphans_purge(do_recursive=True) # Run twice for good measure
-                logger.info("已执行孤立数据清理")
+                logger.info(f"已释放 {self._tracker.free()} 个孤立贴图")
             except Exception as clean_err:
                  logger.error(f"清理数据时出错: {clean_err}")
             logger.info("清理数据结束")
@@ -5897,18 +9744,21 @@ class AUTO_OT_create_pbr_materials(Operator):
         logger.info("=" * 50)
 
         # --- 新的清理位置：在所有处理完成后执行 ---
-        if clean_data:
+        if clean_data or global_purge:
             logger.info("开始清理未使用数据 (最终)")
             try:
                 # 确保在 Object 模式下执行清理
                 if bpy.context.mode != 'OBJECT':
                     bpy.ops.object.mode_set(mode='OBJECT')
-                bpy.ops.outliner.orphans_purge(do_recursive=True)
-                bpy.ops.outliner.orphans_purge(do_recursive=True) # 多执行一次确保清理干净
-                logger.info("已执行最终孤立数据清理")
+                if self._tracker is not None:
+                    logger.info(f"已释放 {self._tracker.free()} 个本次替换下来的数据块")
+                if global_purge:
+                    purge_all_orphans()
+                    logger.info("已执行最终全局孤立数据清理")
             except Exception as clean_err:
                  logger.error(f"最终清理数据时出错: {clean_err}")
             logger.info("最终清理数据结束")
+        self._tracker = None
 
         return {'FINISHED'}
 
@@ -5946,6 +9796,7 @@ class MQT_PT_PBRMaterialPanel(Panel):
         props.label(text="内部设置:")
         # Removed output directory setting
         props.prop(context.scene, "pbr_clean_data")
+        props.prop(context.scene, "pbr_global_purge")
         props.prop(context.scene, "pbr_skinuber_cloth_type", text="Skinuber贴图类型")
         props.prop(context.scene, "pbr_cloth2double_cloth_type", text="Cloth2Double贴图类型")
         props.prop(context.scene, "pbr_silkstock_cloth_type", text="Silkstock贴图类型")
@@ -6020,110 +9871,184 @@ class MeshWeightToolsSettings(PropertyGroup):
         step=0.001,
         precision=3 # For better display of small numbers
     )
+    histogram_bins: IntProperty(
+        name="分布区间数",
+        description="权重分布直方图在 0 ~ 阈值上限 之间划分的区间数量",
+        default=10,
+        min=2,
+        max=50
+    )
+
+# 每个对象最近一次统计的权重分布 {对象名: {"edges": [...], "counts": [...], "above": int, "total": int}}
+_zero_weight_histograms: Dict[str, dict] = {}
+
+
+def _max_per_segment(counts: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """按每个顶点的权重数量把展平的权重分段，用 np.maximum.reduceat 一次求出每段最大值（空段为 0）"""
+    result = np.zeros(len(counts), dtype=np.float32)
+    nonempty = counts > 0
+    if len(weights):
+        starts = np.cumsum(counts) - counts
+        result[nonempty] = np.maximum.reduceat(weights, starts[nonempty])
+    return result
+
+
+def _max_vertex_weights(obj, bm=None):
+    """返回每个顶点的最大权重 (float32 数组)
+
+    编辑模式下传入 bmesh，直接读取 deform 层；物体模式下读取网格顶点的 groups。
+    顶点组权重没有 foreach_get 批量接口，只能逐个元素读取：这里先把权重展平为一个数组，
+    再用 np.maximum.reduceat 一次完成求最大值，逐元素的读取本身仍在 Python 中进行。
+    """
+    if bm is not None:
+        count = len(bm.verts)
+        deform_layer = bm.verts.layers.deform.active
+        if deform_layer is None or not obj.vertex_groups:
+            return np.zeros(count, dtype=np.float32)
+        counts = np.fromiter((len(v[deform_layer]) for v in bm.verts), dtype=np.int64, count=count)
+        weights = np.fromiter((w for v in bm.verts for w in v[deform_layer].values()),
+                              dtype=np.float32, count=int(counts.sum()))
+        return _max_per_segment(counts, weights)
+
+    mesh = obj.data
+    count = len(mesh.vertices)
+    if not obj.vertex_groups:
+        return np.zeros(count, dtype=np.float32)
+    counts = np.fromiter((len(v.groups) for v in mesh.vertices), dtype=np.int64, count=count)
+    weights = np.fromiter((g.weight for v in mesh.vertices for g in v.groups),
+                          dtype=np.float32, count=int(counts.sum()))
+    return _max_per_segment(counts, weights)
+
+
+def _apply_vertex_hide_to_mesh(mesh, vert_hide):
+    """物体模式：使用 foreach_set 批量写入顶点/边/面的隐藏状态"""
+    mesh.vertices.foreach_set("hide", vert_hide)
+
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    edge_hide = vert_hide[edge_verts].reshape(-1, 2).all(axis=1)
+    mesh.edges.foreach_set("hide", edge_hide)
+
+    if len(mesh.polygons):
+        loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_verts)
+        loop_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        face_hide = np.logical_and.reduceat(vert_hide[loop_verts], loop_starts)
+        mesh.polygons.foreach_set("hide", face_hide)
+    mesh.update()
+
+
+def _apply_vertex_hide_to_bmesh(bm, vert_hide):
+    """编辑模式：直接写入 bmesh 的隐藏状态（编辑网格没有批量接口）"""
+    for v, hide in zip(bm.verts, vert_hide.tolist()):
+        v.hide = hide
+        if hide:
+            v.select = False
+    for e in bm.edges:
+        e.hide = e.verts[0].hide and e.verts[1].hide
+        if e.hide:
+            e.select = False
+    for f in bm.faces:
+        f.hide = all(v.hide for v in f.verts)
+        if f.hide:
+            f.select = False
+
+
+def isolate_zero_weight(context, obj, threshold):
+    """隐藏权重大于阈值的顶点，只显示零权重部分。返回 (隐藏数, 显示数)"""
+    mesh = obj.data
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        vert_hide = _max_vertex_weights(obj, bm) > threshold
+        _apply_vertex_hide_to_bmesh(bm, vert_hide)
+        bmesh.update_edit_mesh(mesh, loop_triangles=False, destructive=False)
+    else:
+        vert_hide = _max_vertex_weights(obj) > threshold
+        _apply_vertex_hide_to_mesh(mesh, vert_hide)
+
+    hidden = int(np.count_nonzero(vert_hide))
+    return hidden, len(vert_hide) - hidden
+
+
+def compute_zero_weight_histogram(obj, upper, bins):
+    """统计 0 ~ upper 之间每个区间内的顶点数（按顶点最大权重）"""
+    if obj.mode == 'EDIT':
+        weights = _max_vertex_weights(obj, bmesh.from_edit_mesh(obj.data))
+    else:
+        weights = _max_vertex_weights(obj)
+    edges = np.linspace(0.0, upper, bins + 1)
+    counts, _ = np.histogram(weights[weights <= upper], bins=edges)
+    return {
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        "above": int(np.count_nonzero(weights > upper)),
+        "total": len(weights),
+    }
+
+
+def _active_weight_mesh(context):
+    obj = context.active_object
+    if obj is not None and obj.type == 'MESH' and context.mode in {'EDIT_MESH', 'OBJECT'}:
+        return obj
+    return None
+
 
 class MESH_OT_isolate_zero_weight_meshes(Operator):
     bl_idname = "mesh.isolate_zero_weight"
     bl_label = "隔离零权重网格"
-    bl_description = "在编辑模式下隐藏非零权重网格，显示零权重网格。基于可调阈值。"
+    bl_description = "隐藏非零权重网格，显示零权重网格。基于可调阈值，编辑模式下无需切换模式"
     bl_options = {'REGISTER', 'UNDO'}
 
     @classmethod
     def poll(cls, context):
-        return context.mode == 'EDIT_MESH' and context.active_object is not None and context.active_object.type == 'MESH'
+        return _active_weight_mesh(context) is not None
 
     def execute(self, context):
-        # print("--- MESH_OT_isolate_zero_weight_meshes EXECUTE (Vertex-Level Hide) ---")
-        settings = context.scene.mq_mesh_weight_settings
-        threshold = settings.zero_weight_threshold
-        # print(f"Threshold: {threshold:.4f}")
-
-        if not (context.active_object and context.active_object.type == 'MESH' and context.mode == 'EDIT_MESH'):
-            self.report({'WARNING'}, "请先在编辑模式下选择一个网格对象")
-            # print("No active mesh object in edit mode.")
+        obj = _active_weight_mesh(context)
+        if obj is None:
+            self.report({'WARNING'}, "请先选择一个网格对象")
             return {'CANCELLED'}
 
-        obj = context.active_object
-        # print(f"Processing object: {obj.name}")
-
-        bpy.ops.object.mode_set(mode='OBJECT')
-        # print(f"  Switched to OBJECT mode for object '{obj.name}'.")
-
-        bm = bmesh.new()
-        bm.from_mesh(obj.data)
-        bm.verts.ensure_lookup_table()
-        bm.edges.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
+        threshold = context.scene.mq_mesh_weight_settings.zero_weight_threshold
+        hidden, shown = isolate_zero_weight(context, obj, threshold)
+        self.report({'INFO'}, f"网格 '{obj.name}': {hidden} 个顶点被隐藏, {shown} 个顶点保持可见.")
+        return {'FINISHED'}
 
-        # print(f"  Created bmesh with {len(bm.verts)} verts, {len(bm.edges)} edges, {len(bm.faces)} faces.")
+class MESH_OT_zero_weight_histogram(Operator):
+    bl_idname = "mesh.zero_weight_histogram"
+    bl_label = "统计权重分布"
+    bl_description = "统计活动网格每个顶点最大权重的分布，用于挑选阈值"
+    bl_options = {'REGISTER'}
 
-        verts_hidden_count = 0
-        verts_shown_count = 0
+    @classmethod
+    def poll(cls, context):
+        return _active_weight_mesh(context) is not None
 
-        if not obj.vertex_groups:
-            # print(f"  Object '{obj.name}' has NO vertex groups. All vertices will be SHOWN.")
-            for v_bm in bm.verts:
-                v_bm.hide = False
-                verts_shown_count +=1
-        else:
-            # print(f"  Object '{obj.name}' HAS {len(obj.vertex_groups)} vertex group(s). Checking weights...")
-            for v_bm in bm.verts:
-                v_idx = v_bm.index
-                vertex_has_significant_weight = False
-                
-                for vg in obj.vertex_groups:
-                    try:
-                        weight = vg.weight(v_idx)
-                        if weight > threshold:
-                            vertex_has_significant_weight = True
-                            break
-                    except RuntimeError:
-                        continue
-                    except IndexError:
-                        # print(f"    IndexError for v_idx {v_idx} in group '{vg.name}'. Skipping group for this vertex.")
-                        continue
-                
-                if vertex_has_significant_weight:
-                    v_bm.hide = True
-                    verts_hidden_count += 1
-                else:
-                    v_bm.hide = False
-                    verts_shown_count += 1
-        
-        # print(f"  Vertex processing complete: Hidden={verts_hidden_count}, Shown={verts_shown_count}")
+    def execute(self, context):
+        obj = _active_weight_mesh(context)
+        settings = context.scene.mq_mesh_weight_settings
+        upper = MeshWeightToolsSettings.bl_rna.properties["zero_weight_threshold"].hard_max
+        _zero_weight_histograms[obj.name] = compute_zero_weight_histogram(obj, upper, settings.histogram_bins)
+        return {'FINISHED'}
 
-        edges_hidden_count = 0
-        for e_bm in bm.edges:
-            if all(v_edge.hide for v_edge in e_bm.verts):
-                e_bm.hide = True
-                edges_hidden_count +=1
-            else:
-                e_bm.hide = False
-        # print(f"  Edges updated: Hidden={edges_hidden_count}")
-
-        faces_hidden_count = 0
-        for f_bm in bm.faces:
-            if all(v_face.hide for v_face in f_bm.verts):
-                f_bm.hide = True
-                faces_hidden_count +=1
-            else:
-                f_bm.hide = False
-        # print(f"  Faces updated: Hidden={faces_hidden_count}")
+class MESH_OT_pick_zero_weight_threshold(Operator):
+    bl_idname = "mesh.pick_zero_weight_threshold"
+    bl_label = "使用此阈值"
+    bl_description = "将该区间上限设为阈值并立即隔离零权重网格"
+    bl_options = {'REGISTER', 'UNDO'}
 
-        bm.to_mesh(obj.data)
-        bm.free()
-        # print(f"  Bmesh data written back to '{obj.name}.data' and freed.")
+    threshold: FloatProperty(name="阈值", default=0.001, min=0.0, max=0.1, precision=3)
 
-        obj.data.update()
-        # print(f"  '{obj.name}.data.update()' called.")
+    @classmethod
+    def poll(cls, context):
+        return _active_weight_mesh(context) is not None
 
-        bpy.ops.object.select_all(action='DESELECT')
-        obj.select_set(True)
-        context.view_layer.objects.active = obj
-        bpy.ops.object.mode_set(mode='EDIT')
-        # print(f"  Switched back to EDIT mode for object '{obj.name}'.")
-        
-        self.report({'INFO'}, f"网格 '{obj.name}': {verts_hidden_count} 个顶点被隐藏, {verts_shown_count} 个顶点保持可见.")
-        # print("--- MESH_OT_isolate_zero_weight_meshes EXECUTE (Vertex-Level Hide) END ---")
+    def execute(self, context):
+        obj = _active_weight_mesh(context)
+        context.scene.mq_mesh_weight_settings.zero_weight_threshold = self.threshold
+        hidden, shown = isolate_zero_weight(context, obj, self.threshold)
+        self.report({'INFO'}, f"阈值 {self.threshold:.3f}: {hidden} 个顶点被隐藏, {shown} 个顶点保持可见.")
         return {'FINISHED'}
 
 class MQT_PT_MeshWeightDisplayPanel(Panel):
@@ -6143,6 +10068,30 @@ class MQT_PT_MeshWeightDisplayPanel(Panel):
             col = box.column(align=True)
             col.prop(settings, "zero_weight_threshold")
             col.operator(MESH_OT_isolate_zero_weight_meshes.bl_idname, text="隔离零权重网格", icon='FILTER')
+
+            # 权重分布直方图（只读取缓存结果，不在绘制时计算）
+            hist_box = layout.box()
+            row = hist_box.row(align=True)
+            row.prop(settings, "histogram_bins")
+            row.operator(MESH_OT_zero_weight_histogram.bl_idname, text="", icon='FILE_REFRESH')
+
+            obj = context.active_object
+            hist = _zero_weight_histograms.get(obj.name) if obj else None
+            if hist and hist["total"]:
+                hist_box.label(text=f"{obj.name}: 共 {hist['total']} 个顶点", icon='GROUP_VERTEX')
+                peak = max(max(hist["counts"]), 1)
+                cumulative = 0
+                edges = hist["edges"]
+                for i, count in enumerate(hist["counts"]):
+                    cumulative += count
+                    row = hist_box.row(align=True)
+                    row.label(text=f"≤{edges[i + 1]:.3f}")
+                    row.progress(factor=count / peak, type='BAR', text=str(count))
+                    op = row.operator(MESH_OT_pick_zero_weight_threshold.bl_idname, text=f"显示 {cumulative}")
+                    op.threshold = edges[i + 1]
+                hist_box.label(text=f"> {edges[-1]:.3f}: {hist['above']} 个顶点")
+            else:
+                hist_box.label(text="点击刷新统计权重分布", icon='INFO')
         else:
             layout.label(text="设置未加载，请尝试重新加载插件。")
 
@@ -6707,6 +10656,12 @@ class StaticGLBExportSettings(PropertyGroup):
         description="导出贴图文件",
         default=False
     )
+    
+    global_purge: BoolProperty(
+        name="全局清理孤立数据",
+        description="导出后额外清理文件中所有零用户数据块（临时副本的数据总会被释放）",
+        default=False
+    )
 
 class STATIC_OT_export_glb(Operator):
     """静态对象GLB2.0导出操作"""
@@ -6805,8 +10760,8 @@ class STATIC_OT_export_glb(Operator):
             # 清理临时对象并清空未使用数据
             if settings.apply_pose or settings.apply_shapekeys:
                 self.cleanup_temp_objects(temp_objects)
-                # 清空未使用的数据块
-                bpy.ops.outliner.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+            if settings.global_purge:
+                purge_all_orphans()
             
             # 恢复原始选择
             bpy.ops.object.select_all(action='DESELECT')
@@ -6857,6 +10812,7 @@ class STATIC_OT_export_glb(Operator):
         """创建对象的临时副本并应用修改器和形态键"""
         temp_objects = []
         self.original_objects = []  # 记录原始对象信息
+        self.temp_data = DatablockTracker()  # 记录临时网格，清理时只释放这些
         
         for obj in objects:
             if obj.type != 'MESH':
@@ -6868,6 +10824,7 @@ class STATIC_OT_export_glb(Operator):
             # 复制对象
             temp_obj = obj.copy()
             temp_obj.data = obj.data.copy()
+            self.temp_data.track(temp_obj.data)
             
             # 将原始名称给临时对象
             temp_obj.name = original_name
@@ -6967,6 +10924,11 @@ class STATIC_OT_export_glb(Operator):
             if obj.name in bpy.data.objects:
                 bpy.data.objects.remove(obj, do_unlink=True)
         
+        # 释放临时网格（形态键数据随网格一起删除）
+        if hasattr(self, 'temp_data'):
+            self.temp_data.free()
+            self.temp_data.clear()
+        
         # 恢复原始对象的可见性和名称
         if hasattr(self, 'original_objects'):
             for obj_info in self.original_objects:
@@ -7021,6 +10983,7 @@ class MQT_PT_StaticGLBExportPanel(Panel):
         process_box.label(text="处理选项:", icon='MODIFIER')
         process_box.prop(settings, "apply_pose", text="应用骨架姿态")
         process_box.prop(settings, "apply_shapekeys", text="应用形态键")
+        process_box.prop(settings, "global_purge", text="导出后全局清理孤立数据")
         
         # 导出选项
         export_box = layout.box()
@@ -7199,35 +11162,46 @@ class MQT_PT_Helldivers2Panel(Panel):
 # 面数排行榜（实时）
 # --------------------------------------------------------------------------
 
-FACE_COUNT_CACHE = []
-FACE_COUNT_CACHE_TIMESTAMP = 0.0
+def _face_count_settings_update(self, context):
+    """过滤条件变化时重新生成排行榜（计数本身仍然有效）"""
+    face_count_service.request_refresh(relist=True)
 
 class FaceCountSettings(bpy.types.PropertyGroup):
     include_hidden: bpy.props.BoolProperty(
         name="包含隐藏对象",
         description="统计时包含当前不可见的对象",
-        default=False
+        default=False,
+        update=_face_count_settings_update
     )
     limit: bpy.props.IntProperty(
         name="显示数量",
         description="排行榜显示的对象数量",
         default=20,
-        min=1, max=9999
+        min=1, max=9999,
+        update=_face_count_settings_update
     )
     realtime_enable: bpy.props.BoolProperty(
         name="实时更新",
-        description="自动定时刷新排行榜",
-        default=True
+        description="依赖图报告对象变化后自动刷新排行榜",
+        default=True,
+        update=_face_count_settings_update
     )
     update_interval: bpy.props.FloatProperty(
         name="刷新间隔(秒)",
-        description="实时更新时的刷新时间间隔",
+        description="实时更新时合并变化的最短时间间隔",
         default=1.0, min=0.1, max=10.0
     )
     filter_collection: bpy.props.PointerProperty(
         type=bpy.types.Collection,
         name="过滤集合",
-        description="只统计该集合及其子集合内的对象"
+        description="只统计该集合及其子集合内的对象",
+        update=_face_count_settings_update
+    )
+    show_collection_totals: bpy.props.BoolProperty(
+        name="显示集合统计",
+        description="显示每个集合（含子集合）的面数与三角面数合计",
+        default=False,
+        update=_face_count_settings_update
     )
 
 
@@ -7237,40 +11211,209 @@ def _collect_objects_in_collection(col, out):
         _collect_objects_in_collection(child, out)
 
 
-def compute_face_counts(context, settings):
-    depsgraph = context.evaluated_depsgraph_get()
-    objs = []
-    if settings.filter_collection:
-        _collect_objects_in_collection(settings.filter_collection, objs)
-    else:
-        objs = [o for o in context.view_layer.objects]
+@dataclass
+class MeshStats:
+    faces: int
+    tris: int
+    verts: int
 
-    results = []
-    for obj in objs:
-        if obj.type != 'MESH':
-            continue
-        if not settings.include_hidden and not obj.visible_get():
-            continue
+
+def evaluated_mesh_stats(obj, depsgraph) -> Optional[MeshStats]:
+    """读取对象评估后（含修改器）的网格统计
+
+    优先直接读取评估对象上的网格数据，不复制网格；编辑模式等拿不到评估网格时才用 to_mesh。
+    三角面数由每个面的角数推算（n 边形 = n-2 个三角形），无需计算三角化缓存。
+    """
+    obj_eval = obj.evaluated_get(depsgraph)
+    me = obj_eval.data if obj.mode != 'EDIT' else None
+    temp = False
+    if me is None or not isinstance(me, bpy.types.Mesh):
+        me = obj_eval.to_mesh()
+        temp = True
+        if me is None:
+            return None
+    try:
+        faces = len(me.polygons)
+        loop_totals = np.empty(faces, dtype=np.int32)
+        me.polygons.foreach_get("loop_total", loop_totals)
+        tris = int(loop_totals.sum()) - 2 * faces
+        return MeshStats(faces=faces, tris=tris, verts=len(me.vertices))
+    finally:
+        if temp:
+            obj_eval.to_mesh_clear()
+
+
+class FaceCountService:
+    """面数统计服务
+
+    维护每个对象的面数/三角面数，依赖图只报告变化的对象时只重新统计这些对象；
+    统计在 app.timers 回调中进行（合并刷新间隔内的变化），面板 draw 只读取结果。
+    """
+    def __init__(self):
+        self.stats: Dict[str, MeshStats] = {}
+        self.dirty: Set[str] = set()
+        self.rescan = True
+        self.relist = True
+        self.leaderboard: List[tuple] = []
+        self.collection_totals: List[tuple] = []
+        self.total = MeshStats(0, 0, 0)
+        self.timestamp = 0.0
+        self.object_count = -1
+        self._timer_pending = False
+
+    def reset(self) -> None:
+        self.object_count = -1
+        self.stats.clear()
+        self.dirty.clear()
+        self.rescan = True
+        self.relist = True
+
+    def mark_dirty(self, names=None) -> None:
+        if names is None:
+            self.rescan = True
+        else:
+            self.dirty.update(names)
+
+    def request_refresh(self, relist: bool = False, delay: float = 0.0) -> None:
+        if relist:
+            self.relist = True
+        if not self._timer_pending:
+            self._timer_pending = True
+            bpy.app.timers.register(_process_face_count_updates, first_interval=delay)
+
+    def cancel(self) -> None:
+        self._timer_pending = False
+        if bpy.app.timers.is_registered(_process_face_count_updates):
+            bpy.app.timers.unregister(_process_face_count_updates)
+
+    @property
+    def has_pending(self) -> bool:
+        return self.rescan or self.relist or bool(self.dirty)
+
+    def _update_object(self, obj, depsgraph) -> None:
         try:
-            obj_eval = obj.evaluated_get(depsgraph)
-            me = obj_eval.to_mesh()
-            face_count = len(me.polygons) if me is not None else 0
-            if me is not None:
-                obj_eval.to_mesh_clear()
-            results.append((obj.name, face_count))
+            stats = evaluated_mesh_stats(obj, depsgraph)
         except Exception:
             # 忽略无法评估的对象
-            continue
+            stats = None
+        if stats is None:
+            self.stats.pop(obj.name, None)
+        else:
+            self.stats[obj.name] = stats
+
+    def update(self, context) -> None:
+        """处理待更新的对象并重新生成排行榜"""
+        settings = context.scene.mq_face_count_settings
+        depsgraph = context.evaluated_depsgraph_get()
+        view_layer_objects = context.view_layer.objects
+        changed = False
+
+        if self.rescan:
+            self.stats.clear()
+            for obj in view_layer_objects:
+                if obj.type == 'MESH':
+                    self._update_object(obj, depsgraph)
+            self.rescan = False
+            self.dirty.clear()
+            changed = True
+        elif self.dirty:
+            names, self.dirty = self.dirty, set()
+            for name in names:
+                obj = view_layer_objects.get(name)
+                if obj is None or obj.type != 'MESH':
+                    self.stats.pop(name, None)
+                else:
+                    self._update_object(obj, depsgraph)
+            changed = True
+
+        if changed or self.relist:
+            self._build_views(context, settings)
+            self.relist = False
+        self.timestamp = time.time()
+
+    def _visible_names(self, context, settings) -> Set[str]:
+        if settings.filter_collection:
+            candidates = [obj for obj in settings.filter_collection.all_objects if obj.name in self.stats]
+        else:
+            view_layer_objects = context.view_layer.objects
+            candidates = [view_layer_objects[name] for name in self.stats if name in view_layer_objects]
+        if settings.include_hidden:
+            return {obj.name for obj in candidates}
+        return {obj.name for obj in candidates if obj.visible_get()}
+
+    def _build_views(self, context, settings) -> None:
+        names = self._visible_names(context, settings)
+        stats = self.stats
+        self.leaderboard = [(name, stats[name].faces, stats[name].tris)
+                            for name in heapq.nlargest(settings.limit, names, key=lambda n: stats[n].faces)]
+        self.total = MeshStats(
+            faces=sum(stats[n].faces for n in names),
+            tris=sum(stats[n].tris for n in names),
+            verts=sum(stats[n].verts for n in names),
+        )
+        totals = []
+        if settings.show_collection_totals:
+            root = settings.filter_collection
+            colls = [root] + list(root.children_recursive) if root else list(context.scene.collection.children_recursive)
+            for coll in colls:
+                members = [obj.name for obj in coll.all_objects if obj.name in names]
+                if members:
+                    totals.append((coll.name,
+                                   sum(stats[n].faces for n in members),
+                                   sum(stats[n].tris for n in members)))
+            totals.sort(key=lambda item: item[1], reverse=True)
+        self.collection_totals = totals
+
+face_count_service = FaceCountService()
+
+
+def _process_face_count_updates():
+    """定时器回调：合并处理依赖图报告的变化"""
+    face_count_service._timer_pending = False
+    context = bpy.context
+    if getattr(context, "view_layer", None) is None or not hasattr(context.scene, "mq_face_count_settings"):
+        return None
+    try:
+        face_count_service.update(context)
+    except Exception as e:
+        print(f"面数统计更新失败: {str(e)}")
+    _tag_view3d_redraw()
+    return None
 
-    # 去重（按对象名）
-    uniq = {}
-    for name, cnt in results:
-        if name not in uniq or cnt > uniq[name]:
-            uniq[name] = cnt
 
-    # 排序并限制
-    sorted_list = sorted([(n, c) for n, c in uniq.items()], key=lambda x: x[1], reverse=True)
-    return sorted_list[:settings.limit]
+@persistent
+def face_count_depsgraph_handler(scene, depsgraph=None):
+    """记录依赖图报告变化的网格对象，集合/场景结构变化时重新扫描"""
+    settings = getattr(scene, "mq_face_count_settings", None)
+    if settings is None:
+        return
+    if depsgraph is None:
+        face_count_service.mark_dirty()
+    else:
+        # 对象增删时重新扫描
+        object_count = len(scene.objects)
+        if object_count != face_count_service.object_count:
+            face_count_service.object_count = object_count
+            face_count_service.mark_dirty()
+        for update in depsgraph.updates:
+            id_data = update.id
+            if isinstance(id_data, bpy.types.Object):
+                if id_data.type == 'MESH':
+                    face_count_service.mark_dirty({id_data.original.name})
+            elif isinstance(id_data, bpy.types.Mesh):
+                mesh = id_data.original
+                if mesh.users > 1:
+                    # 网格数据被多个对象共用时标记所有使用者（单用户时对象本身也会出现在更新中）
+                    face_count_service.mark_dirty({obj.name for obj in scene.objects if obj.data == mesh})
+            elif isinstance(id_data, bpy.types.Collection):
+                face_count_service.relist = True
+    if settings.realtime_enable and face_count_service.has_pending:
+        face_count_service.request_refresh(delay=settings.update_interval)
+
+
+@persistent
+def face_count_reset_handler(*args):
+    face_count_service.reset()
 
 
 class MQT_OT_RefreshFaceCounts(bpy.types.Operator):
@@ -7280,10 +11423,8 @@ class MQT_OT_RefreshFaceCounts(bpy.types.Operator):
     bl_options = {'INTERNAL'}
 
     def execute(self, context):
-        global FACE_COUNT_CACHE, FACE_COUNT_CACHE_TIMESTAMP
-        settings = context.scene.mq_face_count_settings
-        FACE_COUNT_CACHE = compute_face_counts(context, settings)
-        FACE_COUNT_CACHE_TIMESTAMP = time.time()
+        face_count_service.mark_dirty()
+        face_count_service.update(context)
         return {'FINISHED'}
 
 
@@ -7296,7 +11437,6 @@ class MQT_PT_FaceCountPanel(bpy.types.Panel):
     bl_options = {'DEFAULT_CLOSED'}
 
     def draw(self, context):
-        global FACE_COUNT_CACHE, FACE_COUNT_CACHE_TIMESTAMP
         layout = self.layout
         settings = context.scene.mq_face_count_settings
 
@@ -7309,28 +11449,33 @@ class MQT_PT_FaceCountPanel(bpy.types.Panel):
         row.prop(settings, "update_interval", text="刷新间隔(秒)")
         row.prop(settings, "limit", text="显示数量")
         box.prop_search(settings, "filter_collection", bpy.data, "collections", text="过滤集合")
+        box.prop(settings, "show_collection_totals")
 
-        # 实时刷新（考虑修改器）
-        if settings.realtime_enable:
-            now = time.time()
-            if now - FACE_COUNT_CACHE_TIMESTAMP >= max(settings.update_interval, 0.1):
-                FACE_COUNT_CACHE = compute_face_counts(context, settings)
-                FACE_COUNT_CACHE_TIMESTAMP = now
-        elif not FACE_COUNT_CACHE:
-            FACE_COUNT_CACHE = compute_face_counts(context, settings)
-            FACE_COUNT_CACHE_TIMESTAMP = time.time()
+        # 统计在定时器中进行，draw 只读取结果；首次显示时安排一次刷新
+        if face_count_service.has_pending and (settings.realtime_enable or not face_count_service.timestamp):
+            face_count_service.request_refresh()
 
         # 显示排行榜
         list_box = layout.box()
         list_box.label(text="对象面数排行(考虑修改器):", icon='MESH_DATA')
-        if FACE_COUNT_CACHE:
-            for idx, (name, cnt) in enumerate(FACE_COUNT_CACHE, start=1):
+        if face_count_service.leaderboard:
+            total = face_count_service.total
+            list_box.label(text=f"合计 面数: {total.faces}  三角面: {total.tris}  顶点: {total.verts}")
+            for idx, (name, cnt, tris) in enumerate(face_count_service.leaderboard, start=1):
                 row = list_box.row()
                 row.label(text=f"{idx}. {name}")
-                row.label(text=f"面数: {cnt}")
+                row.label(text=f"面数: {cnt}  三角面: {tris}")
         else:
             list_box.label(text="没有可统计的网格对象", icon='INFO')
 
+        if settings.show_collection_totals and face_count_service.collection_totals:
+            coll_box = layout.box()
+            coll_box.label(text="集合统计(含子集合):", icon='OUTLINER_COLLECTION')
+            for name, cnt, tris in face_count_service.collection_totals:
+                row = coll_box.row()
+                row.label(text=name)
+                row.label(text=f"面数: {cnt}  三角面: {tris}")
+
         # 操作
         layout.operator(MQT_OT_RefreshFaceCounts.bl_idname, icon='FILE_REFRESH')
 
@@ -7354,6 +11499,54 @@ class DecimateToggleSettings(bpy.types.PropertyGroup):
         name="过滤集合",
         description="只处理该集合及其子集合内的对象"
     )
+    budget_metric: bpy.props.EnumProperty(
+        name="预算类型",
+        items=[
+            ('TRIS', "三角面", "按三角面数计算预算"),
+            ('VERTS', "顶点", "按顶点数计算预算（Source 引擎单个模型顶点上限约 65535）"),
+        ],
+        default='TRIS'
+    )
+    budget_target: bpy.props.IntProperty(
+        name="目标数量",
+        description="精简后允许的最大三角面/顶点数",
+        default=10000,
+        min=1
+    )
+    budget_scope: bpy.props.EnumProperty(
+        name="预算范围",
+        items=[
+            ('TOTAL', "总计", "所有作用对象合计满足预算"),
+            ('BODYGROUP', "每个身体组", "每个第二层级集合（bodygroup）分别满足预算"),
+        ],
+        default='TOTAL'
+    )
+    budget_tolerance: bpy.props.FloatProperty(
+        name="容差",
+        description="结果低于目标不超过该比例时视为达成",
+        default=0.02, min=0.001, max=0.5,
+        subtype='FACTOR'
+    )
+    budget_min_ratio: bpy.props.FloatProperty(
+        name="最小比例",
+        description="单个对象允许的最小精简比例",
+        default=0.05, min=0.001, max=1.0,
+        subtype='FACTOR'
+    )
+    budget_max_iterations: bpy.props.IntProperty(
+        name="最大迭代",
+        description="按实际评估结果修正比例的最大次数",
+        default=6, min=1, max=30
+    )
+    budget_priority: bpy.props.FloatProperty(
+        name="优先级",
+        description="写入选中对象的精简优先级：越大保留越多，0 表示不精简",
+        default=1.0, min=0.0, soft_max=10.0
+    )
+
+
+BUDGET_DECIMATE_NAME = "MQ_预算精简"
+BUDGET_PRIORITY_PROP = "mq_decimate_priority"
 
 
 def _gather_target_objects(context, settings: DecimateToggleSettings):
@@ -7421,6 +11614,183 @@ class DECIMATE_OT_DisableViewportAll(bpy.types.Operator):
         return {'FINISHED'}
 
 
+def budget_decimate_modifier(obj, create: bool = True):
+    """预算精简使用的 Decimate 修改器：优先使用已有的塌陷型 Decimate，没有时新建"""
+    managed = None
+    for mod in obj.modifiers:
+        if mod.type == 'DECIMATE' and mod.decimate_type == 'COLLAPSE':
+            managed = mod
+    if managed is None and create:
+        managed = obj.modifiers.new(name=BUDGET_DECIMATE_NAME, type='DECIMATE')
+        managed.decimate_type = 'COLLAPSE'
+    return managed
+
+
+def measure_budget_counts(context, objs, metric: str) -> Dict[str, int]:
+    """读取对象评估后的三角面/顶点数（不复制网格）"""
+    depsgraph = context.evaluated_depsgraph_get()
+    counts = {}
+    for obj in objs:
+        stats = evaluated_mesh_stats(obj, depsgraph)
+        if stats is None:
+            counts[obj.name] = 0
+        else:
+            counts[obj.name] = stats.tris if metric == 'TRIS' else stats.verts
+    return counts
+
+
+def solve_decimate_ratios(counts: Dict[str, int], priorities: Dict[str, float], target: float, min_ratio: float) -> Dict[str, float]:
+    """按当前数量和优先级分配精简比例
+
+    比例 ratio = clamp(1 - k / priority, min_ratio, 1)，优先级越高削减越少，优先级为 0 的对象不精简；
+    对 k 二分使 sum(count * ratio) 等于目标。目标无法达到时所有可精简对象取最小比例。
+    """
+    ratios = {name: 1.0 for name in counts}
+    if sum(counts.values()) <= target:
+        return ratios
+    adjustable = {name: count for name, count in counts.items() if count > 0 and priorities.get(name, 1.0) > 0}
+    locked_total = sum(count for name, count in counts.items() if name not in adjustable)
+    if not adjustable:
+        return ratios
+    floor_total = locked_total + sum(count * min_ratio for count in adjustable.values())
+    if floor_total >= target:
+        for name in adjustable:
+            ratios[name] = min_ratio
+        return ratios
+
+    def total_for(k):
+        return locked_total + sum(count * min(1.0, max(min_ratio, 1.0 - k / priorities.get(name, 1.0)))
+                                  for name, count in adjustable.items())
+
+    low, high = 0.0, max(priorities.get(name, 1.0) for name in adjustable)
+    for _ in range(50):
+        mid = (low + high) / 2
+        if total_for(mid) > target:
+            low = mid
+        else:
+            high = mid
+    for name in adjustable:
+        ratios[name] = min(1.0, max(min_ratio, 1.0 - high / priorities.get(name, 1.0)))
+    return ratios
+
+
+def _budget_groups(context, targets, scope: str) -> Dict[str, list]:
+    if scope == 'TOTAL':
+        return {"总计": list(targets)}
+    target_names = {obj.name for obj in targets}
+    groups = {}
+    for coll_name in get_second_level_collections(context):
+        coll = bpy.data.collections.get(coll_name)
+        if coll is None:
+            continue
+        members = [obj for obj in coll.all_objects if obj.name in target_names]
+        if members:
+            groups[coll_name] = members
+    return groups
+
+
+def solve_decimate_budget(context, objs, target: int, settings) -> tuple:
+    """迭代求解一组对象的精简比例并写入 Decimate 修改器，返回 (精简前数量, 精简后数量, 迭代次数)"""
+    modifiers = {obj.name: budget_decimate_modifier(obj) for obj in objs}
+    for mod in modifiers.values():
+        mod.ratio = 1.0
+        mod.show_viewport = True
+    base_counts = measure_budget_counts(context, objs, settings.budget_metric)
+    base_total = sum(base_counts.values())
+    priorities = {obj.name: max(0.0, float(obj.get(BUDGET_PRIORITY_PROP, 1.0))) for obj in objs}
+
+    def apply(ratios):
+        for name, ratio in ratios.items():
+            modifiers[name].ratio = ratio
+        return sum(measure_budget_counts(context, objs, settings.budget_metric).values())
+
+    if base_total <= target:
+        return base_total, base_total, 0
+
+    # 塌陷精简的结果与比例不是严格线性，按实际评估结果修正内部目标
+    desired = float(target)
+    best = None
+    iterations = 0
+    for iterations in range(1, settings.budget_max_iterations + 1):
+        ratios = solve_decimate_ratios(base_counts, priorities, desired, settings.budget_min_ratio)
+        actual = apply(ratios)
+        if actual <= target and (best is None or actual > best[1]):
+            best = (ratios, actual)
+        if actual <= target and actual >= target * (1.0 - settings.budget_tolerance):
+            return base_total, actual, iterations
+        if actual <= 0:
+            break
+        desired = min(float(base_total), desired * target / actual)
+    if best is not None and best[1] != actual:
+        actual = apply(best[0])
+    return base_total, actual, iterations
+
+
+class DECIMATE_OT_SolveBudget(bpy.types.Operator):
+    bl_idname = "mqtools.decimate_solve_budget"
+    bl_label = "按预算精简"
+    bl_description = "按目标三角面/顶点数为作用对象计算精简比例，写入已有或新建的 Decimate 修改器"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        settings = context.scene.decimate_toggle_settings
+        if context.mode != 'OBJECT':
+            self.report({'WARNING'}, "请在物体模式下操作")
+            return {'CANCELLED'}
+        targets = _gather_target_objects(context, settings)
+        groups = _budget_groups(context, targets, settings.budget_scope)
+        if not groups:
+            self.report({'WARNING'}, "没有可精简的网格对象")
+            return {'CANCELLED'}
+
+        metric_label = "三角面" if settings.budget_metric == 'TRIS' else "顶点"
+        over_budget = []
+        for group_name, objs in groups.items():
+            before, after, iterations = solve_decimate_budget(context, objs, settings.budget_target, settings)
+            print(f"预算精简 [{group_name}]: {metric_label} {before} -> {after} (目标 {settings.budget_target}, 迭代 {iterations} 次)")
+            if after > settings.budget_target:
+                over_budget.append(group_name)
+        face_count_service.mark_dirty()
+
+        if over_budget:
+            self.report({'WARNING'}, f"{len(over_budget)} 组在最小比例下仍超出预算: {', '.join(over_budget[:5])}")
+        else:
+            self.report({'INFO'}, f"已为 {len(groups)} 组对象写入精简比例，{metric_label}均在预算内")
+        return {'FINISHED'}
+
+
+class DECIMATE_OT_ClearBudget(bpy.types.Operator):
+    bl_idname = "mqtools.decimate_clear_budget"
+    bl_label = "移除预算精简"
+    bl_description = "移除按预算精简新建的 Decimate 修改器"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        settings = context.scene.decimate_toggle_settings
+        count = 0
+        for obj in _gather_target_objects(context, settings):
+            for mod in [m for m in obj.modifiers if m.type == 'DECIMATE' and m.name.startswith(BUDGET_DECIMATE_NAME)]:
+                obj.modifiers.remove(mod)
+                count += 1
+        self.report({'INFO'}, f"已移除 {count} 个预算精简修改器")
+        return {'FINISHED'}
+
+
+class DECIMATE_OT_SetPriority(bpy.types.Operator):
+    bl_idname = "mqtools.decimate_set_priority"
+    bl_label = "设置精简优先级"
+    bl_description = "把面板中的优先级写入选中对象（自定义属性 mq_decimate_priority）"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        priority = context.scene.decimate_toggle_settings.budget_priority
+        objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        for obj in objs:
+            obj[BUDGET_PRIORITY_PROP] = priority
+        self.report({'INFO'}, f"已为 {len(objs)} 个对象设置精简优先级 {priority:g}")
+        return {'FINISHED'}
+
+
 class MQT_PT_DecimateTogglePanel(bpy.types.Panel):
     bl_label = "精简修改器实时显示控制"
     bl_idname = "MQT_PT_DecimateTogglePanel"
@@ -7444,6 +11814,23 @@ class MQT_PT_DecimateTogglePanel(bpy.types.Panel):
         row.operator(DECIMATE_OT_EnableViewportAll.bl_idname, icon='CHECKMARK')
         row.operator(DECIMATE_OT_DisableViewportAll.bl_idname, icon='X')
 
+        budget_box = layout.box()
+        budget_box.label(text="预算精简:", icon='MOD_DECIM')
+        row = budget_box.row(align=True)
+        row.prop(settings, "budget_metric", text="")
+        row.prop(settings, "budget_target")
+        budget_box.prop(settings, "budget_scope")
+        row = budget_box.row(align=True)
+        row.prop(settings, "budget_tolerance")
+        row.prop(settings, "budget_min_ratio")
+        budget_box.prop(settings, "budget_max_iterations")
+        row = budget_box.row(align=True)
+        row.prop(settings, "budget_priority")
+        row.operator(DECIMATE_OT_SetPriority.bl_idname, text="", icon='SORTBYEXT')
+        row = budget_box.row(align=True)
+        row.operator(DECIMATE_OT_SolveBudget.bl_idname, icon='PLAY')
+        row.operator(DECIMATE_OT_ClearBudget.bl_idname, icon='TRASH')
+
 # --------------------------------------------------------------------------
 # 类注册和注销
 # --------------------------------------------------------------------------
@@ -7457,7 +11844,13 @@ classes = (
     MaterialBlankControl,
     QSeparatorSettings,
     QSEPARATOR_OT_CopyText,
+    QSEPARATOR_OT_WriteQCFile,
+    QSEPARATOR_OT_ExportSMD,
+    QSEPARATOR_OT_ExportDMX,
     QSEPARATOR_OT_CopyDefineVariable,
+    QSEPARATOR_OT_SetTranslationOverride,
+    QSEPARATOR_OT_AddGlossaryTerm,
+    QSEPARATOR_OT_ClearTranslationCache,
     QSEPARATOR_OT_AddSearchItem,
     QSEPARATOR_OT_RemoveSearchItem,
     QSEPARATOR_OT_ClearAllItems,
@@ -7472,6 +11865,7 @@ classes = (
     QSEPARATOR_OT_RemoveBlankControlItem,
     QSEPARATOR_OT_ClearAllBlankControls,
     QSEPARATOR_OT_OrganizeOutlines,
+    QSEPARATOR_OT_AnalyzeSourceLimits,
     MQT_PT_SeparatorPanel,
     QS_UL_ExcludedItems,
     QS_UL_BlankControlItems,
@@ -7487,6 +11881,9 @@ classes = (
     OUTLINE_OT_AddAll,
     OUTLINE_OT_AddSelected,
     OUTLINE_OT_DeleteAll,
+    OUTLINE_OT_BakeModifiers,
+    OUTLINE_OT_ExportSMD,
+    OUTLINE_OT_RestoreModifiers,
     OUTLINE_OT_CopySMD,
     MQT_PT_OutlinePanel,
     
@@ -7500,6 +11897,7 @@ classes = (
     VMT_OT_AssignSource,
     VMT_OT_CopyMaterials,
     VMT_OT_SelectAll,
+    VMT_OT_ConfirmSuggestion,
     VMT_OT_DeselectAll,
     MQT_PT_VMTPanel,
     
@@ -7516,6 +11914,7 @@ classes = (
     BONE_OT_unlock_all_transforms,
     RenamePrimarySettings,
     BONE_OT_rename_primary_bones,
+    BONE_OT_export_rename_preset,
     MQT_PT_BoneToolsPanel,
     
     # 骨骼捕捉相关类
@@ -7537,6 +11936,8 @@ classes = (
     # 网格权重显示工具 (新功能)
     MeshWeightToolsSettings,
     MESH_OT_isolate_zero_weight_meshes,
+    MESH_OT_zero_weight_histogram,
+    MESH_OT_pick_zero_weight_threshold,
     MQT_PT_MeshWeightDisplayPanel,
     
     # MMD材质转换工具
@@ -7554,6 +11955,9 @@ classes = (
     DecimateToggleSettings,
     DECIMATE_OT_EnableViewportAll,
     DECIMATE_OT_DisableViewportAll,
+    DECIMATE_OT_SolveBudget,
+    DECIMATE_OT_ClearBudget,
+    DECIMATE_OT_SetPriority,
     MQT_PT_DecimateTogglePanel,
     
     # 静态对象GLB导出工具
@@ -7610,6 +12014,20 @@ def register():
         description="如果开启，根据模型名称分配描边材质，如 Outline_Hair 或 Outline_Face",
         default=True
     )
+    bpy.types.Scene.outline_thickness_group = bpy.props.StringProperty(
+        name="厚度顶点组",
+        description="按该顶点组的权重缩放每个顶点的描边厚度（不在组内的顶点厚度为0），留空则厚度一致",
+        default=""
+    )
+    bpy.types.Scene.outline_method = bpy.props.EnumProperty(
+        name="描边方式",
+        description="选择描边的生成方式",
+        items=[
+            ('COPY', "复制网格", "复制一份网格并向外推出外壳，描边为独立对象"),
+            ('MODIFIER', "非破坏(修改器)", "使用翻转法线的实体化修改器和材质偏移，不复制网格，导出前烘焙"),
+        ],
+        default='COPY'
+    )
     bpy.types.Scene.outline_mode = bpy.props.EnumProperty(
         name="描边放置模式",
         description="选择描边对象的放置模式",
@@ -7643,6 +12061,38 @@ def register():
         description="选择日志文件输出的文件夹",
         subtype='DIR_PATH'
     )
+    bpy.types.Scene.vmt_rewrite_mode = bpy.props.EnumProperty(
+        name="贴图路径改写",
+        items=[
+            ('NONE', "不改写", "保持源VMT中的贴图路径"),
+            ('BASENAME', "目标目录", "贴图路径改为 贴图目录/原贴图文件名"),
+            ('MATERIAL', "目标目录+材质名", "贴图路径改为贴图目录，并把文件名中的源材质名替换为目标材质名"),
+        ],
+        default='BASENAME',
+        description="复制VMT时如何改写贴图参数"
+    )
+    bpy.types.Scene.vmt_texture_dir = bpy.props.StringProperty(
+        name="贴图目录",
+        description="改写后的贴图目录（相对 materials，如 models/survivors/custom），留空则根据目标路径中 materials 之后的部分自动推断",
+        default=""
+    )
+    bpy.types.Scene.vmt_rewrite_params = bpy.props.StringProperty(
+        name="改写参数",
+        description="需要改写路径的贴图参数，逗号分隔",
+        default="$basetexture,$bumpmap,$normalmap,$phongexponenttexture,$envmapmask,$selfillummask"
+    )
+    bpy.types.Scene.vmt_copy_workers = bpy.props.IntProperty(
+        name="并行写入数",
+        description="同时写出VMT文件的线程数",
+        default=8,
+        min=1,
+        max=32
+    )
+    bpy.types.Scene.vmt_auto_match = bpy.props.BoolProperty(
+        name="自动建议源材质",
+        description="刷新时为未匹配的材质按贴图或相似名称自动填入建议的源VMT（确认后才会被复制）",
+        default=False
+    )
     bpy.types.Scene.vmt_enable_logging = bpy.props.BoolProperty(
         name="启用日志输出",
         description="启用后将在刷新材质列表时输出详细日志到指定文件夹",
@@ -7653,9 +12103,14 @@ def register():
     # REMOVED: bpy.types.Scene.pbr_output_directory
     bpy.types.Scene.pbr_clean_data = bpy.props.BoolProperty(
         name="清理未使用的数据",
-        description="清理未使用的贴图和材质数据，避免.001后缀",
+        description="释放本次着色替换下来的贴图和节点组，以及与材质同名的孤立贴图，避免.001后缀",
         default=True
     )
+    bpy.types.Scene.pbr_global_purge = bpy.props.BoolProperty(
+        name="全局清理孤立数据",
+        description="着色前后额外清理文件中所有零用户数据块（包括与本工具无关的数据）",
+        default=False
+    )
     bpy.types.Scene.pbr_skinuber_cloth_type = bpy.props.EnumProperty(
         name="Skinuber贴图类型",
         description="选择用于skinuber材质的贴图类型",
@@ -7722,9 +12177,45 @@ def register():
     bpy.types.Scene.vertex_group_selected_groups = bpy.props.CollectionProperty(type=VertexGroupSelectItem)
     # 注册骨骼捕捉设置
     bpy.types.Scene.bone_capture_settings = bpy.props.PointerProperty(type=BoneCaptureSettings)
+    # 退出 Blender 时写完缓冲中的日志
+    atexit.register(log_writer.close)
+    # 集合缓存失效通知
+    bpy.app.handlers.depsgraph_update_post.append(collection_cache_depsgraph_handler)
+    bpy.app.handlers.depsgraph_update_post.append(draw_cache_depsgraph_handler)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handlers.append(collection_cache_reset_handler)
+    subscribe_collection_cache_msgbus()
+    collection_cache.invalidate()
+    # 面数排行榜增量统计
+    bpy.app.handlers.depsgraph_update_post.append(face_count_depsgraph_handler)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handlers.append(face_count_reset_handler)
 
 
 def unregister():
+    # 写完缓冲中的日志并停止后台写入线程
+    atexit.unregister(log_writer.close)
+    log_writer.close()
+    translation_client.close()
+    # 移除集合缓存失效通知
+    bpy.msgbus.clear_by_owner(_collection_cache_msgbus_owner)
+    if collection_cache_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(collection_cache_depsgraph_handler)
+    if draw_cache_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(draw_cache_depsgraph_handler)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if collection_cache_reset_handler in handlers:
+            handlers.remove(collection_cache_reset_handler)
+    if bpy.app.timers.is_registered(_poll_translation_job):
+        bpy.app.timers.unregister(_poll_translation_job)
+    # 移除面数排行榜统计
+    if face_count_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(face_count_depsgraph_handler)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if face_count_reset_handler in handlers:
+            handlers.remove(face_count_reset_handler)
+    face_count_service.cancel()
+
     bpy.utils.unregister_class(MMDSeparatorSettings)
     del bpy.types.Scene.mmd_separator_settings
     # (其他类的注销保持不变)
@@ -7740,10 +12231,21 @@ def unregister():
         del bpy.types.Scene.vmt_log_path
     if hasattr(bpy.types.Scene, 'vmt_enable_logging'):
         del bpy.types.Scene.vmt_enable_logging
+    if hasattr(bpy.types.Scene, 'vmt_auto_match'):
+        del bpy.types.Scene.vmt_auto_match
+    if hasattr(bpy.types.Scene, 'vmt_rewrite_mode'):
+        del bpy.types.Scene.vmt_rewrite_mode
+    if hasattr(bpy.types.Scene, 'vmt_texture_dir'):
+        del bpy.types.Scene.vmt_texture_dir
+    if hasattr(bpy.types.Scene, 'vmt_rewrite_params'):
+        del bpy.types.Scene.vmt_rewrite_params
+    if hasattr(bpy.types.Scene, 'vmt_copy_workers'):
+        del bpy.types.Scene.vmt_copy_workers
 
     # 注销一键PBR材质工具设置 (保持不变)
     # REMOVED: del bpy.types.Scene.pbr_output_directory
     del bpy.types.Scene.pbr_clean_data
+    del bpy.types.Scene.pbr_global_purge
     del bpy.types.Scene.pbr_skinuber_cloth_type
     del bpy.types.Scene.pbr_cloth2double_cloth_type
     del bpy.types.Scene.pbr_silkstock_cloth_type